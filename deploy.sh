@@ -7,8 +7,19 @@ BLUE='\033[0;34m'
 NC='\033[0m'
 
 # 配置文件
-CONFIG_FILE="deploy_config.json"
+CONFIG_FILE="${CONFIG_FILE:-deploy_config.json}"
 CONTAINER_CACHE=".container_cache"  # 容器缓存文件
+WEIGHT_CACHE_TARGET="${WEIGHT_CACHE_TARGET:-90}"    # 启动服务前权重驻留内存的目标比例(%)
+WEIGHT_CACHE_TIMEOUT="${WEIGHT_CACHE_TIMEOUT:-600}" # 等待权重驻留的最长时间(秒)
+ALLOW_TRANSFORMERS_MISMATCH="${ALLOW_TRANSFORMERS_MISMATCH:-0}" # 为1时镜像transformers版本与模型要求不一致只告警
+TRACE_FILE="${TRACE_FILE-$(pwd)/deploy_trace.jsonl}" # 阶段事件文件，置空时不记录
+
+# 部署前检查；transformers版本不一致默认判为失败并给出安装命令，ALLOW_TRANSFORMERS_MISMATCH=1 时只告警
+run_preflight() {
+    local args=(--config "$CONFIG_FILE")
+    [ "$ALLOW_TRANSFORMERS_MISMATCH" = "1" ] && args+=(--allow-transformers-mismatch)
+    python3 lib/preflight.py "${args[@]}"
+}
 
 # 检查是否在Docker环境中
 in_docker_env() {
@@ -27,162 +38,78 @@ check_dependencies() {
     done
 }
 
-    
-# 使用Python读取配置和获取IP
+
+# 一次性加载配置：单个python进程完成解析（及校验），结果以CFG_*变量导出
+# 用法: load_config [--validate]
+load_config() {
+    local exports
+    exports=$(python3 lib/deploy_config.py --config "$CONFIG_FILE" "$@") || return 1
+    eval "$exports"
+}
+
+# 读取已加载的配置字段，如 read_config "docker.image" -> $CFG_DOCKER_IMAGE
 read_config() {
-    python3 -c "
-import json
-
-def format_nodes(nodes):
-    if isinstance(nodes, list):
-        return '\\n'.join(nodes)
-    return nodes
-
-def format_volumes(volumes):
-    if isinstance(volumes, dict):
-        return '\\n'.join(f'{k}={v}' for k, v in volumes.items())
-    return volumes
-
-def get_nested_value(data, path):
-    keys = path.split('.')
-    value = data
-    for key in keys:
-        if isinstance(value, dict):
-            value = value.get(key)
-        else:
-            return None
-    return value
-
-with open('$CONFIG_FILE') as f:
-    config = json.load(f)
-    path = '$1'
-    value = get_nested_value(config, path)
-    
-    if path == 'nodes':
-        print(format_nodes(value))
-    elif path == 'docker.volumes':
-        print(format_volumes(value))
-    else:
-        print('' if value is None else value)
-"
+    local var="CFG_${1//./_}"
+    var="${var^^}"
+    printf '%s\n' "${!var}"
 }
 
-# 验证配置文件
-validate_config() {
-    if [ ! -f "$CONFIG_FILE" ]; then
-        echo -e "${RED}错误: 未找到配置文件 $CONFIG_FILE${NC}"
-        exit 1
-    fi
-    
-    # 获取world_size判断部署模式
-    local world_size=$(read_config "world_size")
-    if [ -z "$world_size" ]; then
-        echo -e "${RED}错误: 配置文件缺少必要字段 'world_size'${NC}"
-        exit 1
-    fi
-    
-    if [ "$world_size" -lt 9 ]; then
-        # 单机部署配置校验
-        echo -e "${BLUE}校验单机部署配置...${NC}"
-        local required_fields=("container_ip" "model_name" "model_path" "docker.image")
-        for field in "${required_fields[@]}"; do
-            if [ -z "$(read_config "$field")" ]; then
-                echo -e "${RED}错误: 配置文件缺少必要字段 '$field'${NC}"
-                exit 1
-            fi
-        done
-        
-        # 检查world_size范围
-        if [ "$world_size" -lt 1 ] || [ "$world_size" -gt 8 ]; then
-            echo -e "${RED}错误: world_size必须在1-8之间${NC}"
-            exit 1
-        fi
-        
-        # 检查device_ids配置
-        local device_ids=$(read_config "device_ids")
-        if [ ! -z "$device_ids" ]; then
-            # 如果指定了device_ids，检查数量是否匹配world_size
-            local device_count=$(python3 -c "
-import json
-device_ids = json.loads('$device_ids')
-print(len(device_ids))
-")
-            if [ "$device_count" != "$world_size" ]; then
-                echo -e "${RED}错误: device_ids数量($device_count)与world_size($world_size)不匹配${NC}"
-                exit 1
-            fi
-            
-            # 检查device_ids是否都在合法范围内
-            local has_invalid_ids=$(python3 -c "
-import json
-device_ids = json.loads('$device_ids')
-invalid = any(d < 0 or d > 7 for d in device_ids)
-print('true' if invalid else '')
-")
-            if [ ! -z "$has_invalid_ids" ]; then
-                echo -e "${RED}错误: device_ids中包含无效的设备ID (必须在0-7之间)${NC}"
-                exit 1
-            fi
-        fi
-    else
-        # 多机部署配置校验
-        echo -e "${BLUE}校验多机部署配置...${NC}"
-        local required_fields=("master_ip" "nodes" "model_name" "model_path" "docker.image")
-        for field in "${required_fields[@]}"; do
-            if [ -z "$(read_config "$field")" ]; then
-                echo -e "${RED}错误: 配置文件缺少必要字段 '$field'${NC}"
-                exit 1
-            fi
-        done
+# 本机在nodes列表中的IP（找不到时使用主机名），用于标识阶段事件的来源节点
+local_node_ip() {
+    local ip
+    for ip in $(hostname -I 2>/dev/null); do
+        case ",$CFG_NODES_CSV," in
+            *",$ip,"*) echo "$ip"; return 0;;
+        esac
+    done
+    hostname
+}
 
-        # 检查SSH端口配置
-        local ssh_port=$(read_config "ssh.port")
-        if [ "$ssh_port" = "null" ]; then
-            echo -e "${BLUE}注意: 未指定SSH端口，将使用默认端口22${NC}"
-        fi
+# 追加一条阶段事件（JSON行），由 lib/deploy_trace.py 汇总为时间线
+# 用法: trace_event B|E|i <阶段名> [退出码]
+trace_event() {
+    [ -n "$TRACE_FILE" ] || return 0
+    local status="" proc="host"
+    [ -n "$3" ] && status=",\"status\":$3"
+    in_docker_env && proc="container"
+    printf '{"ts":%s,"ph":"%s","name":"%s","host":"%s","proc":"%s","pid":%d%s}\n' \
+        "$(date +%s.%N)" "$1" "$2" "${TRACE_HOST:-$(hostname)}" "$proc" "$$" "$status" >> "$TRACE_FILE" 2>/dev/null || true
+}
 
-        # 增加SSH认证配置检查
-        local use_key=$(read_config "ssh.use_key")
-        local key_path=$(read_config "ssh.key_path")
-        local password=$(read_config "ssh.password")
-        
-        if [ "$use_key" = "true" ]; then
-            if [ -z "$key_path" ] || [ "$key_path" = "null" ]; then
-                echo -e "${RED}错误: 使用SSH密钥认证但未指定密钥路径${NC}"
-                exit 1
-            fi
-            # 展开路径中的~
-            key_path=$(eval echo "$key_path")
-            if [ ! -f "$key_path" ]; then
-                echo -e "${RED}错误: SSH密钥文件不存在: $key_path${NC}"
-                echo -e "${BLUE}请检查：${NC}"
-                echo -e "1. 密钥文件路径是否正确"
-                echo -e "2. 密钥文件权限是否正确 (建议: chmod 600 $key_path)"
-                exit 1
-            fi
-            # 检查密钥文件权限
-            local key_perms=$(stat -c %a "$key_path")
-            if [ "$key_perms" != "600" ]; then
-                echo -e "${RED}警告: SSH密钥文件权限不正确 ($key_perms)${NC}"
-                echo -e "${BLUE}建议执行: chmod 600 $key_path${NC}"
-            fi
-        else
-            if [ -z "$password" ] || [ "$password" = "null" ]; then
-                echo -e "${RED}错误: 使用密码认证但未提供密码${NC}"
-                exit 1
-            fi
-        fi
-    fi
+# 把命令的执行记录为一个阶段，返回命令的退出码
+# 用法: trace_run <阶段名> <命令> [参数...]
+trace_run() {
+    local phase="$1" rc=0
+    shift
+    trace_event B "$phase"
+    "$@" || rc=$?
+    trace_event E "$phase" "$rc"
+    return $rc
+}
+
+# 把容器内记录的阶段事件追加到宿主机的事件文件
+collect_container_trace() {
+    [ -n "$TRACE_FILE" ] || return 0
+    docker exec "$1" bash -c "cat /workspace/deploy_trace.jsonl 2>/dev/null; rm -f /workspace/deploy_trace.jsonl" >> "$TRACE_FILE" 2>/dev/null || true
+}
+
+# 验证配置文件（校验逻辑在 lib/deploy_config.py 中与加载一并完成）
+# 用法: validate_config [--no-ssh-key-check]
+validate_config() {
+    load_config --validate "$@"
 }
 
 # 检查必要文件
 check_files() {
     local required_files=(
-        "lib/auto_check.sh"
+        "lib/link_check.py"
+        "lib/npu_link_probe.py"
+        "lib/preflight.py"
         "lib/add_env_settings.sh"
         "lib/generate_ranktable.py"
         "lib/modify_mindie_config.py"
-        "lib/push_mem.sh"
+        "lib/render_mindie_config.py"
+        "lib/preload_weights.py"
     )
     
     for file in "${required_files[@]}"; do
@@ -264,9 +191,10 @@ cleanup_and_exit() {
     fi
     
     # 清理内存预热进程
-    if ps aux | grep -v grep | grep push_mem.sh > /dev/null; then
+    if ps aux | grep -v grep | grep -E "push_mem.sh|preload_weights.py" > /dev/null; then
         echo -e "${BLUE}清理内存预热进程...${NC}"
         pkill -f push_mem.sh
+        pkill -f preload_weights.py
     fi
     
     # 清理服务进程
@@ -280,13 +208,15 @@ cleanup_and_exit() {
 }
 
 # 启动Docker容器并执行部署
+# 用法: start_docker_and_deploy [--prepare]，--prepare 时只完成容器内准备，不启动服务
 start_docker_and_deploy() {
+    local mode="$1"
     local image=$(read_config "docker.image")
     local model_path=$(read_config "model_path")
     local container_name="npu_deploy_$(date +%s)"
     
     # 清理之前的容器
-    cleanup_previous_container || cleanup_and_exit 1 "清理之前的容器失败"
+    trace_run container_cleanup cleanup_previous_container || cleanup_and_exit 1 "清理之前的容器失败"
     
     echo -e "${BLUE}启动Docker容器...${NC}"
     
@@ -303,15 +233,13 @@ start_docker_and_deploy() {
     
     # 调用start_docker.sh脚本，传递volumes参数
     chmod a+x lib/start_docker.sh
-    ./lib/start_docker.sh "$container_name" "$image" "$volumes_args"
-    
-    if [ $? -ne 0 ]; then
+    if ! trace_run container_start ./lib/start_docker.sh "$container_name" "$image" "$volumes_args"; then
         echo -e "${RED}错误: Docker容器启动失败${NC}"
         exit 1
     fi
     
     # 等待容器就绪
-    wait_for_container_ready "$container_name" || {
+    trace_run container_ready_wait wait_for_container_ready "$container_name" || {
         docker rm -f "$container_name" >/dev/null 2>&1
         cleanup_and_exit 1 "容器未能正常启动"
     }
@@ -326,17 +254,15 @@ start_docker_and_deploy() {
     docker exec "$container_name" mkdir -p /workspace
     docker exec "$container_name" mkdir -p /usr/local/Ascend/mindie/latest/mindie-service/
     
-    # 复制必要文件到容器
-    echo -e "${BLUE}复制配置文件到容器...${NC}"
-    docker cp "$CONFIG_FILE" "$container_name:/workspace/"
-    docker cp . "$container_name:/workspace/"
-    docker cp /usr/bin/hostname "$container_name:/usr/bin/"
+    # 只同步容器内部署需要的文件（内容未变化的文件跳过）
+    echo -e "${BLUE}同步部署文件到容器...${NC}"
+    trace_run workspace_sync python3 lib/sync_workspace.py "$container_name" --config "$CONFIG_FILE" || cleanup_and_exit 1 "同步部署文件到容器失败"
+    trace_run docker_cp docker cp /usr/bin/hostname "$container_name:/usr/bin/"
     
     # 复制rank表到指定目录
     if [ -f "rank_table_file.json" ]; then
         echo -e "${BLUE}复制rank表到容器...${NC}"
-        docker cp rank_table_file.json "$container_name:/usr/local/Ascend/mindie/latest/mindie-service/"
-        if [ $? -eq 0 ]; then
+        if trace_run docker_cp docker cp rank_table_file.json "$container_name:/usr/local/Ascend/mindie/latest/mindie-service/"; then
             echo -e "${GREEN}rank表复制成功${NC}"
         else
             echo -e "${RED}错误: rank表复制失败${NC}"
@@ -347,18 +273,35 @@ start_docker_and_deploy() {
         cleanup_and_exit 1 "rank表文件不存在"
     fi
     
+    # 非交互执行（如由deploy_cluster.py经SSH调用）时不分配tty
+    local exec_flags="-i"
+    [ -t 0 ] && exec_flags="-it"
+
+    # 容器内的阶段事件记录在 /workspace 下，每次执行后追加到宿主机的事件文件
+    local trace_env="TRACE_HOST='$TRACE_HOST' TRACE_FILE='${TRACE_FILE:+/workspace/deploy_trace.jsonl}'"
+    local rc=0
+
     # 在容器中执行部署流程
     echo -e "${BLUE}开始执行部署流程...${NC}"
-    if ! docker exec -it "$container_name" bash -l -c "cd /workspace && chmod +x deploy.sh && ./deploy.sh --in-container"; then
+    trace_run container_deploy docker exec $exec_flags "$container_name" bash -l -c "cd /workspace && chmod +x deploy.sh && CONFIG_FILE='$(basename "$CONFIG_FILE")' $trace_env ./deploy.sh --in-container" || rc=$?
+    collect_container_trace "$container_name"
+    if [ $rc -ne 0 ]; then
         echo -e "${RED}错误: 容器内部署失败${NC}"
         echo -e "${BLUE}清理容器...${NC}"
         docker rm -f "$container_name" >/dev/null 2>&1
         exit 1
     fi
 
+    if [ "$mode" = "--prepare" ]; then
+        echo -e "${GREEN}容器内准备完成，等待统一启动服务: $container_name${NC}"
+        return 0
+    fi
+
     # 退出容器重进以达成刷新环境变量的目的
     echo -e "${BLUE}开始启动服务...${NC}"
-    if ! docker exec -it "$container_name" bash -l -c "cd /workspace && chmod +x deploy.sh && ./deploy.sh --start-service"; then
+    trace_run container_start_service docker exec $exec_flags "$container_name" bash -l -c "cd /workspace && chmod +x deploy.sh && CONFIG_FILE='$(basename "$CONFIG_FILE")' $trace_env ./deploy.sh --start-service" || rc=$?
+    collect_container_trace "$container_name"
+    if [ $rc -ne 0 ]; then
         echo -e "${RED}错误: 容器内启动服务失败${NC}"
         echo -e "${BLUE}清理容器...${NC}"
         docker rm -f "$container_name" >/dev/null 2>&1
@@ -399,7 +342,7 @@ BEGIN {
     master_ip=$(read_config "master_ip") || cleanup_and_exit 1 "获取master_ip失败"
     
     chmod a+x lib/add_env_settings.sh
-    ./lib/add_env_settings.sh "$master_ip" "$current_ip" "$world_size" || cleanup_and_exit 1 "环境变量配置失败"
+    trace_run env_setup ./lib/add_env_settings.sh "$master_ip" "$current_ip" "$world_size" || cleanup_and_exit 1 "环境变量配置失败"
     
     # 6. 修改Mindie服务配置
     echo -e "\n${GREEN}[5/8] 修改Mindie服务配置...${NC}"
@@ -414,33 +357,80 @@ BEGIN {
     cmd="$cmd --model-name $model_name"
     cmd="$cmd --model-path $model_path"
     cmd="$cmd --world-size $world_size"
+    cmd="$cmd --nodes '$CFG_NODES_CSV' --node '$current_ip'"
+    cmd="$cmd --overrides '$CONFIG_FILE' --overrides-key mindie_overrides"
+    cmd="$cmd --auto-size"
 
     # 执行配置修改
-    eval "$cmd" || cleanup_and_exit 1 "Mindie服务配置修改失败"
+    trace_run config_render eval "$cmd" || cleanup_and_exit 1 "Mindie服务配置修改失败"
     
     # 7. 内存预热
     echo -e "\n${GREEN}[6/8] 执行内存预热...${NC}"
     # 从配置文件获取模型路径
     model_path=$(read_config "model_path") || cleanup_and_exit 1 "获取model_path失败"
     
+    trace_event B preload_start
     if [ -d "$model_path" ]; then
-        # 复制预热脚本到模型目录
-        cp lib/push_mem.sh "$model_path/" || cleanup_and_exit 1 "复制预热脚本失败"
-        
-        # 切换到模型目录并执行预热
-        current_dir=$(pwd)
-        cd "$model_path" || cleanup_and_exit 1 "切换到模型目录失败"
-        echo -e "${BLUE}开始在 $model_path 目录下执行内存预热...${NC}"
-        nohup bash push_mem.sh > output_mem.log 2>&1 &
-        cd "$current_dir"
+        # 并发预热所有分片，之后在内存预算内常驻循环保持页缓存
+        echo -e "${BLUE}开始在 $model_path 目录下执行内存预热，日志: $(pwd)/output_mem.log${NC}"
+        nohup python3 lib/preload_weights.py "$model_path" > output_mem.log 2>&1 &
+        local preload_pid=$!
         
-        # 等待预热脚本启动
+        # 确认预热进程已启动
         sleep 2
-        ps -ef | grep push_mem.sh  || cleanup_and_exit 1 "内存预热进程启动失败"
+        kill -0 "$preload_pid" 2>/dev/null || cleanup_and_exit 1 "内存预热进程启动失败"
     else
         echo -e "${RED}警告: 模型目录不存在: $model_path${NC}"
         echo -e "${RED}跳过内存预热${NC}"
     fi
+    trace_event E preload_start 0
+
+    # 非交互执行时不会经过start_service，在此提前完成启动前的检查和权限调整
+    if [ ! -t 0 ]; then
+        trace_run fix_permissions fix_service_file_permissions
+        trace_run weights_cache_wait wait_weights_cached
+    fi
+}
+
+# 修改模型权重及rank表权限（mindieservice_daemon启动前要求）
+fix_service_file_permissions() {
+    local model_path="$CFG_MODEL_PATH"
+    config_file="$model_path/config.json"
+    if [ -f "$config_file" ]; then
+        echo -e "${BLUE}修改模型配置文件权限: $config_file${NC}"
+        chown -R root:root $model_path
+        chmod -R 640 $model_path
+        chmod 750 "$config_file"
+
+        if [ $? -eq 0 ]; then
+            echo -e "${GREEN}配置文件权限修改成功${NC}"
+        else
+            echo -e "${RED}警告: 配置文件权限修改失败${NC}"
+        fi
+    else
+        echo -e "${RED}警告: 未找到模型配置文件: $config_file${NC}"
+    fi
+
+    # 修改rank_table_file.json权限
+    chmod 640 /usr/local/Ascend/mindie/latest/mindie-service/rank_table_file.json
+}
+
+# 等待模型权重进入页缓存，避免服务启动时从磁盘冷读权重（未达到时只告警）
+wait_weights_cached() {
+    local model_path="$CFG_MODEL_PATH"
+    [ -d "$model_path" ] || return 0
+    echo -e "${BLUE}等待模型权重进入内存 (目标 ${WEIGHT_CACHE_TARGET}%)...${NC}"
+    if ! python3 lib/page_cache_status.py "$model_path" --wait-until "$WEIGHT_CACHE_TARGET" --timeout "$WEIGHT_CACHE_TIMEOUT" --interval 10; then
+        echo -e "${RED}警告: 权重未完全进入内存，服务启动时间可能较长${NC}"
+    fi
+}
+
+# 启动服务进程（不等待，打印启动时间供编排工具统计启动窗口）
+launch_service() {
+    cd /usr/local/Ascend/mindie/latest/mindie-service/
+    nohup ./bin/mindieservice_daemon > output_$(date +"%Y%m%d%H%M").log 2>&1 &
+    echo "LAUNCH_TIME=$(date +%s.%N)"
+    cd - > /dev/null
 }
 
 start_service() {
@@ -481,22 +471,7 @@ BEGIN {
         echo -e "${RED}错误: 获取world_size失败${NC}"
         exit 1
     } 
-    # 修改模型权重路径config权限
-    config_file="$model_path/config.json"
-    if [ -f "$config_file" ]; then
-        echo -e "${BLUE}修改模型配置文件权限: $config_file${NC}"
-        chown -R root:root $model_path
-        chmod -R 640 $model_path
-        chmod 750 "$config_file"
-
-        if [ $? -eq 0 ]; then
-            echo -e "${GREEN}配置文件权限修改成功${NC}"
-        else
-            echo -e "${RED}警告: 配置文件权限修改失败${NC}"
-        fi
-    else
-        echo -e "${RED}警告: 未找到模型配置文件: $config_file${NC}"
-    fi
+    trace_run fix_permissions fix_service_file_permissions
     
     if [ "$current_ip" = "$master_ip" ]; then
         echo -e "${BLUE}当前机器是主节点 ($current_ip)${NC}"
@@ -506,58 +481,7 @@ BEGIN {
         echo -e "${BLUE}注意: 请确保主节点 ($master_ip) 已经启动服务${NC}"
     fi
 
-    # 修改rank_table_file.json权限
-    chmod 640 /usr/local/Ascend/mindie/latest/mindie-service/rank_table_file.json
-    
-    # 检查 transformers 版本
-    echo -e "${BLUE}检查 transformers 版本兼容性...${NC}"
-    generation_config="$model_path/generation_config.json"
-    if [ -f "$generation_config" ]; then
-        # 获取配置文件中的版本
-        config_version=$(python3 -c '
-import json
-with open("'"$generation_config"'") as f:
-    config = json.load(f)
-print(config.get("transformers_version", ""))
-')
-        # 获取当前环境的版本
-        current_version=$(python3 -c '
-import transformers
-print(transformers.__version__)
-')
-        
-        if [ ! -z "$config_version" ] && [ "$config_version" != "$current_version" ]; then
-            echo -e "${BLUE}发现版本不匹配:${NC}"
-            echo -e "  配置文件版本: $config_version"
-            echo -e "  当前环境版本: $current_version"
-            
-            read -p "是否安装配置文件指定的 transformers 版本 ($config_version)? (y/n): " yn
-            case $yn in
-                [Yy]* )
-                    echo -e "${BLUE}正在安装 transformers=$config_version...${NC}"
-                    if pip install "transformers==$config_version" -i https://mirrors.tuna.tsinghua.edu.cn/pypi/web/simple; then
-                        echo -e "${GREEN}transformers 版本已更新为: $config_version${NC}"
-                    else
-                        echo -e "${RED}警告: transformers 版本安装失败${NC}"
-                        echo -e "${BLUE}您可以稍后手动安装:${NC}"
-                        echo -e "pip install transformers==$config_version"
-                    fi
-                    ;;
-                [Nn]* )
-                    echo -e "${BLUE}保持当前环境版本${NC}"
-                    echo -e "${BLUE}如需手动安装，请执行:${NC}"
-                    echo -e "pip install transformers==$config_version"
-                    ;;
-                * )
-                    echo "请输入 y 或 n"
-                    ;;
-            esac
-        else
-            echo -e "${GREEN}transformers 版本匹配，无需调整${NC}"
-        fi
-    else
-        echo -e "${BLUE}未找到 generation_config.json 文件，跳过版本检查${NC}"
-    fi
+    trace_run weights_cache_wait wait_weights_cached
     
     # 询问是否启动服务
     while true; do
@@ -574,17 +498,25 @@ print(transformers.__version__)
                     echo -e "${GREEN}~/.bashrc已正确加载 ${NC}"
                 fi
 
-                cd /usr/local/Ascend/mindie/latest/mindie-service/
-                nohup ./bin/mindieservice_daemon > output_$(date +"%Y%m%d%H%M").log 2>&1 &
+                trace_run daemon_start launch_service
                 
-                # 等待服务启动
-                sleep 5
-                if ps aux | grep -v grep | grep mindieservice_daemon > /dev/null; then
-                    echo -e "${GREEN}服务已成功启动${NC}"
+                # 等待服务启动：主节点轮询服务接口直到可以接收请求，从节点只检查进程
+                if [ "$current_ip" = "$master_ip" ]; then
+                    echo -e "${BLUE}提示: 请在另外的终端启动所有从节点服务，主节点将等待服务就绪${NC}"
+                    if trace_run wait_ready python3 lib/wait_ready.py --process mindieservice_daemon --record ready_time.jsonl; then
+                        trace_event i service_ready
+                        echo -e "${GREEN}服务已成功启动${NC}"
+                    else
+                        echo -e "${RED}警告: 服务未能就绪，请检查日志${NC}"
+                    fi
                 else
-                    echo -e "${RED}警告: 服务可能未正常启动，请检查日志${NC}"
+                    sleep 5
+                    if ps aux | grep -v grep | grep mindieservice_daemon > /dev/null; then
+                        echo -e "${GREEN}服务已成功启动${NC}"
+                    else
+                        echo -e "${RED}警告: 服务可能未正常启动，请检查日志${NC}"
+                    fi
                 fi
-                cd -
                 break;;
             [Nn]* )
                 echo -e "${BLUE}跳过服务启动${NC}"
@@ -606,6 +538,13 @@ print(transformers.__version__)
     echo -e "${BLUE}请检查各个步骤的输出确保部署成功${NC}"
 }
 
+# 输出本次部署的阶段耗时摘要并导出时间线（多机部署可在主节点执行 lib/deploy_trace.py --collect 汇总所有节点）
+print_trace_summary() {
+    [ -n "$TRACE_FILE" ] && [ -s "$TRACE_FILE" ] || return 0
+    echo -e "\n${BLUE}=== 阶段耗时 ===${NC}"
+    python3 lib/deploy_trace.py "$TRACE_FILE" -o deploy_trace.json || echo -e "${RED}警告: 阶段耗时汇总失败${NC}"
+}
+
 # 主函数
 main() {
     # 设置错误处理
@@ -613,24 +552,46 @@ main() {
     trap 'cleanup_and_exit $? "执行过程中发生错误"' ERR
     
     echo -e "${BLUE}=== NPU自动化部署工具 ===${NC}"
-    world_size=$(read_config "world_size")
-    
+    if [ "$1" = "--in-container" ] || [ "$1" = "--start-service" ] || [ "$1" = "--launch" ]; then
+        load_config || cleanup_and_exit 1 "读取配置失败"
+    elif [ "$1" = "--prepare" ]; then
+        # 由 lib/deploy_cluster.py 经SSH调用，本节点不发起SSH连接，无需持有编排节点的私钥
+        validate_config --no-ssh-key-check || cleanup_and_exit 1 "配置验证失败"
+    elif [ "$1" != "--cleanup" ]; then
+        validate_config || cleanup_and_exit 1 "配置验证失败"
+    fi
+    world_size="$CFG_WORLD_SIZE"
+    TRACE_HOST="${TRACE_HOST:-$(local_node_ip)}"
 
     if [ "$1" = "--in-container" ]; then
         check_files || cleanup_and_exit 1 "必要文件检查失败"
         deploy_in_container
     elif [ "$1" = "--start-service" ]; then
         start_service
+    elif [ "$1" = "--launch" ]; then
+        # 容器内非交互启动服务，由 lib/deploy_cluster.py 在各节点同时调用
+        trace_run daemon_start launch_service
+    elif [ "$1" = "--prepare" ]; then
+        # 多机部署的非交互准备阶段：rank表已由 lib/deploy_cluster.py 生成并分发
+        [ "$CFG_DEPLOY_MODE" = "multi" ] || cleanup_and_exit 1 "--prepare 仅用于多机部署"
+        # NPU链路检查已由 lib/deploy_cluster.py 对全部节点统一执行
+        check_dependencies || cleanup_and_exit 1 "依赖检查失败"
+        echo -e "\n${GREEN}[1/1] 启动Docker容器...${NC}"
+        start_docker_and_deploy --prepare || cleanup_and_exit 1 "Docker容器启动或部署失败"
     elif [ "$1" = "--cleanup" ]; then
         cleanup_previous_container
         exit 0
     else
+        # 每次完整部署重新记录阶段事件
+        [ -z "$TRACE_FILE" ] || : > "$TRACE_FILE"
+
         # 根据world_size判断部署流程
-        if [ "$world_size" -lt 9 ]; then
+        if [ "$CFG_DEPLOY_MODE" = "single" ]; then
             echo -e "${BLUE}检测到 world_size <= 8，将执行单机部署流程${NC}"
             
             check_dependencies || cleanup_and_exit 1 "依赖检查失败"
-            validate_config || cleanup_and_exit 1 "配置验证失败"
+            echo -e "${BLUE}执行部署前检查...${NC}"
+            trace_run preflight run_preflight || cleanup_and_exit 1 "部署前检查失败"
             
             # 1. 读取配置文件
             echo -e "\n${GREEN}[1/5] 读取配置信息...${NC}"
@@ -654,7 +615,7 @@ main() {
             echo -e "\n${GREEN}[2/5] 启动Docker容器...${NC}"
             
             # 清理之前的容器
-            cleanup_previous_container || cleanup_and_exit 1 "清理之前的容器失败"
+            trace_run container_cleanup cleanup_previous_container || cleanup_and_exit 1 "清理之前的容器失败"
             
             # 从配置文件获取Docker相关配置
             image=$(read_config "docker.image")
@@ -674,7 +635,7 @@ main() {
             
             # 启动容器
             chmod a+x lib/start_docker_single_node.sh
-            ./lib/start_docker_single_node.sh "$container_name" "$image" "$volumes_args" "$device_ids" || cleanup_and_exit 1 "Docker容器启动失败"
+            trace_run container_start ./lib/start_docker_single_node.sh "$container_name" "$image" "$volumes_args" "$device_ids" || cleanup_and_exit 1 "Docker容器启动失败"
             
             # 记录容器名称到缓存文件
             echo "$container_name" > "$CONTAINER_CACHE"
@@ -686,77 +647,36 @@ main() {
             docker exec "$container_name" mkdir -p /workspace
             docker exec "$container_name" mkdir -p /usr/local/Ascend/mindie/latest/mindie-service/
             
-            # 复制必要文件到容器
-            echo -e "${BLUE}复制配置文件到容器...${NC}"
-            docker cp "$CONFIG_FILE" "$container_name:/workspace/"
-            docker cp . "$container_name:/workspace/"
+            # 只同步容器内部署需要的文件（内容未变化的文件跳过）
+            echo -e "${BLUE}同步部署文件到容器...${NC}"
+            trace_run workspace_sync python3 lib/sync_workspace.py "$container_name" --config "$CONFIG_FILE" || cleanup_and_exit 1 "同步部署文件到容器失败"
             
             # 3. 配置环境变量
             echo -e "\n${GREEN}[3/5] 配置环境变量...${NC}"
-            docker exec "$container_name" bash -c "cd /workspace && chmod +x lib/add_env_settings_single_node.sh && ./lib/add_env_settings_single_node.sh '$container_ip' '$container_ip' '$world_size'" || cleanup_and_exit 1 "环境变量配置失败"
+            trace_run env_setup docker exec "$container_name" bash -c "cd /workspace && chmod +x lib/add_env_settings_single_node.sh && ./lib/add_env_settings_single_node.sh '$container_ip' '$container_ip' '$world_size' '$device_ids'" || cleanup_and_exit 1 "环境变量配置失败"
             
             # 4. 修改Mindie服务配置
             echo -e "\n${GREEN}[4/5] 修改Mindie服务配置...${NC}"
-            docker exec "$container_name" bash -c "cd /workspace && python3 lib/modify_mindie_config_single_node.py --container-ip '$container_ip' --model-name '$model_name' --model-path '$model_path' --world-size '$world_size' --device-ids '$device_ids'" || cleanup_and_exit 1 "Mindie服务配置修改失败"
+            trace_run config_render docker exec "$container_name" bash -c "cd /workspace && python3 lib/modify_mindie_config_single_node.py --container-ip '$container_ip' --model-name '$model_name' --model-path '$model_path' --world-size '$world_size' --device-ids '$device_ids' --overrides '$(basename "$CONFIG_FILE")' --overrides-key mindie_overrides --auto-size" || cleanup_and_exit 1 "Mindie服务配置修改失败"
             
             # 5. 启动服务
             echo -e "\n${GREEN}[5/5] 启动服务...${NC}"
             
             # 修改模型权重路径config权限
-            docker exec "$container_name" bash -c "chmod -R 640 $model_path"
-            docker exec "$container_name" bash -c "[ -f '$model_path/config.json' ] && chmod 750 '$model_path/config.json'"
-            
-            # 检查 transformers 版本
-            echo -e "${BLUE}检查 transformers 版本兼容性...${NC}"
-            docker exec "$container_name" bash -c "
-                generation_config=\"$model_path/generation_config.json\"
-                if [ -f \"\$generation_config\" ]; then
-                    # 获取配置文件中的版本
-                    config_version=\$(python3 -c '
-import json
-with open(\"'\$generation_config'\") as f:
-    config = json.load(f)
-print(config.get(\"transformers_version\", \"\"))
-')
-                    # 获取当前环境的版本
-                    current_version=\$(python3 -c '
-import transformers
-print(transformers.__version__)
-')
-                    
-                    if [ ! -z \"\$config_version\" ] && [ \"\$config_version\" != \"\$current_version\" ]; then
-                        echo -e \"${BLUE}发现版本不匹配:${NC}\"
-                        echo -e \"  配置文件版本: \$config_version\"
-                        echo -e \"  当前环境版本: \$current_version\"
-                        
-                        read -p \"是否安装配置文件指定的 transformers 版本 (\$config_version)? (y/n): \" yn
-                        case \$yn in
-                            [Yy]* )
-                                echo -e \"${BLUE}正在安装 transformers=\$config_version...${NC}\"
-                                if pip install \"transformers==\$config_version\" -i https://mirrors.tuna.tsinghua.edu.cn/pypi/web/simple; then
-                                    echo -e \"${GREEN}transformers 版本已更新为: \$config_version${NC}\"
-                                else
-                                    echo -e \"${RED}警告: transformers 版本安装失败${NC}\"
-                                    echo -e \"${BLUE}您可以稍后手动安装:${NC}\"
-                                    echo -e \"pip install transformers==\$config_version\"
-                                fi
-                                ;;
-                            [Nn]* )
-                                echo -e \"${BLUE}保持当前环境版本${NC}\"
-                                echo -e \"${BLUE}如需手动安装，请执行:${NC}\"
-                                echo -e \"pip install transformers==\$config_version\"
-                                ;;
-                            * )
-                                echo \"请输入 y 或 n\"
-                                ;;
-                        esac
-                    else
-                        echo -e \"${GREEN}transformers 版本匹配，无需调整${NC}\"
-                    fi
-                else
-                    echo -e \"${BLUE}未找到 generation_config.json 文件，跳过版本检查${NC}\"
+            trace_run fix_permissions docker exec "$container_name" bash -c "chmod -R 640 $model_path"
+            trace_run fix_permissions docker exec "$container_name" bash -c "[ -f '$model_path/config.json' ] && chmod 750 '$model_path/config.json'"
+
+            # 内存预热：与多机流程一致，在容器内常驻预热并等待权重进入页缓存后再启动服务
+            if docker exec "$container_name" test -d "$model_path"; then
+                echo -e "${BLUE}开始在 $model_path 目录下执行内存预热，日志: 容器内 /workspace/output_mem.log${NC}"
+                trace_run preload_start docker exec -d "$container_name" bash -c "cd /workspace && python3 lib/preload_weights.py '$model_path' > output_mem.log 2>&1"
+                echo -e "${BLUE}等待模型权重进入内存 (目标 ${WEIGHT_CACHE_TARGET}%)...${NC}"
+                if ! trace_run weights_cache_wait docker exec "$container_name" bash -c "cd /workspace && python3 lib/page_cache_status.py '$model_path' --wait-until '$WEIGHT_CACHE_TARGET' --timeout '$WEIGHT_CACHE_TIMEOUT' --interval 10"; then
+                    echo -e "${RED}警告: 权重未完全进入内存，服务启动时间可能较长${NC}"
                 fi
-            "
+            else
+                echo -e "${RED}警告: 容器内模型目录不存在: $model_path，跳过内存预热${NC}"
+            fi
             
             # 询问是否启动服务
             while true; do
@@ -764,14 +684,14 @@ print(transformers.__version__)
                 case $yn in
                     [Yy]* )
                         echo -e "${BLUE}正在启动服务...${NC}"
-                        docker exec "$container_name" bash -c "cd /usr/local/Ascend/mindie/latest/mindie-service/ && nohup ./bin/mindieservice_daemon > output_\$(date +\"%Y%m%d%H%M\").log 2>&1 &"
+                        trace_run daemon_start docker exec "$container_name" bash -c "cd /usr/local/Ascend/mindie/latest/mindie-service/ && nohup ./bin/mindieservice_daemon > output_\$(date +\"%Y%m%d%H%M\").log 2>&1 &"
                         
-                        # 等待服务启动
-                        sleep 10
-                        if docker exec "$container_name" bash -c "ps aux | grep -v grep | grep mindieservice_daemon > /dev/null"; then
+                        # 等待服务接口就绪
+                        if trace_run wait_ready docker exec "$container_name" bash -c "cd /workspace && python3 lib/wait_ready.py --process mindieservice_daemon --record ready_time.jsonl"; then
+                            trace_event i service_ready
                             echo -e "${GREEN}服务已成功启动${NC}"
                         else
-                            echo -e "${RED}警告: 服务可能未正常启动，请检查日志${NC}"
+                            echo -e "${RED}警告: 服务未能就绪，请检查日志${NC}"
                         fi
                         break;;
                     [Nn]* )
@@ -788,20 +708,15 @@ print(transformers.__version__)
             
             echo -e "\n${GREEN}单机部署完成!${NC}"
             echo -e "${BLUE}请检查各个步骤的输出确保部署成功${NC}"
+            print_trace_summary
             
         else
             echo -e "${BLUE}检测到 world_size > 8，执行多机部署流程${NC}"
         
             check_dependencies || cleanup_and_exit 1 "依赖检查失败"
-            validate_config || cleanup_and_exit 1 "配置验证失败"
             
-            # 1. 执行网络检查
-            echo -e "\n${GREEN}[1/8] 执行网络环境检查...${NC}"
-            chmod a+x lib/auto_check.sh
-            ./lib/auto_check.sh || cleanup_and_exit 1 "网络检查失败"
-            
-            # 2. 安装依赖并生成rank表
-            echo -e "\n${GREEN}[2/8] 生成rank表配置...${NC}"
+            # 1. 安装依赖并生成rank表
+            echo -e "\n${GREEN}[1/8] 生成rank表配置...${NC}"
             
             # Python和pip检查
             command -v python3 >/dev/null 2>&1 || cleanup_and_exit 1 "未找到python3命令"
@@ -809,52 +724,35 @@ print(transformers.__version__)
             
             # 安装paramiko
             echo -e "${BLUE}安装SSH连接所需的paramiko库...${NC}"
-            pip3 install resources/paramiko-3.5.1-py3-none-any.whl --find-links=./resources --no-index || cleanup_and_exit 1 "paramiko安装失败"
+            trace_run install_paramiko pip3 install resources/paramiko-3.5.1-py3-none-any.whl --find-links=./resources --no-index || cleanup_and_exit 1 "paramiko安装失败"
             
-            # 从配置文件获取节点信息和SSH配置
-            nodes=$(read_config "nodes")
-            username=$(read_config "ssh.username")
-            use_key=$(read_config "ssh.use_key")
-            key_path=$(read_config "ssh.key_path")
-            password=$(read_config "ssh.password")
-            ssh_port=$(read_config "ssh.port")
-
-            # 构建命令行参数
-            # 移除最后一个换行符，然后转换换行为逗号
-            nodes=$(echo "$nodes" | sed '/^$/d' | tr '\n' ',')
-            # 移除最后一个逗号（如果存在）
-            nodes=${nodes%,}
-            cmd="python3 lib/generate_ranktable.py --nodes '$nodes' --username $username"
+            # 在所有节点上并发执行部署前检查（输入未变化的检查复用上次结果）
+            echo -e "${BLUE}执行部署前检查...${NC}"
+            trace_run preflight run_preflight || cleanup_and_exit 1 "部署前检查失败"
             
-            # 添加端口参数
-            if [ "$ssh_port" != "null" ]; then
-                cmd="$cmd --port $ssh_port"
-            fi
-
-            if [ "$use_key" = "true" ]; then
+            # 从配置文件获取节点信息和SSH配置（SSH端口缺省值、密钥路径展开及认证方式已在validate_config中校验）
+            cmd="python3 lib/generate_ranktable.py --nodes '$CFG_NODES_CSV' --username '$CFG_SSH_USERNAME' --port $CFG_SSH_PORT"
+            if [ "$CFG_SSH_USE_KEY" = "true" ]; then
                 cmd="$cmd --use-key"
-                # 如果指定了密钥路径，确保它存在
-                if [ ! -z "$key_path" ] && [ "$key_path" != "null" ]; then
-                    key_path=$(eval echo "$key_path")  # 展开路径中的~
-                    if [ ! -f "$key_path" ]; then
-                        echo -e "${RED}错误: SSH密钥文件不存在: $key_path${NC}"
-                        exit 1
-                    fi
+                if [ -n "$CFG_SSH_KEY_PATH" ]; then
+                    cmd="$cmd --key-path '$CFG_SSH_KEY_PATH'"
                 fi
             else
-                if [ -z "$password" ] || [ "$password" = "null" ]; then
-                    echo -e "${RED}错误: 未使用SSH密钥但未提供密码${NC}"
-                    exit 1
-                fi
-                cmd="$cmd --password $password"
+                cmd="$cmd --password '$CFG_SSH_PASSWORD'"
             fi
 
             # 执行rank表生成
-            eval "$cmd" || cleanup_and_exit 1 "rank表生成失败"
+            trace_run rank_table eval "$cmd" || cleanup_and_exit 1 "rank表生成失败"
+            
+            # 2. 检查本机各卡到rank表中所有卡的链路（同时关闭TLS）
+            echo -e "\n${GREEN}[2/8] 执行NPU链路检查...${NC}"
+            trace_run link_check python3 lib/link_check.py --rank-table rank_table_file.json --local-node --disable-tls \
+                --json link_check.json || cleanup_and_exit 1 "NPU链路检查失败，详见 link_check.json"
             
             # 3. 启动Docker容器
             echo -e "\n${GREEN}[3/8] 启动Docker容器...${NC}"
             start_docker_and_deploy || cleanup_and_exit 1 "Docker容器启动或部署失败"
+            print_trace_summary
         fi
     fi
 }
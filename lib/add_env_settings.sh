@@ -53,6 +53,20 @@ if ! [[ "$WORLD_SIZE" =~ ^[0-9]+$ ]]; then
     exit 1
 fi
 
+# 可见设备，与绑核配置保持一致
+DEVICE_IDS=0,1,2,3,4,5,6,7
+
+# 按NUMA和PCIe拓扑生成绑核及线程数配置，生成失败时使用默认值
+AFFINITY_SETTINGS=$(python3 "$(dirname "$0")/gen_cpu_affinity.py" --device-ids "$DEVICE_IDS")
+if [ $? -ne 0 ] || [ -z "$AFFINITY_SETTINGS" ]; then
+    echo "警告: 无法根据CPU拓扑生成绑核配置，使用默认值"
+    AFFINITY_SETTINGS="# OMP配置可提升权重加载速度
+export OMP_NUM_THREADS=10
+export TASK_QUEUE_ENABLE=2
+# CPU细粒度绑核
+export CPU_AFFINITY_CONF=2"
+fi
+
 # 准备要添加的环境变量配置
 CONFIG="
 # NPU环境配置
@@ -62,7 +76,7 @@ source /usr/local/Ascend/nnal/atb/set_env.sh
 source /usr/local/Ascend/atb-models/set_env.sh
 
 # 设备和基础配置
-export ASCEND_RT_VISIBLE_DEVICES=0,1,2,3,4,5,6,7
+export ASCEND_RT_VISIBLE_DEVICES=$DEVICE_IDS
 export ATB_LLM_BENCHMARK_ENABLE=1
 export ATB_LLM_ENABLE_AUTO_TRANSPOSE=0
 export MASTER_IP=$MASTER_IP
@@ -70,13 +84,7 @@ export WORLD_SIZE=$WORLD_SIZE
 export MIES_CONTAINER_IP=$CONTAINER_IP
 export HCCL_CONNECT_TIMEOUT=7200
 export HCCL_EXEC_TIMEOUT=0
-# OMP配置可提升权重加载速度
-export OMP_NUM_THREADS=10  
-export TASK_QUEUE_ENABLE=2
-# CPU细粒度绑核
-export CPU_AFFINITY_CONF=2
-# or 自定义粒度绑核
-# export CPU_AFFINITY_CONF=1, npu0:0-7, npu1:24-31, npu2:48-55, npu3:72-79, npu4:96-103, npu5:120-127, npu6:144-151, npu7:168-175
+$AFFINITY_SETTINGS
 
 # HCCL配置
 export HCCL_DETERMINISTIC=false # 关闭确定性计算可以提升性能
@@ -20,23 +20,36 @@ check_ip() {
 }
 
 # 检查是否提供了必要的参数
-if [ "$#" -ne 3 ]; then
-    echo "用法: $0 <master_ip> <container_ip> <world_size>"
-    echo "示例: $0 10.0.0.26 10.0.0.26 32"
+if [ "$#" -lt 3 ] || [ "$#" -gt 4 ]; then
+    echo "用法: $0 <master_ip> <container_ip> <world_size> [device_ids]"
+    echo "示例: $0 10.0.0.26 10.0.0.26 32 [0,1,2,3]"
     echo "说明:"
     echo "  master_ip: 主节点IP地址"
     echo "  container_ip: 当前宿主机IP地址"
     echo "  world_size: 总的设备数量"
+    echo "  device_ids: 使用的设备ID，用于生成绑核配置（可选，默认全部设备）"
     exit 1
 fi
 
 CONTAINER_IP=$1
+DEVICE_IDS=$4
 
 if ! check_ip "$CONTAINER_IP"; then
     echo "错误: 无效的容器IP地址格式: $CONTAINER_IP"
     exit 1
 fi
 
+# 按NUMA和PCIe拓扑生成绑核及线程数配置，生成失败时使用默认值
+AFFINITY_SETTINGS=$(python3 "$(dirname "$0")/gen_cpu_affinity.py" ${DEVICE_IDS:+--device-ids "$DEVICE_IDS"})
+if [ $? -ne 0 ] || [ -z "$AFFINITY_SETTINGS" ]; then
+    echo "警告: 无法根据CPU拓扑生成绑核配置，使用默认值"
+    AFFINITY_SETTINGS="# OMP配置可提升权重加载速度
+export OMP_NUM_THREADS=10
+export TASK_QUEUE_ENABLE=2
+# CPU细粒度绑核
+export CPU_AFFINITY_CONF=2"
+fi
+
 # 准备要添加的环境变量配置
 CONFIG="
 # NPU环境配置
@@ -47,10 +60,7 @@ CONFIG="
 
 # 设备和基础配置
 export MIES_CONTAINER_IP=$CONTAINER_IP
-export OMP_NUM_THREADS=10
-export TASK_QUEUE_ENABLE=2
-# CPU细粒度绑核
-export CPU_AFFINITY_CONF=2
+$AFFINITY_SETTINGS
 
 # 日志配置
 export ASCEND_SLOG_PRINT_TO_STDOUT=0
@@ -1,74 +1,400 @@
-#!/usr/bin/env python3
-import os
-import hashlib
-import argparse
-from pathlib import Path
-
-def calculate_md5(file_path):
-    """计算文件的MD5值"""
-    md5_hash = hashlib.md5()
-    with open(file_path, "rb") as f:
-        # 分块读取文件，避免大文件导致内存问题
-        for chunk in iter(lambda: f.read(4096), b""):
-            md5_hash.update(chunk)
-    return md5_hash.hexdigest()
-
-def find_model_files(directory):
-    """查找目录中所有以model开头的文件"""
-    results = []
-    for root, _, files in os.walk(directory):
-        for file in files:
-            if file.startswith('model'):
-                full_path = os.path.join(root, file)
-                results.append(full_path)
-    return results
-
-def main():
-    parser = argparse.ArgumentParser(description='计算指定目录下所有model*文件的MD5值')
-    parser.add_argument('directory', nargs='?', default='.', 
-                      help='要扫描的目录路径（默认为当前目录）')
-    parser.add_argument('-o', '--output', help='输出结果到文件')
-    
-    args = parser.parse_args()
-    
-    # 确保目录存在
-    if not os.path.exists(args.directory):
-        print(f"错误：目录 '{args.directory}' 不存在")
-        return
-
-    # 查找所有model文件
-    model_files = find_model_files(args.directory)
-    
-    if not model_files:
-        print(f"在 '{args.directory}' 中没有找到以model开头的文件")
-        return
-
-    # 计算并存储结果
-    results = []
-    for file_path in model_files:
-        try:
-            md5 = calculate_md5(file_path)
-            relative_path = os.path.relpath(file_path, args.directory)
-            results.append((relative_path, md5))
-            print(f"处理: {relative_path}")
-        except Exception as e:
-            print(f"处理文件 '{file_path}' 时出错: {e}")
-
-    # 输出结果
-    output_content = "\n=== MD5计算结果 ===\n"
-    for file_path, md5 in sorted(results):
-        output_content += f"{file_path}: {md5}\n"
-
-    print(output_content)
-
-    # 如果指定了输出文件，将结果写入文件
-    if args.output:
-        try:
-            with open(args.output, 'w', encoding='utf-8') as f:
-                f.write(output_content)
-            print(f"\n结果已保存到: {args.output}")
-        except Exception as e:
-            print(f"写入输出文件时出错: {e}")
-
-if __name__ == "__main__":
-    main() 
\ No newline at end of file
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import fnmatch
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# 默认读缓冲区大小（8MiB），大块顺序读可以显著减少系统调用次数
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MB = 1024 * 1024
+
+# 每个进程复用同一块缓冲区，避免每个分块重新分配内存
+_read_buffer = None
+
+def _get_buffer(chunk_size):
+    """获取当前进程复用的读缓冲区"""
+    global _read_buffer
+    if _read_buffer is None or len(_read_buffer) != chunk_size:
+        _read_buffer = bytearray(chunk_size)
+    return _read_buffer
+
+def calculate_md5(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """计算文件的MD5值"""
+    md5_hash = hashlib.md5()
+    view = memoryview(_get_buffer(chunk_size))
+    # 关闭Python层缓冲，readinto直接写入复用的缓冲区，避免每块一次拷贝
+    with open(file_path, "rb", buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            try:
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            except OSError:
+                pass
+        while True:
+            n = f.readinto(view)
+            if not n:
+                break
+            md5_hash.update(view[:n])
+    return md5_hash.hexdigest()
+
+# 快速指纹模式：每个文件只读取头部和固定数量的采样区间
+QUICK_SAMPLE_COUNT = 16
+QUICK_SAMPLE_SIZE = 256 * 1024
+# 小于该大小的文件（配置、tokenizer等）直接全量计算
+QUICK_FULL_HASH_LIMIT = 16 * 1024 * 1024
+# safetensors头部长度上限，超过视为文件损坏
+SAFETENSORS_MAX_HEADER = 100 * 1024 * 1024
+# 快速模式覆盖的文件
+QUICK_PATTERNS = ("*.safetensors", "*.json", "tokenizer*", "*.tiktoken", "*.model", "vocab*", "merges.txt")
+QUICK_ALGORITHMS = sorted(a for a in hashlib.algorithms_guaranteed if not a.startswith('shake_'))
+
+def read_safetensors_header(f, file_size):
+    """
+    解析safetensors头部（8字节小端长度 + JSON头），并校验文件长度与头部声明是否一致
+
+    Returns:
+        tuple: (头部原始字节, 数据区起始偏移)
+    """
+    prefix = f.read(8)
+    if len(prefix) != 8:
+        raise ValueError("文件过短，缺少safetensors头部长度")
+    header_len = int.from_bytes(prefix, 'little')
+    if header_len > SAFETENSORS_MAX_HEADER or 8 + header_len > file_size:
+        raise ValueError(f"safetensors头部长度非法: {header_len}")
+    header_bytes = f.read(header_len)
+    header = json.loads(header_bytes)
+    data_len = max((v["data_offsets"][1] for k, v in header.items() if k != "__metadata__"), default=0)
+    expected_size = 8 + header_len + data_len
+    if file_size != expected_size:
+        raise ValueError(f"文件大小 {file_size} 与头部声明 {expected_size} 不一致（可能被截断）")
+    return header_bytes, 8 + header_len
+
+def quick_fingerprint(file_path, algorithm="blake2b"):
+    """计算文件的快速指纹：文件大小 + safetensors头部 + 数据区固定采样区间"""
+    file_hash = hashlib.new(algorithm)
+    file_size = os.path.getsize(file_path)
+    file_hash.update(str(file_size).encode())
+    with open(file_path, "rb") as f:
+        data_start = 0
+        if file_path.endswith(".safetensors"):
+            header_bytes, data_start = read_safetensors_header(f, file_size)
+            file_hash.update(header_bytes)
+        data_size = file_size - data_start
+        if data_size <= QUICK_FULL_HASH_LIMIT:
+            f.seek(data_start)
+            file_hash.update(f.read())
+        else:
+            # 在数据区内均匀采样，首尾区间必定包含在内
+            step = (data_size - QUICK_SAMPLE_SIZE) / (QUICK_SAMPLE_COUNT - 1)
+            for i in range(QUICK_SAMPLE_COUNT):
+                f.seek(data_start + int(i * step))
+                file_hash.update(f.read(QUICK_SAMPLE_SIZE))
+    return file_hash.hexdigest()
+
+def hash_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE, quick_algorithm=None):
+    """计算单个文件的MD5（或快速指纹），返回 (路径, 摘要, 文件大小, 耗时秒数)"""
+    start = time.perf_counter()
+    if quick_algorithm:
+        digest = quick_fingerprint(file_path, quick_algorithm)
+    else:
+        digest = calculate_md5(file_path, chunk_size)
+    elapsed = time.perf_counter() - start
+    return file_path, digest, os.path.getsize(file_path), elapsed
+
+def format_speed(size, elapsed):
+    """格式化吞吐量（MB/s）"""
+    if elapsed <= 0:
+        return "-- MB/s"
+    return f"{size / MB / elapsed:.1f} MB/s"
+
+def hash_files(file_paths, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, on_result=None,
+               quick_algorithm=None):
+    """
+    并行计算多个文件的MD5值
+
+    Args:
+        file_paths: 文件路径列表
+        workers: 进程数，默认为CPU核数
+        chunk_size: 读缓冲区大小
+        on_result: 每个文件完成时的回调，参数为 hash_file 的返回值
+        quick_algorithm: 指定时改为计算该算法的快速指纹
+
+    Returns:
+        tuple: (结果列表, 错误列表[(路径, 异常)])
+    """
+    workers = workers or os.cpu_count() or 1
+    # 大文件优先调度，减少尾部单个大文件拖慢整体的情况
+    ordered = sorted(file_paths, key=lambda p: os.path.getsize(p), reverse=True)
+    results = []
+    errors = []
+
+    if workers <= 1 or len(ordered) <= 1:
+        for file_path in ordered:
+            try:
+                result = hash_file(file_path, chunk_size, quick_algorithm)
+            except Exception as e:
+                errors.append((file_path, e))
+                continue
+            results.append(result)
+            if on_result:
+                on_result(result)
+        return results, errors
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(ordered))) as executor:
+        futures = {executor.submit(hash_file, p, chunk_size, quick_algorithm): p for p in ordered}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                errors.append((futures[future], e))
+                continue
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results, errors
+
+MANIFEST_VERSION = 1
+MANIFEST_SUFFIX = ".md5_manifest.json"
+QUICK_MANIFEST_SUFFIX = "_quick_manifest.json"
+# --all 覆盖的文件集合不同，使用单独的清单，避免与默认模式的清单互相覆盖
+ALL_MANIFEST_SUFFIX = ".all" + MANIFEST_SUFFIX
+
+def manifest_algorithm(quick_algorithm=None):
+    """清单中记录的摘要算法名"""
+    return f"{quick_algorithm}-quick" if quick_algorithm else "md5"
+
+def default_manifest_path(directory, quick_algorithm=None, include_all=False):
+    """
+    默认清单路径：与模型目录同级的 <目录名>.md5_manifest.json
+    （快速模式为 <目录名>.<算法>_quick_manifest.json，--all 为 <目录名>.all.md5_manifest.json）
+    """
+    base = os.path.abspath(directory).rstrip(os.sep)
+    if quick_algorithm:
+        return f"{base}.{quick_algorithm}{QUICK_MANIFEST_SUFFIX}"
+    if include_all:
+        return base + ALL_MANIFEST_SUFFIX
+    return base + MANIFEST_SUFFIX
+
+def stat_fingerprint(file_path):
+    """获取文件的stat指纹（大小、修改时间、inode）"""
+    st = os.stat(file_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+def load_manifest(manifest_path, algorithm="md5"):
+    """加载哈希清单，不存在、格式不对或算法不一致时返回None"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"警告: 无法读取清单文件 {manifest_path}: {e}")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION or not isinstance(manifest.get("files"), dict):
+        print(f"警告: 清单文件格式不兼容，忽略: {manifest_path}")
+        return None
+    if manifest.get("algorithm") != algorithm:
+        print(f"警告: 清单文件算法为 {manifest.get('algorithm')}，与当前 {algorithm} 不一致，忽略: {manifest_path}")
+        return None
+    return manifest
+
+def save_manifest(manifest_path, entries, algorithm="md5"):
+    """原子写入哈希清单（先写临时文件再rename）"""
+    manifest = {"version": MANIFEST_VERSION, "algorithm": algorithm, "files": entries}
+    tmp_path = f"{manifest_path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+        return True
+    except Exception as e:
+        print(f"警告: 保存清单文件失败 {manifest_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+def hash_directory(directory, file_paths, cached_entries=None, workers=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, on_result=None, quick_algorithm=None):
+    """
+    增量计算目录下文件的MD5：stat指纹未变化的文件直接复用清单中的结果
+
+    Returns:
+        tuple: (清单条目{相对路径: 指纹+digest}, 重新计算的文件数, 错误列表)
+    """
+    cached_entries = cached_entries or {}
+    entries = {}
+    pending = []
+    for file_path in file_paths:
+        relative_path = os.path.relpath(file_path, directory)
+        fingerprint = stat_fingerprint(file_path)
+        cached = cached_entries.get(relative_path)
+        if cached and all(cached.get(k) == v for k, v in fingerprint.items()) and cached.get("digest"):
+            entries[relative_path] = dict(fingerprint, digest=cached["digest"])
+        else:
+            pending.append(file_path)
+
+    hashed, errors = hash_files(pending, workers, chunk_size, on_result, quick_algorithm)
+    for file_path, md5, _, _ in hashed:
+        relative_path = os.path.relpath(file_path, directory)
+        entries[relative_path] = dict(stat_fingerprint(file_path), digest=md5)
+    return entries, len(hashed), errors
+
+def compare_manifest(expected, actual):
+    """比较两个清单条目，返回 (缺失文件, 多余文件, 内容不一致文件)"""
+    missing = sorted(set(expected) - set(actual))
+    extra = sorted(set(actual) - set(expected))
+    changed = sorted(p for p in set(expected) & set(actual)
+                     if expected[p].get("digest") != actual[p].get("digest"))
+    return missing, extra, changed
+
+def find_model_files(directory, patterns=("model*", "*.safetensors")):
+    """查找目录中所有匹配patterns的文件（默认：model开头的文件及所有safetensors权重）"""
+    results = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            if file.endswith(MANIFEST_SUFFIX) or file.endswith(QUICK_MANIFEST_SUFFIX):
+                continue
+            if any(fnmatch.fnmatch(file, pattern) for pattern in patterns):
+                full_path = os.path.join(root, file)
+                results.append(full_path)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='计算指定目录下所有model*及safetensors文件的MD5值')
+    parser.add_argument('directory', nargs='?', default='.',
+                      help='要扫描的目录路径（默认为当前目录）')
+    parser.add_argument('-o', '--output', help='输出结果到文件')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count(),
+                      help='并行计算的进程数（默认：CPU核数）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // MB,
+                      help=f'读缓冲区大小，单位MB（默认：{DEFAULT_CHUNK_SIZE // MB}）')
+    parser.add_argument('--manifest',
+                      help=f'哈希清单路径（默认：与模型目录同级的 <目录名>{MANIFEST_SUFFIX}）')
+    parser.add_argument('--no-cache', action='store_true',
+                      help='忽略已有清单，全部重新计算')
+    parser.add_argument('--verify', action='store_true',
+                      help='与已保存的清单对比，不一致时以非0状态码退出')
+    parser.add_argument('--porcelain', action='store_true',
+                      help='以 "<md5>  <相对路径>" 格式逐个输出结果到标准输出，其余信息输出到标准错误')
+    parser.add_argument('--quick', action='store_true',
+                      help='快速指纹模式：覆盖safetensors/json/tokenizer文件，只读取头部和采样区间')
+    parser.add_argument('--algorithm', choices=QUICK_ALGORITHMS, default='blake2b',
+                      help='快速指纹模式使用的哈希算法（默认：blake2b）')
+    parser.add_argument('--all', action='store_true',
+                      help='包含目录下的所有文件（如配置、tokenizer），分发权重时使用')
+
+    args = parser.parse_args()
+
+    # porcelain模式下标准输出只保留结果行，便于远程调用方逐行解析
+    porcelain_out = None
+    emitted = set()
+    if args.porcelain:
+        porcelain_out = sys.stdout
+        sys.stdout = sys.stderr
+
+    def emit(relative_path, md5):
+        if porcelain_out and relative_path not in emitted:
+            emitted.add(relative_path)
+            porcelain_out.write(f"{md5}  {relative_path}\n")
+            porcelain_out.flush()
+    quick_algorithm = args.algorithm if args.quick else None
+    algorithm = manifest_algorithm(quick_algorithm)
+    manifest_path = args.manifest or default_manifest_path(args.directory, quick_algorithm, args.all)
+
+    # 确保目录存在
+    if not os.path.exists(args.directory):
+        print(f"错误：目录 '{args.directory}' 不存在")
+        sys.exit(1)
+
+    # 查找所有权重文件
+    if args.quick:
+        model_files = find_model_files(args.directory, QUICK_PATTERNS)
+    elif args.all:
+        model_files = find_model_files(args.directory, ("*",))
+    else:
+        model_files = find_model_files(args.directory)
+
+    if not model_files:
+        print(f"在 '{args.directory}' 中没有找到模型文件")
+        # 校验模式下目录为空说明权重缺失，不能视为校验通过
+        if args.verify:
+            sys.exit(1)
+        return
+
+    print(f"共 {len(model_files)} 个文件，使用 {args.workers} 个进程计算")
+
+    # 复用清单的文件没有读盘，吞吐只按重新计算的字节数统计
+    rehashed_size = [0]
+
+    def report(result):
+        file_path, md5, size, elapsed = result
+        rehashed_size[0] += size
+        relative_path = os.path.relpath(file_path, args.directory)
+        emit(relative_path, md5)
+        print(f"处理: {relative_path} ({size / MB:.1f} MB, {elapsed:.2f}s, {format_speed(size, elapsed)})")
+        sys.stdout.flush()
+
+    manifest = None if args.no_cache and not args.verify else load_manifest(manifest_path, algorithm)
+    if args.verify and manifest is None:
+        print(f"错误: 未找到可用的清单文件: {manifest_path}")
+        sys.exit(1)
+    cached_entries = {} if args.no_cache else (manifest or {}).get("files", {})
+
+    # 计算并存储结果（stat指纹未变化的文件直接复用清单）
+    start = time.perf_counter()
+    entries, rehashed, errors = hash_directory(args.directory, model_files, cached_entries,
+                                               args.workers, max(args.chunk_size, 1) * MB, report,
+                                               quick_algorithm)
+    total_elapsed = time.perf_counter() - start
+
+    for file_path, e in errors:
+        print(f"处理文件 '{file_path}' 时出错: {e}")
+
+    results = [(relative_path, entry["digest"]) for relative_path, entry in entries.items()]
+    for relative_path, md5 in sorted(results):
+        emit(relative_path, md5)
+    total_size = sum(entry["size"] for entry in entries.values())
+    print(f"复用清单: {len(entries) - rehashed} 个文件, 重新计算: {rehashed} 个文件")
+
+    if args.verify:
+        missing, extra, changed = compare_manifest(manifest["files"], entries)
+        for label, paths in (("缺失", missing), ("多余", extra), ("不一致", changed)):
+            for relative_path in paths:
+                print(f"{label}: {relative_path}")
+        if missing or extra or changed or errors:
+            print(f"校验失败: 缺失 {len(missing)}, 多余 {len(extra)}, 不一致 {len(changed)}, 出错 {len(errors)}")
+            sys.exit(1)
+        print(f"校验通过: {len(entries)} 个文件与清单 {manifest_path} 一致 (耗时 {total_elapsed:.2f}s)")
+        return
+
+    if not errors and save_manifest(manifest_path, entries, algorithm):
+        print(f"清单已更新: {manifest_path}")
+
+    # 输出结果
+    output_content = f"\n=== {algorithm.upper()}计算结果 ===\n"
+    for file_path, md5 in sorted(results):
+        output_content += f"{file_path}: {md5}\n"
+
+    print(output_content)
+    print(f"总计: {len(results)} 个文件, {total_size / MB:.1f} MB（重新计算 {rehashed_size[0] / MB:.1f} MB）, "
+          f"耗时 {total_elapsed:.2f}s, 总吞吐 {format_speed(rehashed_size[0], total_elapsed)}")
+
+    # 如果指定了输出文件，将结果写入文件
+    if args.output:
+        try:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(output_content)
+            print(f"\n结果已保存到: {args.output}")
+        except Exception as e:
+            print(f"写入输出文件时出错: {e}")
+
+    # 有文件处理失败（如safetensors被截断）时返回非0，便于脚本判断
+    if errors:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
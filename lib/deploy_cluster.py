@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 多机一键部署编排工具
+      根据 deploy_config.json 执行部署前检查、生成rank表并检查全部NPU链路、分发部署工具，在所有节点上并行执行
+      deploy.sh --prepare，全部就绪后通过屏障在同一时间窗口内启动主节点和从节点服务，
+      最后汇总所有节点的阶段耗时到 deploy_trace.json
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import threading
+
+from deploy_config import validate
+from deploy_trace import (TraceWriter, TRACE_FILE, CLUSTER_TRACE_FILE, DEFAULT_OUTPUT, collect_remote,
+                          parse_events, export_trace)
+from generate_ranktable import get_local_ip, create_or_update_rank_table
+from link_check import load_endpoints, check_mesh
+from preflight import run_preflight, print_results, FAIL
+from ssh_pool import SSHSessionPool, DEFAULT_TIMEOUT
+from sync_workspace import build_manifest, build_tar
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RANK_TABLE_FILE = "rank_table_file.json"
+
+# 准备阶段（启动容器、配置环境、修改服务配置）单节点的超时时间（秒）
+PREPARE_TIMEOUT = 3600
+
+def load_deploy_config(config_path):
+    """加载并校验部署配置"""
+    try:
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"错误: 无法读取部署配置 {config_path}: {str(e)}")
+        return None
+    errors, notes = validate(config)
+    for note in notes:
+        print(note)
+    for error in errors:
+        print(f"错误: {error}")
+    return None if errors else config
+
+def make_printer(lock):
+    """生成带节点前缀的输出回调"""
+    def on_line(host, line):
+        with lock:
+            print(f"[{host}] {line}")
+            sys.stdout.flush()
+    return on_line
+
+def report_failures(stage, results):
+    """打印失败节点，返回是否全部成功"""
+    failed = {}
+    for host, result in results.items():
+        if isinstance(result, Exception):
+            failed[host] = str(result)
+        elif not result.ok:
+            failed[host] = (result.stderr.strip().splitlines() or [f"退出码 {result.exit_code}"])[-1]
+    for host, error in failed.items():
+        print(f"错误: {stage}失败 [{host}]: {error}")
+    return not failed
+
+def distribute_workspace(pool, nodes, local_ip, config_file, remote_dir):
+    """把部署工具、部署配置和rank表打包，一次性分发到所有远端节点"""
+    manifest = build_manifest(ROOT_DIR, config_file)
+    files = [(relative_path, file_path) for relative_path, (file_path, _) in manifest.items()]
+    files.append((RANK_TABLE_FILE, os.path.join(ROOT_DIR, RANK_TABLE_FILE)))
+    data = build_tar(files)
+
+    # 本机且目录相同则无需分发
+    targets = [n for n in nodes if not (n == local_ip and os.path.abspath(remote_dir) == ROOT_DIR)]
+    if not targets:
+        return True
+    print(f"分发部署工具到 {len(targets)} 个节点 ({len(data) / 1024:.1f} KB)...")
+    cmd = f"mkdir -p {shlex.quote(remote_dir)} && tar -x -f - -C {shlex.quote(remote_dir)}"
+    return report_failures("分发部署工具", pool.run_on_all(targets, cmd, input_data=data))
+
+def prepare_nodes(pool, nodes, remote_dir, config_name, on_line, timeout=PREPARE_TIMEOUT):
+    """在所有节点上并行执行准备阶段"""
+    cmd = (f"cd {shlex.quote(remote_dir)} && rm -f {TRACE_FILE} && "
+           f"CONFIG_FILE={shlex.quote(config_name)} bash deploy.sh --prepare < /dev/null")
+    start = time.monotonic()
+    results = pool.run_on_all(nodes, cmd, timeout=timeout, on_line=on_line)
+    ok = report_failures("准备阶段", results)
+    if ok:
+        print(f"所有节点准备完成，耗时 {time.monotonic() - start:.1f}s")
+    return ok
+
+def launch_command(remote_dir, config_name):
+    """在节点已准备好的容器内启动服务的命令"""
+    cache = shlex.quote(os.path.join(remote_dir, ".container_cache"))
+    # 启动耗时由编排工具统一记录，容器内不再记录阶段事件
+    inner = f"cd /workspace && CONFIG_FILE={shlex.quote(config_name)} TRACE_FILE= ./deploy.sh --launch"
+    return f"docker exec -i \"$(cat {cache})\" bash -l -c {shlex.quote(inner)} < /dev/null"
+
+def launch_with_barrier(pool, nodes, master_ip, remote_dir, config_name, timeout=DEFAULT_TIMEOUT):
+    """
+    屏障启动：所有节点的线程和SSH连接就绪后先启动主节点，主节点命令返回后立即释放从节点；
+    主节点启动失败时不再启动从节点
+
+    Returns:
+        dict: {节点: (相对发令时刻的启动耗时(秒), CommandResult 或 Exception, 开始时间, 结束时间)}，
+              未启动的从节点为None
+    """
+    workers = [n for n in nodes if n != master_ip]
+    # 预先建立连接，避免把认证耗时计入启动窗口
+    for node in nodes:
+        if node not in pool.local_hosts:
+            pool.get_client(node)
+
+    cmd = launch_command(remote_dir, config_name)
+    barrier = threading.Barrier(len(workers) + 1)
+    master_done = threading.Event()
+    master_failed = threading.Event()
+    results = {}
+    start = [None]
+
+    def launch(node):
+        launched = time.time()
+        try:
+            result = pool.run(node, cmd, timeout=timeout)
+        except Exception as e:
+            result = e
+        results[node] = (time.monotonic() - start[0], result, launched, time.time())
+
+    def worker(node):
+        barrier.wait()
+        master_done.wait()
+        if master_failed.is_set():
+            results[node] = None
+            return
+        launch(node)
+
+    threads = [threading.Thread(target=worker, args=(node,)) for node in workers]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start[0] = time.monotonic()
+    launch(master_ip)
+    result = results[master_ip][1]
+    if isinstance(result, Exception) or not result.ok:
+        master_failed.set()
+    master_done.set()
+    for t in threads:
+        t.join()
+    return results
+
+def wait_master_ready(pool, master_ip, remote_dir, timeout, on_line):
+    """在主节点容器内等待服务接口就绪"""
+    cache = shlex.quote(os.path.join(remote_dir, ".container_cache"))
+    inner = (f"cd /workspace && python3 lib/wait_ready.py --process mindieservice_daemon "
+             f"--timeout {timeout} --record ready_time.jsonl")
+    cmd = f"docker exec -i \"$(cat {cache})\" bash -l -c {shlex.quote(inner)} < /dev/null"
+    try:
+        result = pool.run(master_ip, cmd, timeout=timeout + 60, on_line=on_line)
+    except Exception as e:
+        print(f"错误: 等待服务就绪失败: {str(e)}")
+        return False
+    return result.ok
+
+def print_launch_report(nodes, master_ip, results, max_window):
+    """打印各节点启动时刻和启动窗口，返回是否全部成功且在窗口内"""
+    ok = True
+    print(f"\n{'节点'.ljust(16)}  {'角色'.ljust(4)}  启动耗时")
+    for node in nodes:
+        role = "主" if node == master_ip else "从"
+        if results[node] is None:
+            ok = False
+            print(f"{node.ljust(16)}  {role.ljust(4)}  未启动（主节点启动失败）")
+            continue
+        elapsed, result = results[node][:2]
+        if isinstance(result, Exception) or not result.ok:
+            ok = False
+            error = str(result) if isinstance(result, Exception) else (result.stderr.strip() or f"退出码 {result.exit_code}")
+            print(f"{node.ljust(16)}  {role.ljust(4)}  失败: {error}")
+        else:
+            print(f"{node.ljust(16)}  {role.ljust(4)}  {elapsed:.2f}s")
+    window = max(r[0] for r in results.values() if r is not None)
+    print(f"\n启动窗口: {window:.2f}s (上限 {max_window}s)")
+    if window > max_window:
+        print(f"错误: 启动窗口超过 {max_window}s，从节点可能因HCCL初始化超时失败")
+        ok = False
+    return ok
+
+def export_cluster_trace(pool, nodes, remote_dir):
+    """汇总编排工具和所有节点记录的阶段事件，导出时间线并打印摘要"""
+    with open(os.path.join(ROOT_DIR, CLUSTER_TRACE_FILE), 'r', encoding='utf-8') as f:
+        events = parse_events(f.read(), "orchestrator")
+    for node_events in collect_remote(pool, nodes, remote_dir).values():
+        events += node_events
+    output = os.path.join(ROOT_DIR, DEFAULT_OUTPUT)
+    print("\n=== 阶段耗时 ===")
+    print(export_trace(events, output))
+    print(f"\n时间线已保存到: {output}（可在 chrome://tracing 或 https://ui.perfetto.dev 中打开）")
+
+def deploy(args, pool, config, config_file, nodes, master_ip, local_ip, on_line, trace):
+    """按阶段执行多机部署，各阶段的起止时间记录到trace中，任一阶段失败时退出"""
+    if not args.skip_prepare:
+        print("\n=== 部署前检查 ===")
+        with trace.span("preflight"):
+            start = time.monotonic()
+            results = run_preflight(pool, nodes, config, local_ip or "localhost",
+                                    options={"allow_transformers_mismatch": args.allow_transformers_mismatch})
+            print_results(results, time.monotonic() - start)
+            if any(r["status"] == FAIL for r in results):
+                sys.exit(1)
+
+        print("\n=== [1/4] 生成rank表 ===")
+        output_path = os.path.join(ROOT_DIR, RANK_TABLE_FILE)
+        with trace.span("rank_table"):
+            rank_table, changed = create_or_update_rank_table(
+                nodes, pool, output_path, f"{output_path}.cache", args.force_ranktable, args.timeout)
+            if rank_table is None:
+                print("生成rank表失败")
+                sys.exit(1)
+            if changed:
+                with open(output_path, 'w') as f:
+                    json.dump(rank_table, f, indent=4)
+                print(f"rank表已生成并保存到: {output_path}")
+
+        # 所有节点并发检查全互联链路，同时关闭各卡TLS
+        print("\n=== 检查NPU链路 ===")
+        with trace.span("link_check"):
+            endpoints = load_endpoints(output_path)
+            if not endpoints:
+                sys.exit(1)
+            report = check_mesh(pool, endpoints, nodes, disable_tls=True)
+            if report["bad_links"] or report["device_issues"] or report["failed_nodes"]:
+                print("错误: NPU链路检查未通过，可执行 python3 lib/link_check.py --json FILE 查看详细结果")
+                sys.exit(1)
+
+        print("\n=== [2/4] 分发部署工具 ===")
+        with trace.span("distribute_workspace"):
+            if not distribute_workspace(pool, nodes, local_ip, config_file, args.remote_dir):
+                sys.exit(1)
+
+        print("\n=== [3/4] 并行准备所有节点 ===")
+        with trace.span("prepare_nodes"):
+            if not prepare_nodes(pool, nodes, args.remote_dir, os.path.basename(config_file),
+                                 on_line, args.prepare_timeout):
+                sys.exit(1)
+
+    print("\n=== [4/4] 屏障启动服务 ===")
+    results = launch_with_barrier(pool, nodes, master_ip, args.remote_dir,
+                                  os.path.basename(config_file), args.timeout)
+    for node, launch_result in results.items():
+        if launch_result is None:
+            continue
+        _, result, launched, finished = launch_result
+        ok = not isinstance(result, Exception) and result.ok
+        trace.complete("daemon_start", launched, finished, host=node,
+                       status=0 if ok else getattr(result, "exit_code", 1))
+    if not print_launch_report(nodes, master_ip, results, args.max_window):
+        sys.exit(1)
+
+    print("\n=== 等待主节点服务就绪 ===")
+    with trace.span("wait_ready", host=master_ip):
+        if not wait_master_ready(pool, master_ip, args.remote_dir, args.ready_timeout, on_line):
+            sys.exit(1)
+    trace.instant("service_ready", host=master_ip)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='多机一键部署编排工具')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--remote-dir', type=str, default=ROOT_DIR,
+                      help=f'远端节点上存放部署工具的目录（默认：{ROOT_DIR}）')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_TIMEOUT,
+                      help=f'SSH连接及启动命令超时时间（秒，默认：{DEFAULT_TIMEOUT}）')
+    parser.add_argument('--prepare-timeout', type=int, default=PREPARE_TIMEOUT,
+                      help=f'单节点准备阶段超时时间（秒，默认：{PREPARE_TIMEOUT}）')
+    parser.add_argument('--max-window', type=float, default=60,
+                      help='允许的最大启动窗口（秒，默认：60）')
+    parser.add_argument('--ready-timeout', type=int, default=1800,
+                      help='启动后等待主节点服务就绪的最长时间（秒，默认：1800）')
+    parser.add_argument('--force-ranktable', action='store_true',
+                      help='忽略缓存，重新探测所有节点并生成rank表')
+    parser.add_argument('--skip-prepare', action='store_true',
+                      help='跳过准备阶段，只在已准备好的容器中启动服务')
+    parser.add_argument('--allow-transformers-mismatch', action='store_true',
+                      help='镜像transformers版本与模型要求不一致时只告警，不中止部署')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    config_file = os.path.abspath(args.config)
+    config = load_deploy_config(config_file)
+    if not config:
+        sys.exit(1)
+    if int(config["world_size"]) < 9:
+        print("错误: 单机部署请直接执行 deploy.sh")
+        sys.exit(1)
+
+    nodes = config["nodes"]
+    master_ip = config["master_ip"]
+    if master_ip not in nodes:
+        print(f"错误: master_ip {master_ip} 不在nodes列表中")
+        sys.exit(1)
+    local_ip = get_local_ip(nodes)
+    lock = threading.Lock()
+    on_line = make_printer(lock)
+    deploy_start = time.monotonic()
+    trace_path = os.path.join(ROOT_DIR, CLUSTER_TRACE_FILE)
+    if os.path.exists(trace_path):
+        os.remove(trace_path)
+    trace = TraceWriter(trace_path, host=local_ip or None)
+
+    with SSHSessionPool.from_config(config.get("ssh"), args.timeout, local_hosts=[local_ip]) as pool:
+        try:
+            deploy(args, pool, config, config_file, nodes, master_ip, local_ip, on_line, trace)
+        finally:
+            # 部署失败时同样导出已记录的阶段，便于定位耗时和失败位置
+            try:
+                export_cluster_trace(pool, nodes, args.remote_dir)
+            except Exception as e:
+                print(f"警告: 汇总阶段耗时失败: {str(e)}")
+    print(f"\n部署完成，总耗时 {time.monotonic() - deploy_start:.1f}s")
+
+if __name__ == '__main__':
+    main()
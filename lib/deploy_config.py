@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 部署配置加载工具
+      一次性读取并校验 deploy_config.json，把 deploy.sh 需要的所有字段以
+      shell 可 eval 的 CFG_* 变量输出，避免每个字段都启动一次 python3
+"""
+
+import os
+import sys
+import json
+import shlex
+import stat
+import argparse
+
+# 需要导出给 deploy.sh 的字段（点号路径）
+EXPORT_FIELDS = [
+    "world_size",
+    "container_ip",
+    "master_ip",
+    "nodes",
+    "model_name",
+    "model_path",
+    "device_ids",
+    "docker.image",
+    "docker.volumes",
+    "ssh.username",
+    "ssh.use_key",
+    "ssh.key_path",
+    "ssh.password",
+    "ssh.port",
+]
+
+SINGLE_NODE_REQUIRED = ["container_ip", "model_name", "model_path", "docker.image"]
+MULTI_NODE_REQUIRED = ["master_ip", "nodes", "model_name", "model_path", "docker.image"]
+
+def get_nested_value(data, path):
+    """按点号路径获取嵌套字段"""
+    value = data
+    for key in path.split('.'):
+        if isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+def format_value(path, value):
+    """把字段值格式化为 deploy.sh 使用的字符串形式"""
+    if value is None:
+        return ''
+    if path == 'nodes' and isinstance(value, list):
+        return '\n'.join(value)
+    if path == 'docker.volumes' and isinstance(value, dict):
+        return '\n'.join(f'{k}={v}' for k, v in value.items())
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, separators=(',', ':'))
+    return str(value)
+
+def var_name(path):
+    """字段路径对应的shell变量名，如 docker.image -> CFG_DOCKER_IMAGE"""
+    return 'CFG_' + path.replace('.', '_').upper()
+
+def validate(config, check_ssh_key=True):
+    """
+    校验部署配置
+
+    check_ssh_key 为False时不检查本机的SSH密钥文件：只有发起SSH连接的编排节点需要私钥，
+    由 deploy_cluster.py 调用 deploy.sh --prepare 的从节点上通常没有该文件
+
+    Returns:
+        tuple: (错误列表, 提示列表)
+    """
+    errors, notes = [], []
+    world_size = config.get("world_size")
+    if world_size in (None, ''):
+        return ["配置文件缺少必要字段 'world_size'"], notes
+    try:
+        world_size = int(world_size)
+    except (TypeError, ValueError):
+        return [f"world_size必须是整数: {world_size}"], notes
+
+    overrides = config.get("mindie_overrides")
+    if overrides is not None and not isinstance(overrides, dict):
+        errors.append("mindie_overrides必须是对象格式，如 {\"common\": {...}, \"nodes\": {\"IP\": {...}}}")
+
+    if world_size < 9:
+        # 单机部署配置校验
+        notes.append("校验单机部署配置...")
+        for field in SINGLE_NODE_REQUIRED:
+            if get_nested_value(config, field) in (None, ''):
+                errors.append(f"配置文件缺少必要字段 '{field}'")
+
+        # 检查world_size范围
+        if world_size < 1 or world_size > 8:
+            errors.append("world_size必须在1-8之间")
+
+        # 检查device_ids配置
+        device_ids = config.get("device_ids")
+        if device_ids:
+            if not isinstance(device_ids, list):
+                errors.append("device_ids必须是数组格式")
+            else:
+                if len(device_ids) != world_size:
+                    errors.append(f"device_ids数量({len(device_ids)})与world_size({world_size})不匹配")
+                if any(not isinstance(d, int) or d < 0 or d > 7 for d in device_ids):
+                    errors.append("device_ids中包含无效的设备ID (必须在0-7之间)")
+    else:
+        # 多机部署配置校验
+        notes.append("校验多机部署配置...")
+        for field in MULTI_NODE_REQUIRED:
+            if get_nested_value(config, field) in (None, '', []):
+                errors.append(f"配置文件缺少必要字段 '{field}'")
+
+        # 检查SSH端口配置
+        ssh_config = config.get("ssh") or {}
+        if ssh_config.get("port") is None:
+            notes.append("注意: 未指定SSH端口，将使用默认端口22")
+
+        # SSH认证配置检查
+        if ssh_config.get("use_key"):
+            key_path = ssh_config.get("key_path")
+            if not key_path:
+                errors.append("使用SSH密钥认证但未指定密钥路径")
+            elif check_ssh_key:
+                # 展开路径中的~
+                key_path = os.path.expanduser(key_path)
+                if not os.path.isfile(key_path):
+                    errors.append(f"SSH密钥文件不存在: {key_path}\n"
+                                  f"请检查：\n1. 密钥文件路径是否正确\n"
+                                  f"2. 密钥文件权限是否正确 (建议: chmod 600 {key_path})")
+                else:
+                    key_perms = stat.S_IMODE(os.stat(key_path).st_mode)
+                    if key_perms != 0o600:
+                        notes.append(f"警告: SSH密钥文件权限不正确 ({key_perms:o})，"
+                                     f"建议执行: chmod 600 {key_path}")
+        elif not ssh_config.get("password"):
+            errors.append("使用密码认证但未提供密码")
+    return errors, notes
+
+def build_exports(config):
+    """生成 CFG_* 变量的 shell 赋值语句"""
+    config = dict(config)
+    ssh_config = dict(config.get("ssh") or {})
+    # SSH端口缺省为22，密钥路径提前展开
+    ssh_config["port"] = ssh_config.get("port") or 22
+    if ssh_config.get("key_path"):
+        ssh_config["key_path"] = os.path.expanduser(ssh_config["key_path"])
+    config["ssh"] = ssh_config
+
+    values = {var_name(path): format_value(path, get_nested_value(config, path)) for path in EXPORT_FIELDS}
+    nodes = config.get("nodes") or []
+    values["CFG_NODES_CSV"] = ','.join(nodes) if isinstance(nodes, list) else str(nodes)
+    try:
+        values["CFG_DEPLOY_MODE"] = "single" if int(config.get("world_size")) < 9 else "multi"
+    except (TypeError, ValueError):
+        values["CFG_DEPLOY_MODE"] = ""
+    return '\n'.join(f"{name}={shlex.quote(value)}" for name, value in values.items())
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='部署配置加载工具')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--validate', action='store_true',
+                      help='同时校验配置，校验失败时以非0状态码退出')
+    parser.add_argument('--no-ssh-key-check', action='store_true',
+                      help='校验时不检查本机SSH密钥文件（不发起SSH连接的节点使用）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not os.path.isfile(args.config):
+        print(f"错误: 未找到配置文件 {args.config}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        with open(args.config) as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"错误: 无法解析配置文件 {args.config}: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.validate:
+        errors, notes = validate(config, check_ssh_key=not args.no_ssh_key_check)
+        # 提示与错误输出到标准错误，标准输出只保留可eval的变量赋值
+        for note in notes:
+            print(note, file=sys.stderr)
+        if errors:
+            for error in errors:
+                print(f"错误: {error}", file=sys.stderr)
+            sys.exit(1)
+
+    print(build_exports(config))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 部署阶段耗时追踪工具
+      deploy.sh 和 deploy_cluster.py 在每个阶段开始和结束时向 deploy_trace.jsonl 追加一行JSON事件
+      （主机、进程、阶段名、时间戳、退出码），本工具汇总各节点的事件文件，生成可用
+      chrome://tracing 或 Perfetto 打开的时间线文件，并输出按节点和阶段统计的文本摘要
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+import argparse
+import threading
+from contextlib import contextmanager
+
+from generate_ranktable import get_local_ip
+from ssh_pool import SSHSessionPool
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TRACE_FILE = "deploy_trace.jsonl"
+# deploy_cluster.py 自身的阶段事件
+CLUSTER_TRACE_FILE = "deploy_cluster_trace.jsonl"
+DEFAULT_OUTPUT = "deploy_trace.json"
+SUMMARY_SUFFIX = ".summary.txt"
+
+class TraceWriter:
+    """
+    追加写入阶段事件（多线程安全）
+
+    用法:
+        trace = TraceWriter("deploy_trace.jsonl", host=local_ip, proc="orchestrator")
+        with trace.span("rank_table"):
+            ...
+        trace.complete("launch", start, end, host=node)
+    """
+
+    def __init__(self, path, host=None, proc="orchestrator"):
+        self.path = path
+        self.host = host or socket.gethostname()
+        self.proc = proc
+        self.lock = threading.Lock()
+
+    def event(self, ph, name, ts=None, host=None, **fields):
+        record = {"ts": round(time.time() if ts is None else ts, 6), "ph": ph, "name": name,
+                  "host": host or self.host, "proc": self.proc, "pid": os.getpid()}
+        record.update(fields)
+        try:
+            with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"警告: 写入阶段事件失败 {self.path}: {e}")
+
+    @contextmanager
+    def span(self, name, host=None):
+        """记录一个阶段，阶段内抛出异常或以SystemExit退出时记录非0状态"""
+        self.event("B", name, host=host)
+        status = 0
+        try:
+            yield
+        except SystemExit as e:
+            status = e.code if isinstance(e.code, int) else 1
+            raise
+        except BaseException:
+            status = 1
+            raise
+        finally:
+            self.event("E", name, host=host, status=status)
+
+    def complete(self, name, start, end, host=None, status=0):
+        """记录起止时间已知的阶段（如编排工具代各节点记录的启动耗时）"""
+        self.event("X", name, ts=start, host=host, dur=round(end - start, 6), status=status)
+
+    def instant(self, name, host=None):
+        """记录一个时间点（如服务就绪）"""
+        self.event("i", name, host=host)
+
+def parse_events(text, source=""):
+    """解析事件文件内容，跳过无法解析的行"""
+    events = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            print(f"警告: 忽略无法解析的事件 {source}: {line[:80]}")
+            continue
+        if isinstance(record, dict) and {"ts", "ph", "name"} <= set(record):
+            record.setdefault("host", source or "unknown")
+            events.append(record)
+    return events
+
+def build_spans(events):
+    """
+    把开始/结束事件配对成阶段
+
+    同一主机、进程内按阶段名嵌套配对；没有结束事件的阶段（如部署中途退出）以该主机最后一个事件的
+    时间作为结束，并标记为未完成
+
+    Returns:
+        tuple: (阶段列表[{"host", "proc", "name", "start", "end", "status"}], 时间点列表[{"host", "proc", "name", "ts"}])
+    """
+    spans, instants, open_spans = [], [], {}
+    last_ts = {}
+    # 同一文件可能被重复读取（如本机既作为本地文件又被远程收集），相同事件只保留一次
+    unique = {json.dumps(e, sort_keys=True): e for e in events}.values()
+    for e in sorted(unique, key=lambda e: e["ts"]):
+        host, proc = e["host"], e.get("proc", "host")
+        key = (host, proc, e.get("pid"), e["name"])
+        ts = float(e["ts"])
+        last_ts[host] = max(last_ts.get(host, ts), ts + float(e.get("dur", 0)))
+        if e["ph"] == "B":
+            open_spans.setdefault(key, []).append(ts)
+        elif e["ph"] == "E":
+            if open_spans.get(key):
+                spans.append({"host": host, "proc": proc, "name": e["name"], "start": open_spans[key].pop(),
+                              "end": ts, "status": e.get("status", 0)})
+        elif e["ph"] == "X":
+            spans.append({"host": host, "proc": proc, "name": e["name"], "start": ts,
+                          "end": ts + float(e.get("dur", 0)), "status": e.get("status", 0)})
+        elif e["ph"] == "i":
+            instants.append({"host": host, "proc": proc, "name": e["name"], "ts": ts})
+    for (host, proc, _, name), starts in open_spans.items():
+        for start in starts:
+            spans.append({"host": host, "proc": proc, "name": name, "start": start,
+                          "end": last_ts[host], "status": "unfinished"})
+    spans.sort(key=lambda s: (s["start"], -s["end"]))
+    return spans, instants
+
+def to_chrome_trace(spans, instants):
+    """
+    生成Chrome Trace Event格式：每个主机一个进程，主机上的部署进程（宿主机/容器/编排工具）各占一行
+
+    时间戳统一减去最早事件的时间，单位微秒
+    """
+    items = spans + instants
+    if not items:
+        return {"traceEvents": [], "displayTimeUnit": "ms"}
+    origin = min(s.get("start", s.get("ts")) for s in items)
+    pids, tids, trace = {}, {}, []
+    for item in sorted(items, key=lambda s: s.get("start", s.get("ts"))):
+        host, proc = item["host"], item["proc"]
+        if host not in pids:
+            pids[host] = len(pids) + 1
+            trace.append({"ph": "M", "name": "process_name", "pid": pids[host], "args": {"name": host}})
+        if (host, proc) not in tids:
+            tids[(host, proc)] = len(tids) + 1
+            trace.append({"ph": "M", "name": "thread_name", "pid": pids[host], "tid": tids[(host, proc)],
+                          "args": {"name": proc}})
+    for s in spans:
+        trace.append({"ph": "X", "name": s["name"], "cat": s["proc"], "pid": pids[s["host"]],
+                      "tid": tids[(s["host"], s["proc"])], "ts": round((s["start"] - origin) * 1e6),
+                      "dur": round((s["end"] - s["start"]) * 1e6), "args": {"status": s["status"]}})
+    for i in instants:
+        trace.append({"ph": "i", "s": "p", "name": i["name"], "pid": pids[i["host"]],
+                      "tid": tids[(i["host"], i["proc"])], "ts": round((i["ts"] - origin) * 1e6)})
+    return {"traceEvents": trace, "displayTimeUnit": "ms",
+            "otherData": {"origin": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(origin))}}
+
+def format_duration(seconds):
+    return f"{seconds / 60:.1f}min" if seconds >= 600 else f"{seconds:.1f}s"
+
+def summarize(spans, instants):
+    """生成文本摘要：各节点的阶段时间线，以及按阶段汇总的跨节点耗时"""
+    if not spans and not instants:
+        return "没有阶段事件"
+    origin = min([s["start"] for s in spans] + [i["ts"] for i in instants])
+    end = max([s["end"] for s in spans] + [i["ts"] for i in instants])
+    lines = [f"总耗时 {format_duration(end - origin)}（各节点时间以本机时钟为准，跨节点比较需时钟同步）"]
+
+    for host in sorted({s["host"] for s in spans} | {i["host"] for i in instants}):
+        lines.append(f"\n[{host}]")
+        lines.append(f"  {'开始':>6}  {'耗时':>6}  阶段")
+        for s in (s for s in spans if s["host"] == host):
+            status = "" if s["status"] == 0 else f"  ({'未完成' if s['status'] == 'unfinished' else '失败: ' + str(s['status'])})"
+            lines.append(f"  {format_duration(s['start'] - origin):>8}  {format_duration(s['end'] - s['start']):>8}"
+                         f"  {s['proc']}/{s['name']}{status}")
+        for i in (i for i in instants if i["host"] == host):
+            lines.append(f"  {format_duration(i['ts'] - origin):>8}  {'-':>8}  {i['proc']}/{i['name']}")
+
+    # 跨节点汇总：最慢节点决定整体耗时，按最大耗时排序便于确定下一步优化对象
+    phases = {}
+    for s in spans:
+        phases.setdefault(s["name"], {}).setdefault(s["host"], 0.0)
+        phases[s["name"]][s["host"]] += s["end"] - s["start"]
+    lines.append(f"\n{'阶段'.ljust(26)}  {'节点数'}  {'平均':>6}  {'最大':>6}  最慢节点")
+    for name, by_host in sorted(phases.items(), key=lambda p: -max(p[1].values())):
+        slowest = max(by_host, key=by_host.get)
+        lines.append(f"{name.ljust(28)}  {len(by_host):>6}  {format_duration(sum(by_host.values()) / len(by_host)):>8}"
+                     f"  {format_duration(by_host[slowest]):>8}  {slowest}")
+    return "\n".join(lines)
+
+def collect_remote(pool, nodes, remote_dir):
+    """并行读取各节点部署目录下的事件文件，返回 {节点: 事件列表}"""
+    path = shlex.quote(os.path.join(remote_dir, TRACE_FILE))
+    results = pool.run_on_all(nodes, f"[ ! -f {path} ] || cat {path}")
+    collected = {}
+    for node, result in results.items():
+        if isinstance(result, Exception) or not result.ok:
+            error = str(result) if isinstance(result, Exception) else result.stderr.strip()
+            print(f"警告: 读取 {node} 的阶段事件失败: {error}")
+            continue
+        collected[node] = parse_events(result.stdout, node)
+    return collected
+
+def export_trace(events, output):
+    """写出时间线文件和文本摘要，返回摘要内容"""
+    spans, instants = build_spans(events)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(to_chrome_trace(spans, instants), f, ensure_ascii=False)
+    summary = summarize(spans, instants)
+    with open(output + SUMMARY_SUFFIX, 'w', encoding='utf-8') as f:
+        f.write(summary + "\n")
+    return summary
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='部署阶段耗时追踪工具')
+    parser.add_argument('files', nargs='*',
+                      help=f'本地事件文件（默认：{TRACE_FILE}，以及存在时的编排工具事件文件）')
+    parser.add_argument('--collect', action='store_true', help='通过SSH收集配置中所有节点的事件文件')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--remote-dir', type=str, default=ROOT_DIR,
+                      help=f'远端节点上存放部署工具的目录（默认：{ROOT_DIR}）')
+    parser.add_argument('-o', '--output', type=str, default=DEFAULT_OUTPUT,
+                      help=f'时间线输出文件，摘要写入同名{SUMMARY_SUFFIX}文件（默认：{DEFAULT_OUTPUT}）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    files = args.files or [p for p in (os.path.join(ROOT_DIR, TRACE_FILE),
+                                       os.path.join(ROOT_DIR, CLUSTER_TRACE_FILE)) if os.path.exists(p)]
+    events = []
+    for path in files:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                events += parse_events(f.read(), os.path.basename(path))
+        except OSError as e:
+            print(f"错误: 无法读取事件文件 {path}: {e}")
+            sys.exit(1)
+
+    if args.collect:
+        try:
+            with open(args.config, 'r') as f:
+                config = json.load(f)
+        except Exception as e:
+            print(f"错误: 无法读取部署配置 {args.config}: {str(e)}")
+            sys.exit(1)
+        nodes = config.get("nodes", [])
+        with SSHSessionPool.from_config(config.get("ssh"), local_hosts=[get_local_ip(nodes)]) as pool:
+            for node_events in collect_remote(pool, nodes, args.remote_dir).values():
+                events += node_events
+
+    if not events:
+        print("错误: 没有找到阶段事件")
+        sys.exit(1)
+    print(export_trace(events, args.output))
+    print(f"\n时间线已保存到: {args.output}（可在 chrome://tracing 或 https://ui.perfetto.dev 中打开）")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,496 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 模型权重分发工具
+      把主节点上的模型目录并行分发到所有节点：先按源目录生成MD5清单，远端哈希一致的文件直接跳过；
+      其余文件按固定大小分块传输，已完成的分块记录在远端，中断后重新执行只补传缺失的分块；
+      每个文件传完后校验MD5再移入目标目录。可选中继树模式：已收到文件的节点通过TCP把文件继续转发给
+      下一级节点，避免所有数据都从主节点网卡发出
+"""
+
+import os
+import sys
+import time
+import shlex
+import socket
+import argparse
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from calc_model_md5 import find_model_files, hash_directory, load_manifest, save_manifest, format_speed, MB
+from generate_ranktable import get_local_ip
+from ssh_pool import SSHSessionPool, DEFAULT_TIMEOUT
+from verify_model_fleet import CALC_SCRIPT, load_deploy_config, container_to_host_path, parse_digest_line
+
+DEFAULT_CHUNK_MB = 32
+DEFAULT_STREAMS = 4
+DIST_MANIFEST_SUFFIX = ".dist_manifest.json"
+# 未传完的文件放在目标目录同级的 <目录名>.partial 下，完成并校验后再移入目标目录
+PARTIAL_SUFFIX = ".partial"
+DONE_SUFFIX = ".done"
+# 单个分块传输及远端校验命令的超时时间（秒）
+TRANSFER_TIMEOUT = 600
+PROGRESS_INTERVAL = 5
+
+# 中继接收端：监听随机端口并输出端口号，把收到的数据写入分块位置，完成后追加分块记录
+RECEIVER_SCRIPT = r'''
+import os, sys, socket
+path, offset, length, done, line, timeout = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), sys.argv[4], sys.argv[5], int(sys.argv[6])
+os.makedirs(os.path.dirname(path), exist_ok=True)
+server = socket.socket()
+server.bind(("0.0.0.0", 0))
+server.listen(1)
+server.settimeout(timeout)
+print("PORT", server.getsockname()[1], flush=True)
+conn, _ = server.accept()
+conn.settimeout(timeout)
+fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+received = 0
+try:
+    while received < length:
+        data = conn.recv(min(4 << 20, length - received))
+        if not data:
+            break
+        os.pwrite(fd, data, offset + received)
+        received += len(data)
+finally:
+    os.close(fd)
+if received != length:
+    sys.exit(f"只收到 {received}/{length} 字节")
+with open(done, "a") as f:
+    f.write(line + "\n")
+conn.sendall(b"OK")
+'''
+
+# 中继发送端：把本节点已校验的文件中指定分块发送给下一级节点
+SENDER_SCRIPT = r'''
+import sys, socket
+host, port, path, offset, length, timeout = sys.argv[1], int(sys.argv[2]), sys.argv[3], int(sys.argv[4]), int(sys.argv[5]), int(sys.argv[6])
+conn = socket.create_connection((host, port), timeout=timeout)
+with open(path, "rb") as f:
+    conn.sendfile(f, offset, length)
+conn.shutdown(socket.SHUT_WR)
+if conn.recv(2) != b"OK":
+    sys.exit("接收端未确认")
+'''
+
+def plan_chunks(size, chunk_size):
+    """把文件切分为 [(偏移, 长度)]，空文件为一个长度为0的分块"""
+    if size == 0:
+        return [(0, 0)]
+    return [(offset, min(chunk_size, size - offset)) for offset in range(0, size, chunk_size)]
+
+def relay_parents(targets, fanout):
+    """
+    生成中继树：前fanout个节点直接从主节点接收，其余节点按层序挂在已有节点下
+
+    Returns:
+        dict: {节点: 上级节点}，上级为None表示直接从主节点接收
+    """
+    if fanout <= 0:
+        return {node: None for node in targets}
+    return {node: None if i < fanout else targets[(i - fanout) // fanout] for i, node in enumerate(targets)}
+
+def build_source_manifest(source, manifest_path, workers=None):
+    """
+    增量计算源目录所有文件的MD5清单（stat指纹未变化的文件复用已有清单）
+
+    Returns:
+        dict: {相对路径: {"size", "digest", ...}}，失败返回None
+    """
+    manifest = load_manifest(manifest_path)
+    files = find_model_files(source, ("*",))
+    entries, rehashed, errors = hash_directory(source, files, (manifest or {}).get("files"), workers)
+    for file_path, e in errors:
+        print(f"错误: 计算 {file_path} 的MD5失败: {e}")
+    if errors:
+        return None
+    if rehashed or manifest is None:
+        save_manifest(manifest_path, entries)
+    print(f"源目录共 {len(entries)} 个文件, {sum(e['size'] for e in entries.values()) / MB / 1024:.1f} GB"
+          f"（重新计算MD5 {rehashed} 个）")
+    return entries
+
+class WeightDistributor:
+    """
+    按节点并行分发权重
+
+    每个节点使用独立的线程池（streams个并发分块），中继模式下节点等待上级节点的对应文件完成后
+    再从上级节点接收；上级节点该文件失败时改为从主节点接收
+    """
+
+    def __init__(self, pool, source, entries, dests, parents, chunk_size=DEFAULT_CHUNK_MB * MB,
+                 streams=DEFAULT_STREAMS, timeout=TRANSFER_TIMEOUT):
+        self.pool = pool
+        self.source = source
+        self.entries = entries
+        self.dests = dests
+        self.parents = parents
+        self.chunk_size = chunk_size
+        self.streams = streams
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # (节点, 文件) -> 该文件在节点上是否已就绪（可作为中继源）
+        self.ready = {(node, rel): threading.Event() for node in dests for rel in entries}
+        self.available = {}
+        self.stats = {node: {"skipped": 0, "sent": 0, "relayed": 0, "bytes": 0, "failed": {}} for node in dests}
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.last_progress = 0
+
+    def _paths(self, node, rel):
+        dest = self.dests[node]
+        part = os.path.join(dest + PARTIAL_SUFFIX, rel)
+        return os.path.join(dest, rel), part, part + DONE_SUFFIX
+
+    def _mark(self, node, rel, ok):
+        with self.lock:
+            self.available[(node, rel)] = ok
+        self.ready[(node, rel)].set()
+
+    def inventory(self, node):
+        """
+        读取节点上已有文件的MD5和未完成文件的分块记录
+
+        Returns:
+            tuple: ({相对路径: md5}, {相对路径: {(偏移, 长度)}}，分块记录只保留与当前文件MD5一致的行)
+        """
+        dest = self.dests[node]
+        with open(CALC_SCRIPT, 'r', encoding='utf-8') as f:
+            script = f.read()
+        cmd = (f"python3 - {shlex.quote(dest)} --porcelain --all "
+               f"--manifest {shlex.quote(dest + DIST_MANIFEST_SUFFIX)}")
+        result = self.pool.run(node, cmd, input_data=script)
+        digests = dict(filter(None, (parse_digest_line(line) for line in result.stdout.splitlines())))
+
+        partial = shlex.quote(dest + PARTIAL_SUFFIX)
+        result = self.pool.run(node, f"[ -d {partial} ] && cd {partial} && "
+                                     f"find . -type f -name '*{DONE_SUFFIX}' -exec grep -H . {{}} + ; true")
+        done = {}
+        for line in result.stdout.splitlines():
+            path, _, record = line.partition(f"{DONE_SUFFIX}:")
+            parts = record.split()
+            rel = os.path.normpath(path)
+            if len(parts) == 3 and rel in self.entries and parts[0] == self.entries[rel]["digest"]:
+                done.setdefault(rel, set()).add((int(parts[1]), int(parts[2])))
+        return digests, done
+
+    def _push_direct(self, node, rel, offset, length):
+        """经SSH标准输入把主节点上的分块写入节点"""
+        _, part, done = self._paths(node, rel)
+        with open(os.path.join(self.source, rel), 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        line = f"{self.entries[rel]['digest']} {offset} {length}"
+        cmd = (f"mkdir -p {shlex.quote(os.path.dirname(part))} && "
+               f"dd of={shlex.quote(part)} bs=4M oflag=seek_bytes seek={offset} conv=notrunc status=none && "
+               f"echo {shlex.quote(line)} >> {shlex.quote(done)}")
+        result = self.pool.run(node, cmd, self.timeout, input_data=data)
+        if not result.ok:
+            raise RuntimeError((result.stderr.strip().splitlines() or [f"退出码 {result.exit_code}"])[-1])
+
+    def _push_relay(self, parent, node, rel, offset, length):
+        """由上级节点经TCP把其已校验文件中的分块发送给节点"""
+        _, part, done = self._paths(node, rel)
+        line = f"{self.entries[rel]['digest']} {offset} {length}"
+        port_found = threading.Event()
+        port = {}
+        receiver = {}
+
+        def on_line(host, text):
+            if text.startswith("PORT "):
+                port["value"] = int(text.split()[1])
+                port_found.set()
+
+        def receive():
+            cmd = " ".join(shlex.quote(a) for a in ["python3", "-c", RECEIVER_SCRIPT, part, str(offset),
+                                                     str(length), done, line, str(self.timeout)])
+            try:
+                receiver["result"] = self.pool.run(node, cmd, self.timeout, on_line=on_line)
+            except Exception as e:
+                receiver["error"] = e
+            port_found.set()
+
+        thread = threading.Thread(target=receive)
+        thread.start()
+        port_found.wait(self.timeout)
+        if "value" not in port:
+            thread.join()
+            raise RuntimeError(f"中继接收端未启动: {receiver.get('error') or receiver.get('result').stderr.strip()}")
+        source_path = os.path.join(self.dests[parent], rel)
+        cmd = " ".join(shlex.quote(a) for a in ["python3", "-c", SENDER_SCRIPT, node, str(port["value"]),
+                                                 source_path, str(offset), str(length), str(self.timeout)])
+        sent = self.pool.run(parent, cmd, self.timeout)
+        if not sent.ok:
+            # 发送端没连上或中途退出时接收端仍在等待：连上后立即关闭，使其收到的字节数不足而退出
+            try:
+                socket.create_connection((node, port["value"]), timeout=10).close()
+            except OSError:
+                pass
+        thread.join()
+        if not sent.ok:
+            raise RuntimeError(f"中继发送失败[{parent}]: {(sent.stderr.strip().splitlines() or [''])[-1]}")
+        result = receiver.get("result")
+        if result is None or not result.ok:
+            error = receiver.get("error") or (result.stderr.strip().splitlines() or [""])[-1]
+            raise RuntimeError(f"中继接收失败: {error}")
+
+    def _finalize(self, node, rel):
+        """校验已传完的文件MD5，一致则移入目标目录"""
+        final, part, done = self._paths(node, rel)
+        result = self.pool.run(node, f"md5sum {shlex.quote(part)}", self.timeout)
+        digest = result.stdout.split()[0] if result.ok and result.stdout.strip() else None
+        if digest != self.entries[rel]["digest"]:
+            self.pool.run(node, f"rm -f {shlex.quote(part)} {shlex.quote(done)}")
+            raise RuntimeError(f"MD5不一致（{digest} != {self.entries[rel]['digest']}），已删除未完成文件")
+        result = self.pool.run(node, f"mkdir -p {shlex.quote(os.path.dirname(final))} && "
+                                     f"mv -f {shlex.quote(part)} {shlex.quote(final)} && rm -f {shlex.quote(done)}")
+        if not result.ok:
+            raise RuntimeError((result.stderr.strip().splitlines() or ["移动文件失败"])[-1])
+
+    def _progress(self, length):
+        with self.lock:
+            self.bytes_done += length
+            now = time.monotonic()
+            if now - self.last_progress < PROGRESS_INTERVAL and self.bytes_done < self.bytes_total:
+                return
+            self.last_progress = now
+            elapsed = now - self.start
+            print(f"进度: {self.bytes_done / MB / 1024:.1f}/{self.bytes_total / MB / 1024:.1f} GB, "
+                  f"{format_speed(self.bytes_done, elapsed)}")
+            sys.stdout.flush()
+
+    def _complete(self, node, rel, relay):
+        """文件的所有分块都已写入：校验并移入目标目录，之后可作为下级节点的中继源"""
+        self._finalize(node, rel)
+        with self.lock:
+            self.stats[node]["relayed" if relay else "sent"] += 1
+        self._mark(node, rel, True)
+
+    def _transfer_chunk(self, node, rel, chunk, remaining):
+        """传输文件的一个分块，最后一个分块完成后校验文件"""
+        offset, length = chunk
+        parent = self.parents.get(node)
+        if parent is not None and length > 0:
+            self.ready[(parent, rel)].wait()
+        # 空文件没有数据可中继，直接创建
+        relay = parent is not None and length > 0 and self.available.get((parent, rel))
+        if relay:
+            try:
+                self._push_relay(parent, node, rel, offset, length)
+            except Exception as e:
+                # 中继失败的分块改为从主节点发送，不影响文件其余分块继续走中继
+                print(f"[{node}] 警告: {rel} 偏移 {offset} 中继失败，改为从主节点发送: {str(e)}")
+                relay = False
+        if not relay:
+            self._push_direct(node, rel, offset, length)
+        with self.lock:
+            self.stats[node]["bytes"] += length
+            remaining[rel] -= 1
+            last = remaining[rel] == 0
+        self._progress(length)
+        if last:
+            self._complete(node, rel, relay)
+
+    def _run_node(self, node, digests, done):
+        stats = self.stats[node]
+        failed = stats["failed"]
+        tasks, remaining = [], {}
+        # 大文件优先，和上级节点的顺序一致，中继时上下级可以流水线推进
+        for rel in sorted(self.entries, key=lambda r: (-self.entries[r]["size"], r)):
+            if digests.get(rel) == self.entries[rel]["digest"]:
+                stats["skipped"] += 1
+                self._mark(node, rel, True)
+                continue
+            chunks = [c for c in plan_chunks(self.entries[rel]["size"], self.chunk_size)
+                      if c not in done.get(rel, set())]
+            remaining[rel] = len(chunks)
+            tasks.append((rel, chunks))
+
+        def guarded(rel, func, *args):
+            if rel in failed:
+                return
+            try:
+                func(*args)
+            except Exception as e:
+                with self.lock:
+                    first = rel not in failed
+                    failed.setdefault(rel, str(e))
+                if first:
+                    print(f"[{node}] 错误: {rel}: {str(e)}")
+                    self._mark(node, rel, False)
+
+        with ThreadPoolExecutor(max_workers=max(1, self.streams)) as executor:
+            futures = []
+            for rel, chunks in tasks:
+                if not chunks:
+                    # 上次已传完所有分块但未完成校验
+                    futures.append(executor.submit(guarded, rel, self._complete, node, rel, False))
+                for chunk in chunks:
+                    futures.append(executor.submit(guarded, rel, self._transfer_chunk, node, rel, chunk, remaining))
+            for future in futures:
+                future.result()
+
+    def run(self):
+        """
+        执行分发
+
+        Returns:
+            dict: {节点: 统计}，节点整体失败时统计中包含 "error"
+        """
+        nodes = list(self.dests)
+        inventories = {}
+        print(f"检查 {len(nodes)} 个节点上的已有文件...")
+        with ThreadPoolExecutor(max_workers=max(len(nodes), 1)) as executor:
+            futures = {node: executor.submit(self.inventory, node) for node in nodes}
+            for node, future in futures.items():
+                try:
+                    inventories[node] = future.result()
+                except Exception as e:
+                    self.stats[node]["error"] = f"读取已有文件失败: {str(e)}"
+                    print(f"[{node}] 错误: {self.stats[node]['error']}")
+
+        for node, (digests, done) in inventories.items():
+            need = [r for r in self.entries if digests.get(r) != self.entries[r]["digest"]]
+            resumed = sum(len(done.get(r, ())) for r in need)
+            size = sum(self.entries[r]["size"] for r in need)
+            self.bytes_total += size - sum(length for r in need for _, length in done.get(r, ()))
+            print(f"[{node}] 需要传输 {len(need)} 个文件 ({size / MB / 1024:.1f} GB)，"
+                  f"跳过 {len(self.entries) - len(need)} 个，续传已完成分块 {resumed} 个"
+                  + (f"，上级节点 {self.parents[node]}" if self.parents.get(node) else ""))
+
+        self.start = self.last_progress = time.monotonic()
+
+        def run_node(node):
+            try:
+                if node in inventories:
+                    self._run_node(node, *inventories[node])
+                    partial = shlex.quote(self.dests[node] + PARTIAL_SUFFIX)
+                    self.pool.run(node, f"[ ! -d {partial} ] || find {partial} -depth -type d -empty -delete")
+            except Exception as e:
+                self.stats[node]["error"] = str(e)
+            finally:
+                # 节点结束后未就绪的文件不能再作为中继源，下级节点改为从主节点接收
+                for rel in self.entries:
+                    if not self.ready[(node, rel)].is_set():
+                        self._mark(node, rel, False)
+
+        with ThreadPoolExecutor(max_workers=max(len(nodes), 1)) as executor:
+            for future in [executor.submit(run_node, node) for node in nodes]:
+                future.result()
+        return self.stats
+
+def is_ip(name):
+    """是否为IP地址"""
+    try:
+        ipaddress.ip_address(name)
+        return True
+    except ValueError:
+        return False
+
+def verify_sizes(pool, node, dest, entries):
+    """检查节点目标目录中文件是否齐全且大小与清单一致，返回问题列表"""
+    result = pool.run(node, f"cd {shlex.quote(dest)} && find . -type f -printf '%P\\t%s\\n'")
+    if not result.ok:
+        return [f"无法列出目标目录: {dest}"]
+    sizes = {}
+    for line in result.stdout.splitlines():
+        path, _, size = line.rpartition('\t')
+        sizes[path] = int(size)
+    problems = [f"缺失: {rel}" for rel in entries if rel not in sizes]
+    problems += [f"大小不一致: {rel}" for rel in entries
+                 if rel in sizes and sizes[rel] != entries[rel]["size"]]
+    return problems
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='模型权重分发工具')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--source', type=str,
+                      help='主节点上的模型目录（默认根据model_path和docker.volumes换算）')
+    parser.add_argument('--dest', type=str,
+                      help='节点上的目标目录，可包含 {node} 占位符（默认：与源目录相同）')
+    parser.add_argument('--nodes', type=str, help='目标节点IP列表，用逗号分隔（默认：配置中的nodes）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_MB,
+                      help=f'分块大小MB，也是断点续传的粒度（默认：{DEFAULT_CHUNK_MB}）')
+    parser.add_argument('--streams', type=int, default=DEFAULT_STREAMS,
+                      help=f'每个节点同时传输的分块数（默认：{DEFAULT_STREAMS}）')
+    parser.add_argument('--relay-fanout', type=int, default=0,
+                      help='中继树每级的分支数，0表示所有节点直接从主节点接收（默认：0）')
+    parser.add_argument('-j', '--workers', type=int, help='计算源目录MD5的进程数（默认：CPU核数）')
+    parser.add_argument('--manifest', type=str,
+                      help=f'源目录MD5清单路径（默认：与源目录同级的 <目录名>{DIST_MANIFEST_SUFFIX}）')
+    parser.add_argument('--local', action='store_true',
+                      help='所有节点都在本机执行（配合 --dest 中的 {node} 在本地目录上测试）')
+    parser.add_argument('--timeout', type=int, default=TRANSFER_TIMEOUT,
+                      help=f'单个分块传输的超时时间（秒，默认：{TRANSFER_TIMEOUT}）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    config = load_deploy_config(args.config) if os.path.exists(args.config) or not args.local else {}
+    if config is None:
+        sys.exit(1)
+    source = os.path.abspath(args.source or container_to_host_path(
+        config.get("model_path", ""), (config.get("docker") or {}).get("volumes")))
+    if not os.path.isdir(source):
+        print(f"错误: 源目录不存在: {source}")
+        sys.exit(1)
+    nodes = args.nodes.split(',') if args.nodes else config.get("nodes", [])
+    if not nodes:
+        print("错误: 未配置节点列表")
+        sys.exit(1)
+
+    # 中继时下级节点按节点名建立TCP连接，本地测试也必须用IP作节点名（如 127.0.0.1,127.0.0.2）
+    if args.local and args.relay_fanout > 0 and not all(is_ip(n) for n in nodes):
+        print("错误: --local 模式下使用中继时节点名必须是IP地址（如 127.0.0.1,127.0.0.2）")
+        sys.exit(1)
+
+    local_ip = None if args.local else get_local_ip(nodes)
+    dest_template = args.dest or source
+    dests = {node: dest_template.replace("{node}", node) for node in nodes}
+    # 主节点自身的目标目录就是源目录时无需分发
+    targets = [n for n in nodes if not (n == local_ip and os.path.abspath(dests[n]) == source)]
+    dests = {node: dests[node] for node in targets}
+    if not targets:
+        print("没有需要分发的节点")
+        return
+
+    manifest_path = args.manifest or source.rstrip(os.sep) + DIST_MANIFEST_SUFFIX
+    entries = build_source_manifest(source, manifest_path, args.workers)
+    if entries is None:
+        sys.exit(1)
+
+    parents = relay_parents(targets, args.relay_fanout)
+    local_hosts = targets if args.local else [local_ip]
+    start = time.monotonic()
+    with SSHSessionPool.from_config(config.get("ssh"), DEFAULT_TIMEOUT, local_hosts=local_hosts) as pool:
+        distributor = WeightDistributor(pool, source, entries, dests, parents, max(args.chunk_size, 1) * MB,
+                                        args.streams, args.timeout)
+        stats = distributor.run()
+
+        print("\n=== 校验目标目录 ===")
+        failed = False
+        for node in targets:
+            problems = [stats[node]["error"]] if "error" in stats[node] else []
+            problems += [f"{rel}: {error}" for rel, error in stats[node]["failed"].items()]
+            if not problems:
+                problems = verify_sizes(pool, node, dests[node], entries)
+            s = stats[node]
+            print(f"[{node}] 发送 {s['sent']} 个，中继 {s['relayed']} 个，跳过 {s['skipped']} 个，"
+                  f"{s['bytes'] / MB / 1024:.2f} GB，{'失败' if problems else '一致'}")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+            failed = failed or bool(problems)
+
+    elapsed = time.monotonic() - start
+    total = sum(s["bytes"] for s in stats.values())
+    print(f"\n共传输 {total / MB / 1024:.2f} GB，耗时 {elapsed:.1f}s，总吞吐 {format_speed(total, elapsed)}")
+    if failed:
+        print("部分节点分发失败，重新执行即可从已完成的分块继续")
+        sys.exit(1)
+    print("所有节点权重与清单一致")
+
+if __name__ == '__main__':
+    main()
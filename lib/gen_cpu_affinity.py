@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: NPU绑核及线程数配置生成工具
+      读取 /sys/devices/system/node 下各NUMA节点的CPU列表和 /sys/bus/pci/devices 下NPU的numa_node，
+      为选定的device_ids分配同一NUMA节点内互不重叠的CPU核（不跨NUMA），
+      并根据每卡可用核数推导 OMP_NUM_THREADS 和 TASK_QUEUE_ENABLE，输出为环境变量配置
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+
+# 昇腾NPU的PCI厂商ID和设备类别（Processing accelerators）
+HUAWEI_VENDOR_ID = "0x19e5"
+ACCELERATOR_CLASS_PREFIX = "0x12"
+
+DEFAULT_MAX_OMP = 16
+DEFAULT_AFFINITY_MODE = 2
+
+def parse_cpulist(text):
+    """解析 "0-3,8,10-11" 形式的CPU列表"""
+    cpus = []
+    for part in text.strip().split(','):
+        if not part:
+            continue
+        if '-' in part:
+            start, end = part.split('-')
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+def _read(path):
+    with open(path, 'r') as f:
+        return f.read().strip()
+
+def read_numa_nodes(sysfs_root):
+    """
+    读取各NUMA节点的CPU列表，没有NUMA信息时把所有在线CPU视为节点0
+
+    Returns:
+        dict: {节点号: [cpu,...]}
+    """
+    nodes = {}
+    for node_dir in glob.glob(os.path.join(sysfs_root, "sys/devices/system/node/node[0-9]*")):
+        try:
+            cpus = parse_cpulist(_read(os.path.join(node_dir, "cpulist")))
+        except (OSError, ValueError):
+            continue
+        if cpus:
+            nodes[int(os.path.basename(node_dir)[4:])] = cpus
+    if not nodes:
+        online = os.path.join(sysfs_root, "sys/devices/system/cpu/online")
+        if os.path.isfile(online):
+            nodes[0] = parse_cpulist(_read(online))
+    return nodes
+
+def read_npus(sysfs_root):
+    """
+    按PCI地址顺序列出NPU（与npu-smi的设备ID顺序一致）
+
+    Returns:
+        list: [(PCI地址, numa节点)]，numa_node未知时为-1
+    """
+    npus = []
+    for dev_dir in sorted(glob.glob(os.path.join(sysfs_root, "sys/bus/pci/devices/*"))):
+        try:
+            vendor = _read(os.path.join(dev_dir, "vendor"))
+            dev_class = _read(os.path.join(dev_dir, "class"))
+        except OSError:
+            continue
+        if vendor.lower() != HUAWEI_VENDOR_ID or not dev_class.lower().startswith(ACCELERATOR_CLASS_PREFIX):
+            continue
+        try:
+            numa_node = int(_read(os.path.join(dev_dir, "numa_node")))
+        except (OSError, ValueError):
+            numa_node = -1
+        npus.append((os.path.basename(dev_dir), numa_node))
+    return npus
+
+def longest_run(cpus):
+    """CPU列表中最长的连续区间"""
+    best, current = [], []
+    for cpu in cpus:
+        if current and cpu != current[-1] + 1:
+            current = []
+        current.append(cpu)
+        if len(current) > len(best):
+            best = list(current)
+    return best
+
+def plan_affinity(npus, nodes, device_ids, reserve_cores=0):
+    """
+    为每张卡分配CPU核：同一NUMA节点上的卡平分该节点的CPU（去掉预留核）
+
+    Returns:
+        tuple: ({设备ID: {"numa": 节点, "pci": 地址, "cpus": [cpu,...]}}, 说明列表)，失败返回 (None, 说明列表)
+    """
+    notes = []
+    if not nodes:
+        return None, ["无法读取CPU/NUMA信息"]
+    if not npus:
+        return None, ["未在PCI设备中找到NPU"]
+    missing = [d for d in device_ids if d >= len(npus)]
+    if missing:
+        return None, [f"设备ID {missing} 超出检测到的NPU数量({len(npus)})"]
+
+    node_ids = sorted(nodes)
+    by_node = {}
+    for device_id in device_ids:
+        pci, numa = npus[device_id]
+        if numa not in nodes:
+            # numa_node未知（-1）时按卡在PCI顺序中的位置均匀分布到各节点
+            guessed = node_ids[device_id * len(node_ids) // len(npus)]
+            notes.append(f"npu{device_id}({pci}) 的numa_node未知({numa})，按位置归入NUMA{guessed}")
+            numa = guessed
+        by_node.setdefault(numa, []).append((device_id, pci))
+
+    bindings = {}
+    for numa, devices in sorted(by_node.items()):
+        cpus = nodes[numa][reserve_cores:]
+        share = len(cpus) // len(devices)
+        if share == 0:
+            return None, notes + [f"NUMA{numa} 只有 {len(cpus)} 个可用核，不足以分给 {len(devices)} 张卡"]
+        for i, (device_id, pci) in enumerate(sorted(devices)):
+            assigned = cpus[i * share:(i + 1) * share]
+            run = longest_run(assigned)
+            if len(run) < len(assigned):
+                notes.append(f"npu{device_id} 分到的核不连续，只使用最长的连续区间 {run[0]}-{run[-1]}")
+            bindings[device_id] = {"numa": numa, "pci": pci, "cpus": run}
+    return bindings, notes
+
+def derive_threads(cores, max_omp=DEFAULT_MAX_OMP):
+    """
+    根据每卡可用核数推导线程配置
+
+    TASK_QUEUE_ENABLE=2 时算子下发分两级流水线，连同主线程和释放线程各占一个核，
+    其余核留给OMP（权重加载和CPU侧算子），核数不足时逐级降低
+    """
+    if cores >= 4:
+        task_queue, busy = 2, 3
+    elif cores >= 2:
+        task_queue, busy = 1, 2
+    else:
+        task_queue, busy = 0, 1
+    return max(1, min(max_omp, cores - busy)), task_queue
+
+def format_affinity(bindings, mode=DEFAULT_AFFINITY_MODE):
+    """生成 CPU_AFFINITY_CONF 的值，如 2,npu0:0-23,npu1:24-47"""
+    ranges = [f"npu{d}:{b['cpus'][0]}-{b['cpus'][-1]}" for d, b in sorted(bindings.items())]
+    return ",".join([str(mode)] + ranges)
+
+def render_env(bindings, omp, task_queue, mode=DEFAULT_AFFINITY_MODE):
+    """生成可直接写入环境配置的export语句（不含空行）"""
+    lines = [f"# 绑核: npu{d} -> NUMA{b['numa']} ({b['pci']}) CPU {b['cpus'][0]}-{b['cpus'][-1]}"
+             for d, b in sorted(bindings.items())]
+    lines += [
+        "# OMP配置可提升权重加载速度（按每卡可用核数生成）",
+        f"export OMP_NUM_THREADS={omp}",
+        f"export TASK_QUEUE_ENABLE={task_queue}",
+        "# 按NUMA拓扑自定义绑核",
+        f"export CPU_AFFINITY_CONF={format_affinity(bindings, mode)}",
+    ]
+    return "\n".join(lines)
+
+def parse_device_ids(text):
+    """解析 "[0,1,2,3]" 或 "0,1,2,3" 形式的设备ID列表"""
+    text = text.strip()
+    if text.startswith('['):
+        return [int(d) for d in json.loads(text)]
+    return [int(d) for d in text.split(',') if d.strip()]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='NPU绑核及线程数配置生成工具')
+    parser.add_argument('--device-ids', type=str,
+                      help='需要绑核的设备ID，如 0,1,2,3 或 [0,1,2,3]（默认：检测到的全部NPU）')
+    parser.add_argument('--sysfs-root', type=str, default='/',
+                      help='sysfs所在的根目录，用于在构造的目录树上测试（默认：/）')
+    parser.add_argument('--reserve-cores', type=int, default=0,
+                      help='每个NUMA节点开头预留给系统进程的核数（默认：0）')
+    parser.add_argument('--max-omp', type=int, default=DEFAULT_MAX_OMP,
+                      help=f'OMP_NUM_THREADS上限（默认：{DEFAULT_MAX_OMP}）')
+    parser.add_argument('--mode', type=int, choices=[1, 2], default=DEFAULT_AFFINITY_MODE,
+                      help=f'CPU_AFFINITY_CONF绑核模式，1为粗粒度，2为细粒度（默认：{DEFAULT_AFFINITY_MODE}）')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    nodes = read_numa_nodes(args.sysfs_root)
+    if args.sysfs_root == '/' and hasattr(os, 'sched_getaffinity'):
+        # 容器内只能使用cpuset允许的核
+        allowed = os.sched_getaffinity(0)
+        nodes = {n: [c for c in cpus if c in allowed] for n, cpus in nodes.items()}
+        nodes = {n: cpus for n, cpus in nodes.items() if cpus}
+    npus = read_npus(args.sysfs_root)
+    try:
+        device_ids = parse_device_ids(args.device_ids) if args.device_ids else list(range(len(npus)))
+    except ValueError:
+        print(f"错误: 无效的设备ID列表: {args.device_ids}", file=sys.stderr)
+        sys.exit(1)
+
+    bindings, notes = plan_affinity(npus, nodes, device_ids, args.reserve_cores)
+    for note in notes:
+        print(f"{'警告' if bindings else '错误'}: {note}", file=sys.stderr)
+    if not bindings:
+        sys.exit(1)
+    omp, task_queue = derive_threads(min(len(b["cpus"]) for b in bindings.values()), args.max_omp)
+
+    if args.json:
+        print(json.dumps({
+            "bindings": {f"npu{d}": {"numa": b["numa"], "pci": b["pci"],
+                                     "cpus": f"{b['cpus'][0]}-{b['cpus'][-1]}"}
+                         for d, b in sorted(bindings.items())},
+            "OMP_NUM_THREADS": omp, "TASK_QUEUE_ENABLE": task_queue,
+            "CPU_AFFINITY_CONF": format_affinity(bindings, args.mode)}, ensure_ascii=False, indent=2))
+    else:
+        print(render_env(bindings, omp, task_queue, args.mode))
+
+if __name__ == '__main__':
+    main()
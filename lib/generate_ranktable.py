@@ -6,57 +6,66 @@
 """
 
 import json
+import hashlib
 import subprocess
-import paramiko
 import sys
-import re
-import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def get_npu_ips(ssh_client):
-    """通过SSH获取NPU卡的IP地址"""
-    npu_ips = []
-    for i in range(8):  # 假设每台机器有8张NPU卡
-        stdin, stdout, stderr = ssh_client.exec_command(f'hccn_tool -i {i} -ip -g')
-        output = stdout.read().decode()
-        # 使用正则表达式匹配IP地址
-        ip_match = re.search(r'ipaddr+:(\d+\.\d+\.\d+\.\d+)', output)
-        if ip_match:
-            npu_ips.append(ip_match.group(1))
-        else:
-            print(f"警告: 无法获取NPU {i}的IP地址")
-            return None
-    return npu_ips
+from ssh_pool import SSHSessionPool, DEFAULT_TIMEOUT as DEFAULT_NODE_TIMEOUT
+
+# NPU清单探测脚本：在目标节点上一次执行完成设备发现及IP/掩码/链路/健康状态采集，输出JSON
+NPU_PROBE_SCRIPT = r"""
+import glob, json, re, subprocess
+from concurrent.futures import ThreadPoolExecutor
 
-def connect_to_server(server_ip, username, password, use_key, key_path, port=22):
-    """建立SSH连接"""
+def run(*args):
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        print(f"\n正在连接到 {server_ip}...")
-        
-        if use_key:
-            if key_path:
-                # 展开路径中的~
-                key_path = os.path.expanduser(key_path)
-                if not os.path.exists(key_path):
-                    print(f"错误: SSH密钥文件不存在: {key_path}")
-                    return None
-                ssh.connect(server_ip, username=username, key_filename=key_path, port=port)
-            else:
-                # 使用默认密钥路径
-                ssh.connect(server_ip, username=username, port=port)
-        else:
-            if not password:
-                print("错误: 使用密码认证但未提供密码")
-                return None
-            ssh.connect(server_ip, username=username, password=password, port=port)
-            
-        return ssh
+        result = subprocess.run(["hccn_tool"] + list(args), stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, timeout=20)
+        return result.stdout.decode(errors="replace")
     except Exception as e:
-        print(f"连接到 {server_ip} 失败: {str(e)}")
-        return None
+        return "error: %s" % e
+
+def search(pattern, text):
+    match = re.search(pattern, text)
+    return match.group(1) if match else None
+
+def probe(device_id):
+    i = str(device_id)
+    ip_out = run("-i", i, "-ip", "-g")
+    link_out = run("-i", i, "-link", "-g")
+    health_out = run("-i", i, "-net_health", "-g")
+    return {
+        "device_id": device_id,
+        "ip": search(r"ipaddr+:\s*(\d+\.\d+\.\d+\.\d+)", ip_out),
+        "netmask": search(r"netmask:\s*(\d+\.\d+\.\d+\.\d+)", ip_out),
+        "link": search(r"link status:\s*(\w+)", link_out),
+        "health": search(r"net health status:\s*(\w+)", health_out),
+    }
+
+device_ids = sorted(int(m.group(1)) for m in
+                    (re.match(r"/dev/davinci(\d+)$", p) for p in glob.glob("/dev/davinci*")) if m)
+with ThreadPoolExecutor(max_workers=max(len(device_ids), 1)) as executor:
+    devices = list(executor.map(probe, device_ids))
+print(json.dumps({"device_ids": device_ids, "devices": devices}))
+"""
+
+# 拓扑快速探测命令：设备节点列表 + hccn.conf（NPU IP配置），输出摘要用于判断节点是否变化
+TOPOLOGY_PROBE_CMD = "ls /dev | grep -E '^davinci[0-9]+$' | sort; cat /etc/hccn.conf 2>/dev/null"
+RANK_TABLE_CACHE_VERSION = 1
+
+def parse_npu_inventory(output):
+    """解析探测脚本输出的JSON，返回按device_id排序的设备列表"""
+    inventory = json.loads(output.strip().splitlines()[-1])
+    devices = sorted(inventory.get("devices", []), key=lambda d: d["device_id"])
+    for device in devices:
+        if device.get("link") and device["link"].upper() != "UP":
+            print(f"警告: NPU {device['device_id']} 链路状态为 {device['link']}")
+        if device.get("health") and device["health"].lower() != "success":
+            print(f"警告: NPU {device['device_id']} 网络健康状态为 {device['health']}")
+    return devices
 
 def get_local_ip(server_ips):
     """
@@ -84,80 +93,194 @@ def get_local_ip(server_ips):
         print(f"获取本地IP地址失败: {str(e)}")
         return None
 
-def get_local_npu_ips():
-    """在本地获取NPU卡的IP地址"""
-    npu_ips = []
-    for i in range(8):  # 假设每台机器有8张NPU卡
-        try:
-            output = subprocess.check_output(['hccn_tool', '-i', str(i), '-ip', '-g'], 
-                                          stderr=subprocess.STDOUT).decode()
-            ip_match = re.search(r'ipaddr+:(\d+\.\d+\.\d+\.\d+)', output)
-            if ip_match:
-                npu_ips.append(ip_match.group(1))
-            else:
-                print(f"警告: 无法获取NPU {i}的IP地址")
-                return None
-        except subprocess.CalledProcessError:
-            print(f"警告: 执行hccn_tool命令失败")
-            return None
-    return npu_ips
-
-def create_rank_table(server_ips, username, password, use_key, key_path, port=22):
-    """创建rank_table文件的内容"""
+def probe_node(pool, server_ip, timeout=DEFAULT_NODE_TIMEOUT):
+    """通过会话池在节点上执行一次NPU探测，返回设备列表，失败时抛出异常"""
+    result = pool.run(server_ip, 'python3 -', timeout=timeout, input_data=NPU_PROBE_SCRIPT)
+    if not result.ok:
+        raise RuntimeError(f"NPU探测失败: {result.stderr.strip()}")
+    devices = parse_npu_inventory(result.stdout)
+    if not devices:
+        raise RuntimeError("未发现NPU设备")
+    missing = [str(d["device_id"]) for d in devices if not d.get("ip")]
+    if missing:
+        raise RuntimeError(f"无法获取NPU {','.join(missing)} 的IP地址")
+    return devices
+
+def discover_nodes(server_ips, username, password, use_key, key_path, port=22,
+                   timeout=DEFAULT_NODE_TIMEOUT, pool=None):
+    """
+    并发获取所有节点的NPU设备列表，本机地址直接在本地探测
+
+    Returns:
+        tuple: ({节点IP: 设备列表}, {节点IP: 错误信息})
+    """
+    own_pool = pool is None
+    if own_pool:
+        local_ip = get_local_ip(server_ips)
+        print(f"本机IP地址: {local_ip}")
+        pool = SSHSessionPool(username, password, use_key, key_path, port, timeout, local_hosts=[local_ip])
+    results, failures = {}, {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(len(server_ips), 1)) as executor:
+            futures = {server_ip: executor.submit(probe_node, pool, server_ip, timeout)
+                       for server_ip in server_ips}
+            for server_ip, future in futures.items():
+                try:
+                    results[server_ip] = future.result()
+                except Exception as e:
+                    failures[server_ip] = str(e)
+    finally:
+        if own_pool:
+            pool.close()
+    return results, failures
+
+def build_rank_table(server_ips, devices_by_node):
+    """根据各节点的设备列表生成rank表，按节点顺序分配rank_id，保证结果确定"""
     rank_table = {
         "server_count": str(len(server_ips)),
         "server_list": [],
         "status": "completed",
         "version": "1.0"
     }
-    
+
     current_rank = 0
-    local_ip = get_local_ip(server_ips)
-    print(f"本机IP地址: {local_ip}")
-    
-    for server_idx, server_ip in enumerate(server_ips):
-        try:
-            # 检查是否为本机地址
-            if local_ip and server_ip == local_ip:
-                print(f"\n检测到本机地址 {server_ip}, 直接获取NPU信息...")
-                npu_ips = get_local_npu_ips()
-            else:
-                ssh = connect_to_server(server_ip, username, password, use_key, key_path, port)
-                if not ssh:
-                    print("无法继续执行，请检查SSH连接配置")
-                    return None
-                npu_ips = get_npu_ips(ssh)
-                ssh.close()
-                
-            if not npu_ips:
-                print(f"错误: 无法从服务器 {server_ip} 获取NPU信息")
-                continue
-                
-            # 创建服务器条目
-            server_entry = {
-                "device": [],
-                "server_id": server_ip,
-                "container_ip": server_ip
+    for server_ip in server_ips:
+        # 创建服务器条目
+        server_entry = {
+            "device": [],
+            "server_id": server_ip,
+            "container_ip": server_ip
+        }
+
+        # 添加设备信息
+        for device in devices_by_node[server_ip]:
+            device_entry = {
+                "device_id": str(device["device_id"]),
+                "device_ip": device["ip"],
+                "rank_id": str(current_rank)
             }
-            
-            # 添加设备信息
-            for device_id, device_ip in enumerate(npu_ips):
-                device_entry = {
-                    "device_id": str(device_id),
-                    "device_ip": device_ip,
-                    "rank_id": str(current_rank)
-                }
-                current_rank += 1
-                server_entry["device"].append(device_entry)
-            
-            rank_table["server_list"].append(server_entry)
-            
-        except Exception as e:
-            print(f"处理服务器 {server_ip} 时出错: {str(e)}")
-            return None
-    
+            current_rank += 1
+            server_entry["device"].append(device_entry)
+
+        rank_table["server_list"].append(server_entry)
+
     return rank_table
 
+def create_rank_table(server_ips, username, password, use_key, key_path, port=22,
+                      timeout=DEFAULT_NODE_TIMEOUT, pool=None):
+    """创建rank_table文件的内容"""
+    # 所有节点并发探测，总耗时取决于最慢的节点
+    results, failures = discover_nodes(server_ips, username, password, use_key, key_path, port,
+                                       timeout, pool)
+    if failures:
+        for server_ip, error in failures.items():
+            print(f"错误: 处理服务器 {server_ip} 时出错: {error}")
+        return None
+    return build_rank_table(server_ips, results)
+
+def topology_fingerprint(rank_table):
+    """计算rank表的拓扑指纹（节点列表、设备ID、设备IP）"""
+    topology = [[server["server_id"], [[d["device_id"], d["device_ip"]] for d in server["device"]]]
+                for server in rank_table.get("server_list", [])]
+    return hashlib.sha256(json.dumps(topology).encode()).hexdigest()
+
+def probe_topology_digests(pool, server_ips, timeout=DEFAULT_NODE_TIMEOUT):
+    """
+    并行对所有节点执行拓扑快速探测
+
+    Returns:
+        tuple: ({节点: 摘要}, {节点: 错误信息})，探测命令失败的节点摘要为None（按缓存未命中处理）
+    """
+    digests, failures = {}, {}
+    for server_ip, result in pool.run_on_all(server_ips, TOPOLOGY_PROBE_CMD, timeout=timeout).items():
+        if isinstance(result, Exception):
+            failures[server_ip] = str(result)
+        elif not result.ok:
+            # 探测命令失败（如hccn.conf不存在）时输出不完整，其摘要不能代表拓扑，交给完整探测判断
+            digests[server_ip] = None
+        else:
+            digests[server_ip] = hashlib.sha256(result.stdout.encode()).hexdigest()
+    return digests, failures
+
+def load_rank_table_cache(output_path, cache_path):
+    """加载已有rank表及其缓存，两者不一致（如rank表被手工修改）时返回None"""
+    try:
+        with open(output_path, 'r') as f:
+            rank_table = json.load(f)
+        with open(cache_path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("version") != RANK_TABLE_CACHE_VERSION:
+        return None
+    if cache.get("fingerprint") != topology_fingerprint(rank_table):
+        print("警告: rank表与缓存指纹不一致，将重新生成")
+        return None
+    return cache
+
+def save_rank_table_cache(cache_path, rank_table, digests, devices_by_node):
+    """保存rank表缓存：拓扑指纹、各节点快速探测摘要和设备列表"""
+    cache = {
+        "version": RANK_TABLE_CACHE_VERSION,
+        "fingerprint": topology_fingerprint(rank_table),
+        "nodes": {
+            server_ip: {
+                "probe_digest": digests.get(server_ip),
+                "devices": [{"device_id": d["device_id"], "ip": d["ip"]} for d in devices]
+            }
+            for server_ip, devices in devices_by_node.items()
+        }
+    }
+    try:
+        with open(cache_path, 'w') as f:
+            json.dump(cache, f, indent=4)
+    except OSError as e:
+        print(f"警告: 保存rank表缓存失败: {str(e)}")
+
+def create_or_update_rank_table(server_ips, pool, output_path, cache_path, force=False,
+                                timeout=DEFAULT_NODE_TIMEOUT):
+    """
+    增量生成rank表：快速探测确认拓扑未变化时直接复用，只重新探测发生变化的节点
+
+    Returns:
+        tuple: (rank表, 是否有变化)，失败时rank表为None
+    """
+    digests, failures = probe_topology_digests(pool, server_ips, timeout)
+    if failures:
+        for server_ip, error in failures.items():
+            print(f"错误: 处理服务器 {server_ip} 时出错: {error}")
+        return None, True
+
+    cache = None if force else load_rank_table_cache(output_path, cache_path)
+    cached_nodes = cache["nodes"] if cache else {}
+    devices_by_node = {}
+    changed = []
+    for server_ip in server_ips:
+        cached = cached_nodes.get(server_ip)
+        if cached and digests[server_ip] is not None and cached.get("probe_digest") == digests[server_ip]:
+            devices_by_node[server_ip] = cached["devices"]
+        else:
+            changed.append(server_ip)
+
+    if cache and not changed and list(cached_nodes) == server_ips:
+        print(f"节点拓扑未变化，复用已有rank表: {output_path}")
+        with open(output_path, 'r') as f:
+            return json.load(f), False
+
+    if cache:
+        print(f"以下节点拓扑发生变化，重新探测: {changed}")
+    # 只对变化的节点执行完整NPU探测
+    results, failures = discover_nodes(changed, None, None, None, None, timeout=timeout, pool=pool)
+    if failures:
+        for server_ip, error in failures.items():
+            print(f"错误: 处理服务器 {server_ip} 时出错: {error}")
+        return None, True
+    devices_by_node.update(results)
+
+    rank_table = build_rank_table(server_ips, devices_by_node)
+    save_rank_table_cache(cache_path, rank_table, digests, devices_by_node)
+    return rank_table, True
+
 def parse_args():
     parser = argparse.ArgumentParser(description='NPU集群rank_table文件生成工具')
     parser.add_argument('--nodes', type=str, required=True,
@@ -172,6 +295,12 @@ def parse_args():
                       help='SSH密码（不使用密钥认证时必需）')
     parser.add_argument('--port', type=int, default=22,
                       help='SSH端口号（默认：22）')
+    parser.add_argument('--timeout', type=int, default=DEFAULT_NODE_TIMEOUT,
+                      help=f'单个节点的连接及命令超时时间，单位秒（默认：{DEFAULT_NODE_TIMEOUT}）')
+    parser.add_argument('--output', type=str, default='rank_table_file.json',
+                      help='rank表输出路径（默认：rank_table_file.json）')
+    parser.add_argument('--force', action='store_true',
+                      help='忽略缓存，重新探测所有节点')
     return parser.parse_args()
 
 def main():
@@ -179,24 +308,26 @@ def main():
     nodes = args.nodes.split(',')
     print(f"处理的节点IP列表: {nodes}")
     
-    rank_table = create_rank_table(
-        server_ips=nodes,
-        username=args.username,
-        password=args.password,
-        use_key=args.use_key,
-        key_path=args.key_path,
-        port=args.port
-    )
-    
+    local_ip = get_local_ip(nodes)
+    print(f"本机IP地址: {local_ip}")
+    output_path = args.output
+    cache_path = f"{output_path}.cache"
+
+    with SSHSessionPool(args.username, args.password, args.use_key, args.key_path, args.port,
+                        args.timeout, local_hosts=[local_ip]) as pool:
+        rank_table, changed = create_or_update_rank_table(nodes, pool, output_path, cache_path,
+                                                          args.force, args.timeout)
+
     if rank_table is None:
         print("生成rank表失败")
         sys.exit(1)
-        
+    if not changed:
+        return
+
     # 保存rank表
-    output_path = 'rank_table_file.json'
     with open(output_path, 'w') as f:
         json.dump(rank_table, f, indent=4)
     print(f"rank表已生成并保存到: {output_path}")
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
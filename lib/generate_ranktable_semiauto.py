@@ -6,26 +6,11 @@
 """
 
 import json
-import subprocess
-import paramiko
-import sys
 import re
 import os
 
-def get_npu_ips(ssh_client):
-    """通过SSH获取NPU卡的IP地址"""
-    npu_ips = []
-    for i in range(8):  # 假设每台机器有8张NPU卡
-        stdin, stdout, stderr = ssh_client.exec_command(f'hccn_tool -i {i} -ip -g')
-        output = stdout.read().decode()
-        # 使用正则表达式匹配IP地址
-        ip_match = re.search(r'ipaddr+:(\d+\.\d+\.\d+\.\d+)', output)
-        if ip_match:
-            npu_ips.append(ip_match.group(1))
-        else:
-            print(f"警告: 无法获取NPU {i}的IP地址")
-            return None
-    return npu_ips
+import generate_ranktable
+from ssh_pool import SSHSessionPool
 
 def get_ssh_credentials():
     """获取SSH连接凭据"""
@@ -39,72 +24,11 @@ def get_ssh_credentials():
     
     return username, password, use_key
 
-def connect_to_server(server_ip, username, password, use_key):
-    """建立SSH连接"""
-    try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        print(f"\n正在连接到 {server_ip}...")
-        
-        if use_key:
-            ssh.connect(server_ip, username=username)
-        else:
-            ssh.connect(server_ip, username=username, password=password)
-            
-        return ssh
-    except Exception as e:
-        print(f"连接到 {server_ip} 失败: {str(e)}")
-        return None
-
 def create_rank_table(server_ips, username, password, use_key):
-    """创建rank_table文件的内容"""
-    rank_table = {
-        "server_count": str(len(server_ips)),
-        "server_list": [],
-        "status": "completed",
-        "version": "1.0"
-    }
-    
-    current_rank = 0
-    
-    for server_idx, server_ip in enumerate(server_ips):
-        try:
-            ssh = connect_to_server(server_ip, username, password, use_key)
-            if not ssh:
-                print("无法继续执行，请检查SSH连接配置")
-                return None
-                
-            # 获取NPU卡IP地址
-            npu_ips = get_npu_ips(ssh)
-            if not npu_ips:
-                print(f"错误: 无法从服务器 {server_ip} 获取NPU信息")
-                continue
-                
-            # 创建服务器条目
-            server_entry = {
-                "device": [],
-                "server_id": server_ip,
-                "container_ip": server_ip
-            }
-            
-            # 添加设备信息
-            for device_id, device_ip in enumerate(npu_ips):
-                device_entry = {
-                    "device_id": str(device_id),
-                    "device_ip": device_ip,
-                    "rank_id": str(current_rank)
-                }
-                current_rank += 1
-                server_entry["device"].append(device_entry)
-            
-            rank_table["server_list"].append(server_entry)
-            ssh.close()
-            
-        except Exception as e:
-            print(f"处理服务器 {server_ip} 时出错: {str(e)}")
-            return None
-    
-    return rank_table
+    """创建rank_table文件的内容（与全自动流程共用会话池及单次NPU探测逻辑）"""
+    with SSHSessionPool(username, password, use_key) as pool:
+        return generate_ranktable.create_rank_table(server_ips, username, password, use_key,
+                                                    None, pool=pool)
 
 def main():
     print("=== NPU集群rank_table文件生成工具 ===")
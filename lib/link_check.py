@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: NPU全互联链路检查工具
+      从 rank_table_file.json 读取所有节点的卡IP，在各节点上并发执行 npu_link_probe.py
+      （查询链路、健康、TLS状态并从每张卡ping所有其他卡），汇总为 N×N 时延/丢包矩阵，
+      标记异常链路和异常卡，以表格和JSON输出
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from generate_ranktable import get_local_ip
+from ssh_pool import SSHSessionPool
+
+PROBE_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "npu_link_probe.py")
+RANK_TABLE_FILE = "rank_table_file.json"
+
+DEFAULT_PING_COUNT = 3
+DEFAULT_PARALLEL = 32
+DEFAULT_MAX_LATENCY_MS = 2.0
+# 终端上最多逐条打印的异常链路数，完整列表见JSON
+MAX_PRINTED_LINKS = 50
+# 单节点探测的超时时间（秒）
+PROBE_TIMEOUT = 600
+
+def load_deploy_config(config_path):
+    """加载部署配置文件（只用于读取SSH配置，文件不存在时返回空配置）"""
+    if not os.path.exists(config_path):
+        return {}
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"错误: 无法读取部署配置 {config_path}: {str(e)}")
+        return None
+
+def load_endpoints(rank_table_path):
+    """
+    读取rank表中的所有卡
+
+    Returns:
+        list: [{"rank", "server", "device_id", "ip"}]，按rank_id排序；失败返回None
+    """
+    try:
+        with open(rank_table_path, 'r') as f:
+            rank_table = json.load(f)
+        endpoints = [{"rank": int(device["rank_id"]), "server": server["server_id"],
+                      "device_id": int(device["device_id"]), "ip": device["device_ip"]}
+                     for server in rank_table["server_list"] for device in server["device"]]
+    except Exception as e:
+        print(f"错误: 无法读取rank表 {rank_table_path}: {str(e)}")
+        return None
+    return sorted(endpoints, key=lambda e: e["rank"])
+
+def probe_command(endpoints, server, targets, count, parallel, hccn_tool, disable_tls):
+    """构造在节点上执行探测脚本的命令（脚本经标准输入传入，远端无需预先部署工具）"""
+    devices = ",".join(f"{e['device_id']}={e['ip']}" for e in endpoints if e["server"] == server)
+    args = ["python3", "-", "--devices", devices, "--targets", ",".join(targets),
+            "--count", str(count), "--parallel", str(parallel), "--hccn-tool", hccn_tool]
+    if disable_tls:
+        args.append("--disable-tls")
+    return " ".join(shlex.quote(a) for a in args)
+
+def run_probes(pool, endpoints, servers, count=DEFAULT_PING_COUNT, parallel=DEFAULT_PARALLEL,
+               hccn_tool="hccn_tool", disable_tls=False, timeout=PROBE_TIMEOUT):
+    """
+    在指定节点上并发执行探测
+
+    Returns:
+        tuple: (设备状态 {(节点, 卡号): 记录}, ping结果 {(节点, 卡号, 目标IP): 记录}, 失败节点 {节点: 错误})
+    """
+    with open(PROBE_SCRIPT, 'r', encoding='utf-8') as f:
+        script = f.read()
+    targets = [e["ip"] for e in endpoints]
+    devices, pings, failures = {}, {}, {}
+    lock = threading.Lock()
+
+    def on_line(host, line):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return
+        with lock:
+            if record.get("type") == "device":
+                devices[(host, record["device_id"])] = record
+            elif record.get("type") == "ping":
+                pings[(host, record["device_id"], record["target"])] = record
+
+    def probe(server):
+        cmd = probe_command(endpoints, server, targets, count, parallel, hccn_tool, disable_tls)
+        result = pool.run(server, cmd, timeout, input_data=script, on_line=on_line)
+        if not result.ok:
+            raise RuntimeError((result.stderr.strip().splitlines() or [f"退出码 {result.exit_code}"])[-1])
+        print(f"[{server}] 探测完成，耗时 {result.elapsed:.1f}s")
+        sys.stdout.flush()
+
+    with ThreadPoolExecutor(max_workers=max(len(servers), 1)) as executor:
+        futures = {server: executor.submit(probe, server) for server in servers}
+        for server, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failures[server] = str(e)
+    return devices, pings, failures
+
+def build_matrix(endpoints, sources, pings):
+    """
+    生成时延/丢包矩阵
+
+    Returns:
+        list: 每个源卡一行，每个目标卡一列，元素为ping记录（自身为None，缺失为{}）
+    """
+    return [[None if src is dst else pings.get((src["server"], src["device_id"], dst["ip"]), {})
+             for dst in endpoints] for src in sources]
+
+def find_bad_links(endpoints, sources, matrix, max_loss=0.0, max_latency=DEFAULT_MAX_LATENCY_MS):
+    """标记丢包、超时延或未探测到的链路"""
+    bad = []
+    for src, row in zip(sources, matrix):
+        for dst, record in zip(endpoints, row):
+            if record is None:
+                continue
+            if not record:
+                reason = "未探测"
+            elif record.get("error"):
+                reason = f"ping失败: {record['error'].splitlines()[-1]}"
+            elif record["loss"] > max_loss:
+                reason = f"丢包 {record['loss']:g}%"
+            elif max_latency and record.get("avg_ms") is not None and record["avg_ms"] > max_latency:
+                reason = f"时延 {record['avg_ms']:g}ms 超过 {max_latency:g}ms"
+            else:
+                continue
+            bad.append({"src_rank": src["rank"], "dst_rank": dst["rank"], "src": f"{src['server']}/npu{src['device_id']}",
+                        "dst": f"{dst['server']}/npu{dst['device_id']}", "dst_ip": dst["ip"], "reason": reason})
+    return bad
+
+def find_device_issues(sources, devices, expect_tls=0):
+    """标记链路未UP、健康检查失败或TLS开关不符合预期的卡"""
+    issues = []
+    for src in sources:
+        record = devices.get((src["server"], src["device_id"]))
+        name = f"{src['server']}/npu{src['device_id']}"
+        if not record:
+            issues.append({"rank": src["rank"], "device": name, "reason": "未获取到状态"})
+            continue
+        if record.get("link") != "UP":
+            issues.append({"rank": src["rank"], "device": name, "reason": f"链路状态 {record.get('link')}"})
+        if (record.get("health") or "").lower() != "success":
+            issues.append({"rank": src["rank"], "device": name, "reason": f"健康状态 {record.get('health')}"})
+        if expect_tls is not None and record.get("tls") != expect_tls:
+            issues.append({"rank": src["rank"], "device": name,
+                           "reason": f"TLS开关 {record.get('tls')}，预期 {expect_tls}"})
+    return issues
+
+def find_suspects(bad_links, source_count):
+    """多数源都无法正常到达的目标卡，以及到多数目标都异常的源卡，判定为疑似故障卡"""
+    by_dst, by_src = {}, {}
+    for link in bad_links:
+        by_dst.setdefault(link["dst_rank"], set()).add(link["src_rank"])
+        by_src.setdefault(link["src_rank"], set()).add(link["dst_rank"])
+    threshold = max(2, (source_count + 1) // 2)
+    suspects = {rank: "多数源到该卡的链路异常" for rank, srcs in by_dst.items() if len(srcs) >= threshold}
+    for rank, dsts in by_src.items():
+        if len(dsts) >= threshold:
+            suspects.setdefault(rank, "该卡到多数目标的链路异常")
+    return suspects
+
+def format_cell(record, max_latency):
+    """矩阵单元格：平均时延(ms)，丢包显示百分比，不通显示X"""
+    if record is None:
+        return "-"
+    if not record:
+        return "?"
+    if record.get("error") or record["loss"] >= 100:
+        return "X"
+    if record["loss"] > 0:
+        return f"{record['loss']:.0f}%"
+    if record.get("avg_ms") is None:
+        return "?"
+    mark = "*" if max_latency and record["avg_ms"] > max_latency else ""
+    return f"{record['avg_ms']:.2f}{mark}"
+
+def print_matrix(endpoints, sources, matrix, max_latency):
+    """打印 N×N 矩阵（行为源rank，列为目标rank）"""
+    width = max(6, max(len(str(e["rank"])) for e in endpoints) + 1)
+    print("\n时延矩阵(ms)  行: 源rank  列: 目标rank  X=不通  %=丢包  *=超时延  ?=未探测")
+    print("rank".rjust(5) + "".join(str(e["rank"]).rjust(width) for e in endpoints))
+    for src, row in zip(sources, matrix):
+        print(str(src["rank"]).rjust(5) + "".join(format_cell(r, max_latency).rjust(width) for r in row))
+
+def print_device_table(sources, devices):
+    """打印各卡状态"""
+    # 中文表头每个字占两列，按显示宽度补齐
+    print(f"\n{'rank':>5}  {'节点':<14}{'卡':>3}  {'链路':<4}{'健康':<8}{'TLS':>4}")
+    for src in sources:
+        record = devices.get((src["server"], src["device_id"])) or {}
+        print(f"{src['rank']:>5}  {src['server']:<16}{src['device_id']:>4}  {str(record.get('link')):<6}"
+              f"{str(record.get('health')):<10}{str(record.get('tls')):>4}")
+
+def build_report(endpoints, sources, devices, matrix, bad_links, device_issues, failures, elapsed):
+    """生成JSON报告"""
+    return {
+        "endpoints": endpoints,
+        "sources": [s["rank"] for s in sources],
+        "devices": [devices.get((s["server"], s["device_id"])) for s in sources],
+        "matrix": {
+            "avg_ms": [[r.get("avg_ms") if r else None for r in row] for row in matrix],
+            "loss": [[r.get("loss") if r else None for r in row] for row in matrix],
+        },
+        "bad_links": bad_links,
+        "suspects": [{"rank": rank, "reason": reason}
+                     for rank, reason in sorted(find_suspects(bad_links, len(sources)).items())],
+        "device_issues": device_issues,
+        "failed_nodes": failures,
+        "elapsed_s": round(elapsed, 2),
+    }
+
+def check_mesh(pool, endpoints, servers, count=DEFAULT_PING_COUNT, parallel=DEFAULT_PARALLEL,
+               hccn_tool="hccn_tool", disable_tls=False, max_loss=0.0, max_latency=DEFAULT_MAX_LATENCY_MS,
+               expect_tls=0, quiet=False):
+    """
+    在指定节点上检查其所有卡到全部卡的链路
+
+    Returns:
+        dict: JSON报告，bad_links/device_issues/failed_nodes 均为空时表示检查通过
+    """
+    start = time.monotonic()
+    devices, pings, failures = run_probes(pool, endpoints, servers, count, parallel, hccn_tool, disable_tls)
+    sources = [e for e in endpoints if e["server"] in servers and e["server"] not in failures]
+    matrix = build_matrix(endpoints, sources, pings)
+    bad_links = find_bad_links(endpoints, sources, matrix, max_loss, max_latency)
+    device_issues = find_device_issues(sources, devices, expect_tls)
+    report = build_report(endpoints, sources, devices, matrix, bad_links, device_issues, failures,
+                          time.monotonic() - start)
+
+    if not quiet:
+        if sources:
+            print_device_table(sources, devices)
+            print_matrix(endpoints, sources, matrix, max_latency)
+        for issue in device_issues:
+            print(f"异常卡: rank {issue['rank']} {issue['device']}: {issue['reason']}")
+        for link in bad_links[:MAX_PRINTED_LINKS]:
+            print(f"异常链路: rank {link['src_rank']} -> {link['dst_rank']} ({link['src']} -> {link['dst']}): {link['reason']}")
+        if len(bad_links) > MAX_PRINTED_LINKS:
+            print(f"... 其余 {len(bad_links) - MAX_PRINTED_LINKS} 条异常链路见JSON结果")
+        for suspect in report["suspects"]:
+            endpoint = endpoints[[e["rank"] for e in endpoints].index(suspect["rank"])]
+            print(f"疑似故障卡: rank {suspect['rank']} {endpoint['server']}/npu{endpoint['device_id']} "
+                  f"({endpoint['ip']}): {suspect['reason']}")
+        for server, error in failures.items():
+            print(f"错误: 节点 {server} 探测失败: {error}")
+        link_count = sum(1 for row in matrix for r in row if r is not None)
+        print(f"\n共检查 {len(sources)} 张卡、{link_count} 条链路，异常卡 {len(device_issues)} 张，"
+              f"异常链路 {len(bad_links)} 条，失败节点 {len(failures)} 个，耗时 {report['elapsed_s']:.1f}s")
+    return report
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='NPU全互联链路检查工具')
+    parser.add_argument('--rank-table', type=str, default=RANK_TABLE_FILE,
+                      help=f'rank表路径（默认：{RANK_TABLE_FILE}）')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径，用于读取SSH配置（默认：deploy_config.json）')
+    scope = parser.add_mutually_exclusive_group()
+    scope.add_argument('--local-node', action='store_true',
+                      help='只从本机的卡发起检查（不需要SSH，deploy.sh 在每个节点上使用）')
+    scope.add_argument('--local', action='store_true',
+                      help='所有节点的探测都在本机执行（单机rank表或使用模拟hccn_tool测试时使用）')
+    parser.add_argument('--count', type=int, default=DEFAULT_PING_COUNT,
+                      help=f'每条链路ping的包数（默认：{DEFAULT_PING_COUNT}）')
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL,
+                      help=f'每个节点同时执行的hccn_tool命令数（默认：{DEFAULT_PARALLEL}）')
+    parser.add_argument('--max-loss', type=float, default=0.0,
+                      help='允许的最大丢包率百分比（默认：0）')
+    parser.add_argument('--max-latency', type=float, default=DEFAULT_MAX_LATENCY_MS,
+                      help=f'允许的最大平均时延ms，0表示不检查（默认：{DEFAULT_MAX_LATENCY_MS}）')
+    parser.add_argument('--expect-tls', type=int, choices=[0, 1], default=0,
+                      help='预期的TLS开关状态（默认：0，关闭）')
+    parser.add_argument('--disable-tls', action='store_true', help='检查前关闭各卡的TLS')
+    parser.add_argument('--hccn-tool', type=str, default='hccn_tool', help='hccn_tool命令（默认：hccn_tool）')
+    parser.add_argument('--json', type=str, metavar='FILE', help='把完整结果写入JSON文件')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    endpoints = load_endpoints(args.rank_table)
+    if endpoints is None:
+        sys.exit(1)
+    if not endpoints:
+        print(f"错误: rank表中没有设备: {args.rank_table}")
+        sys.exit(1)
+    servers = list(dict.fromkeys(e["server"] for e in endpoints))
+
+    if args.local:
+        local_hosts = servers
+    else:
+        local_ip = get_local_ip(servers)
+        if args.local_node:
+            if not local_ip:
+                print("错误: 本机不在rank表的节点列表中")
+                sys.exit(1)
+            servers = [local_ip]
+        local_hosts = [local_ip]
+    config = load_deploy_config(args.config) if not (args.local or args.local_node) else {}
+    if config is None:
+        sys.exit(1)
+
+    print(f"检查节点: {servers}，共 {len(endpoints)} 张卡")
+    with SSHSessionPool.from_config(config.get("ssh"), local_hosts=local_hosts) as pool:
+        report = check_mesh(pool, endpoints, servers, args.count, args.parallel, args.hccn_tool,
+                            args.disable_tls, args.max_loss, args.max_latency, args.expect_tls)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.json}")
+    if report["bad_links"] or report["device_issues"] or report["failed_nodes"]:
+        sys.exit(1)
+    print("所有链路正常")
+
+if __name__ == '__main__':
+    main()
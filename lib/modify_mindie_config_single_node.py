@@ -2,38 +2,17 @@
 # -*- coding: utf-8 -*-
 """
 作者: 华为山东产业发展与生态部 邱敏
-描述: Mindie服务配置修改工具
+描述: Mindie服务配置修改工具（单机），按单机profile渲染配置
 """
 
-import json
 import os
-import shutil
 import re
+import sys
+import json
 import argparse
-from datetime import datetime
-
-CONFIG_PATH = "/usr/local/Ascend/mindie/latest/mindie-service/conf/config.json"
 
-def load_json_file(file_path):
-    """加载JSON文件"""
-    try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"错误: 无法读取文件 {file_path}: {str(e)}")
-        return None
-
-def backup_config(file_path):
-    """备份配置文件"""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    backup_path = f"{file_path}.backup_{timestamp}"
-    try:
-        shutil.copy2(file_path, backup_path)
-        print(f"已创建配置文件备份: {backup_path}")
-        return True
-    except Exception as e:
-        print(f"错误: 备份配置文件失败: {str(e)}")
-        return False
+from plan_capacity import add_capacity_args, plan_from_args
+from render_mindie_config import CONFIG_PATH, build_params, load_overrides, render_to_file
 
 def validate_ip(ip):
     """验证IP地址格式"""
@@ -42,63 +21,6 @@ def validate_ip(ip):
         return False
     return all(0 <= int(x) <= 255 for x in ip.split('.'))
 
-def modify_config(config_data, container_ip, model_name, model_path, world_size, device_ids):
-    """修改配置文件内容"""
-    try:
-        # 修改ServerConfig
-        config_data["ServerConfig"]["ipAddress"] = container_ip
-        config_data["ServerConfig"]["managementIpAddress"] = container_ip
-        config_data["ServerConfig"]["httpsEnabled"] = False
-        config_data["ServerConfig"]["interCommTLSEnabled"] = False
-
-        # 修改BackendConfig
-        backend_config = config_data["BackendConfig"]
-        backend_config["multiNodesInferEnabled"] = False
-        backend_config["interNodeTLSEnabled"] = False
-        
-        # 处理device_ids
-        try:
-            device_list = json.loads(device_ids)
-            backend_config["npuDeviceIds"] = [device_list]
-        except json.JSONDecodeError:
-            print(f"错误: device_ids不是有效的JSON格式: {device_ids}")
-            return False
-        except Exception as e:
-            print(f"错误: 处理device_ids时出错: {str(e)}")
-            return False
-
-        # 修改ModelDeployConfig
-        model_deploy_config = backend_config["ModelDeployConfig"]
-        model_deploy_config["maxSeqLen"] = 32000
-        model_deploy_config["maxInputTokenLen"] = 24000
-        
-        # 修改ModelConfig
-        model_config = model_deploy_config["ModelConfig"][0]
-        model_config["modelName"] = model_name
-        model_config["modelWeightPath"] = model_path
-        model_config["worldSize"] = world_size
-
-        # 添加缺失的ScheduleConfig配置
-        schedule_config = backend_config["ScheduleConfig"]
-        schedule_config["maxPrefillTokens"] = 24000
-        schedule_config["maxIterTimes"] = 8000
-
-        return True
-    except Exception as e:
-        print(f"错误: 修改配置失败: {str(e)}")
-        return False
-
-def save_config(config_data, file_path):
-    """保存配置文件"""
-    try:
-        with open(file_path, 'w') as f:
-            json.dump(config_data, f, indent=4)
-        print(f"配置已成功保存到: {file_path}")
-        return True
-    except Exception as e:
-        print(f"错误: 保存配置文件失败: {str(e)}")
-        return False
-
 def parse_args():
     parser = argparse.ArgumentParser(description='Mindie服务配置修改工具')
     parser.add_argument('--container-ip', type=str, required=True,
@@ -113,40 +35,55 @@ def parse_args():
                       help='设备ID')
     parser.add_argument('--config-path', type=str, default=CONFIG_PATH,
                       help=f'配置文件路径 (默认: {CONFIG_PATH})')
+    parser.add_argument('--overrides', type=str, help='覆盖配置JSON文件')
+    parser.add_argument('--overrides-key', type=str, help='覆盖配置在文件中的字段名（如 mindie_overrides）')
+    parser.add_argument('--auto-size', action='store_true',
+                      help='根据模型结构和显存自动规划序列长度、batch等参数')
+    add_capacity_args(parser)
     return parser.parse_args()
 
 def main():
     args = parse_args()
-    
+
     # 验证IP地址
     if not validate_ip(args.container_ip):
         print(f"错误: 无效的IP地址格式: {args.container_ip}")
-        return
+        sys.exit(1)
 
     # 检查配置文件是否存在
     if not os.path.exists(args.config_path):
         print(f"错误: 配置文件不存在: {args.config_path}")
-        return
-
-    # 加载配置文件
-    config_data = load_json_file(args.config_path)
-    if not config_data:
-        return
-
-    # 备份配置文件
-    if not backup_config(args.config_path):
-        return
+        sys.exit(1)
 
-    # 修改配置
-    if not modify_config(config_data, args.container_ip, args.model_name, 
-                        args.model_path, args.world_size, args.device_ids):
-        return
-
-    # 保存配置
-    if not save_config(config_data, args.config_path):
-        return
+    # 处理device_ids
+    try:
+        device_ids = json.loads(args.device_ids)
+    except json.JSONDecodeError:
+        print(f"错误: device_ids不是有效的JSON格式: {args.device_ids}")
+        sys.exit(1)
+    if not isinstance(device_ids, list) or not device_ids:
+        print(f"错误: device_ids必须是非空数组: {args.device_ids}")
+        sys.exit(1)
+    params = build_params(args.container_ip, args.model_name, args.model_path, args.world_size, device_ids)
+
+    overrides = None
+    if args.overrides:
+        overrides = load_overrides(args.overrides, args.overrides_key)
+        if overrides is None:
+            sys.exit(1)
+
+    # 根据模型和显存规划容量参数，规划失败时保留默认值
+    capacity = None
+    if args.auto_size:
+        capacity = plan_from_args(args, args.model_path, args.world_size)
+        if not capacity:
+            print("警告: 容量规划失败，保留默认的序列长度和batch参数")
+
+    # 渲染、校验并写入配置
+    if not render_to_file(args.config_path, "single", params, capacity, overrides, args.container_ip):
+        sys.exit(1)
 
     print("配置修改完成!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 单节点NPU链路探测工具（由 link_check.py 经标准输入下发到各节点执行，只依赖标准库）
+      并发查询本机各卡的链路状态、网络健康状态和TLS开关，并从每张卡ping所有目标卡IP，
+      每个结果输出为一行JSON
+"""
+
+import re
+import sys
+import json
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PING_COUNT = 3
+DEFAULT_PARALLEL = 32
+# 单条hccn_tool命令的超时时间（秒）
+COMMAND_TIMEOUT = 60
+
+_print_lock = threading.Lock()
+
+def emit(record):
+    """输出一行结果（多线程安全）"""
+    with _print_lock:
+        print(json.dumps(record, ensure_ascii=False))
+        sys.stdout.flush()
+
+def run_hccn(hccn_tool, device_id, args, timeout=COMMAND_TIMEOUT):
+    """执行 hccn_tool -i <卡号> ...，返回 (退出码, 输出)"""
+    try:
+        result = subprocess.run([hccn_tool, '-i', str(device_id)] + args, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, text=True, timeout=timeout)
+        return result.returncode, result.stdout
+    except subprocess.TimeoutExpired:
+        return -1, f"执行超时({timeout}s)"
+    except OSError as e:
+        return -1, str(e)
+
+def parse_link(output):
+    """解析 "link status: UP" """
+    match = re.search(r'link status:\s*(\w+)', output, re.IGNORECASE)
+    return match.group(1).upper() if match else None
+
+def parse_health(output):
+    """解析 "net health status: Success" """
+    match = re.search(r'net health status:\s*([\w ]+)', output, re.IGNORECASE)
+    return match.group(1).strip() if match else None
+
+def parse_tls(output):
+    """解析 "tls switch[0](0:disable, 1:enable)" """
+    match = re.search(r'tls switch\s*\[(\d)\]', output, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+def parse_ping(output):
+    """
+    解析ping输出
+
+    Returns:
+        dict: {"sent", "received", "loss", "avg_ms", "max_ms"}，无法解析统计行时返回None
+    """
+    stats = re.search(r'(\d+)\s+packets? transmitted,\s*(\d+)\s+received', output)
+    if not stats:
+        return None
+    sent, received = int(stats.group(1)), int(stats.group(2))
+    times = [float(t) for t in re.findall(r'time=([\d.]+)\s*ms', output)]
+    return {"sent": sent, "received": received,
+            "loss": round(100.0 * (sent - received) / sent, 2) if sent else 100.0,
+            "avg_ms": round(sum(times) / len(times), 3) if times else None,
+            "max_ms": round(max(times), 3) if times else None}
+
+def probe_device(hccn_tool, device_id, disable_tls):
+    """查询单卡的链路、健康和TLS状态"""
+    record = {"type": "device", "device_id": device_id}
+    if disable_tls:
+        code, output = run_hccn(hccn_tool, device_id, ['-tls', '-s', 'enable', '0'])
+        if code != 0:
+            record["tls_set_error"] = output.strip()
+    for key, args, parser in (("link", ['-link', '-g'], parse_link),
+                              ("health", ['-net_health', '-g'], parse_health),
+                              ("tls", ['-tls', '-g'], parse_tls)):
+        code, output = run_hccn(hccn_tool, device_id, args)
+        record[key] = parser(output) if code == 0 else None
+        if record[key] is None:
+            record.setdefault("errors", {})[key] = output.strip()[-200:] or f"退出码 {code}"
+    emit(record)
+
+def probe_ping(hccn_tool, device_id, target, count):
+    """从指定卡ping目标IP"""
+    code, output = run_hccn(hccn_tool, device_id, ['-ping', '-g', 'address', target, 'pkt', str(count)])
+    record = {"type": "ping", "device_id": device_id, "target": target}
+    stats = parse_ping(output)
+    if stats:
+        record.update(stats)
+    else:
+        record.update({"sent": count, "received": 0, "loss": 100.0, "avg_ms": None, "max_ms": None,
+                       "error": output.strip()[-200:] or f"退出码 {code}"})
+    emit(record)
+
+def parse_devices(text):
+    """解析 "0=192.168.1.1,1=192.168.1.2" 形式的本机卡号及其IP"""
+    devices = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        device_id, sep, ip = item.partition('=')
+        if not sep:
+            raise ValueError(f"无效的设备描述: {item}（格式: 卡号=IP）")
+        devices[int(device_id)] = ip.strip()
+    return devices
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='单节点NPU链路探测工具')
+    parser.add_argument('--devices', type=str, required=True,
+                      help='本机参与检查的卡号及其IP，如 0=192.168.1.1,1=192.168.1.2')
+    parser.add_argument('--targets', type=str, default='',
+                      help='需要ping的目标卡IP列表（逗号分隔，自动跳过本卡IP）')
+    parser.add_argument('--count', type=int, default=DEFAULT_PING_COUNT,
+                      help=f'每个目标ping的包数（默认：{DEFAULT_PING_COUNT}）')
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL,
+                      help=f'本机同时执行的hccn_tool命令数（默认：{DEFAULT_PARALLEL}）')
+    parser.add_argument('--hccn-tool', type=str, default='hccn_tool', help='hccn_tool命令（默认：hccn_tool）')
+    parser.add_argument('--disable-tls', action='store_true', help='检查前关闭各卡的TLS')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    try:
+        devices = parse_devices(args.devices)
+    except ValueError as e:
+        print(f"错误: {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    targets = [t.strip() for t in args.targets.split(',') if t.strip()]
+
+    # 先完成状态查询（其中可能修改TLS开关），再并发执行ping
+    with ThreadPoolExecutor(max_workers=max(1, args.parallel)) as executor:
+        list(executor.map(lambda d: probe_device(args.hccn_tool, d, args.disable_tls), sorted(devices)))
+        futures = [executor.submit(probe_ping, args.hccn_tool, device_id, target, args.count)
+                   for device_id, own_ip in sorted(devices.items()) for target in targets if target != own_ip]
+        for future in futures:
+            future.result()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 模型权重页缓存驻留统计工具
+      通过 mmap + mincore 统计模型目录下每个文件已在内存中的比例，
+      可等待驻留比例达到指定值后再启动服务（等待时只统计 preload_weights.py 在内存预算内预热的分片）
+"""
+
+import os
+import sys
+import time
+import json
+import ctypes
+import ctypes.util
+import argparse
+
+from preload_weights import DEFAULT_BUDGET_RATIO, find_shards, memory_budget, select_within_budget
+
+PROT_READ = 0x1
+MAP_SHARED = 0x01
+MAP_FAILED = ctypes.c_void_p(-1).value
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+# 每次映射的窗口大小，避免超大文件一次性分配过大的mincore结果数组
+WINDOW_SIZE = 1024 * 1024 * 1024
+GB = 1024 ** 3
+# mincore结果每页一个字节，最低位为1表示驻留；映射为0/1后在C层计数
+_RESIDENT_BIT = bytes(b & 1 for b in range(256))
+
+_libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int,
+                       ctypes.c_int, ctypes.c_long]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_char_p]
+
+def resident_pages(file_path):
+    """
+    统计文件在页缓存中的页数
+
+    Returns:
+        tuple: (驻留页数, 总页数)
+    """
+    size = os.path.getsize(file_path)
+    total_pages = (size + PAGE_SIZE - 1) // PAGE_SIZE
+    if size == 0:
+        return 0, 0
+    resident = 0
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        for offset in range(0, size, WINDOW_SIZE):
+            length = min(WINDOW_SIZE, size - offset)
+            addr = _libc.mmap(None, length, PROT_READ, MAP_SHARED, fd, offset)
+            if addr in (None, MAP_FAILED):
+                raise OSError(ctypes.get_errno(), f"mmap失败: {os.strerror(ctypes.get_errno())}")
+            try:
+                pages = (length + PAGE_SIZE - 1) // PAGE_SIZE
+                vec = ctypes.create_string_buffer(pages)
+                if _libc.mincore(addr, length, vec) != 0:
+                    raise OSError(ctypes.get_errno(), f"mincore失败: {os.strerror(ctypes.get_errno())}")
+                resident += vec.raw.translate(_RESIDENT_BIT).count(1)
+            finally:
+                _libc.munmap(addr, length)
+    finally:
+        os.close(fd)
+    return resident, total_pages
+
+def find_files(model_path):
+    """模型目录下的所有文件（递归）"""
+    files = []
+    for root, _, names in os.walk(model_path):
+        for name in names:
+            path = os.path.join(root, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                files.append(path)
+    return sorted(files)
+
+def collect_status(model_path, files=None):
+    """
+    统计目录下每个文件（或指定文件）的驻留情况
+
+    Returns:
+        list: [(相对路径, 文件大小, 驻留页数, 总页数)]
+    """
+    status = []
+    for path in (find_files(model_path) if files is None else files):
+        try:
+            resident, total = resident_pages(path)
+        except OSError as e:
+            print(f"警告: 无法统计 {path}: {str(e)}")
+            continue
+        status.append((os.path.relpath(path, model_path), os.path.getsize(path), resident, total))
+    return status
+
+def summarize(status):
+    """汇总驻留比例，返回 (驻留字节数, 总字节数, 百分比)"""
+    resident = sum(r for _, _, r, _ in status)
+    total = sum(t for _, _, _, t in status)
+    percent = resident * 100.0 / total if total else 100.0
+    return resident * PAGE_SIZE, sum(size for _, size, _, _ in status), percent
+
+def print_status(status, per_file=True):
+    """打印每个文件及总体的驻留比例"""
+    if per_file:
+        name_width = max([len(s[0]) for s in status] + [len("文件")])
+        print(f"{'文件'.ljust(name_width)}  {'大小(GB)':>9}  驻留")
+        for relative_path, size, resident, total in status:
+            percent = resident * 100.0 / total if total else 100.0
+            print(f"{relative_path.ljust(name_width)}  {size / GB:9.2f}  {percent:6.1f}%")
+    resident_bytes, total_bytes, percent = summarize(status)
+    print(f"总计: {resident_bytes / GB:.2f} / {total_bytes / GB:.2f} GB 已在内存中 ({percent:.1f}%)")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='模型权重页缓存驻留统计工具')
+    parser.add_argument('model_path', type=str, help='模型权重目录')
+    parser.add_argument('--wait-until', type=float,
+                      help='等待预热分片的总驻留比例达到该百分比（如 90）')
+    parser.add_argument('--pattern', type=str,
+                      help='等待时按通配符选择分片，与 preload_weights.py --pattern 一致')
+    parser.add_argument('--memory-budget', type=float,
+                      help=f'等待时的页缓存上限（GB），与 preload_weights.py --memory-budget 一致'
+                           f'（默认：可用内存的{int(DEFAULT_BUDGET_RATIO * 100)}%%）')
+    parser.add_argument('--timeout', type=int, default=1800,
+                      help='等待的最长时间（秒，默认：1800）')
+    parser.add_argument('--interval', type=int, default=5,
+                      help='等待时的统计间隔（秒，默认：5）')
+    parser.add_argument('--summary', action='store_true', help='只输出总计')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.model_path):
+        print(f"错误: 模型目录不存在: {args.model_path}")
+        sys.exit(1)
+
+    if args.wait_until is None:
+        status = collect_status(args.model_path)
+        if args.json:
+            resident_bytes, total_bytes, percent = summarize(status)
+            print(json.dumps({
+                "files": [{"path": p, "size": size, "resident_percent": round(r * 100.0 / t if t else 100.0, 2)}
+                          for p, size, r, t in status],
+                "resident_bytes": resident_bytes, "total_bytes": total_bytes,
+                "resident_percent": round(percent, 2)}, ensure_ascii=False, indent=2))
+        else:
+            print_status(status, not args.summary)
+        return
+
+    # 只统计预热工具实际会预热的分片：配置、tokenizer等小文件和超出内存预算的分片不会被预热，
+    # 计入后驻留比例可能永远达不到目标
+    shards = find_shards(args.model_path, args.pattern)
+    if not shards:
+        print(f"错误: {args.model_path} 下没有找到权重分片")
+        sys.exit(1)
+    selected, used = select_within_budget(shards, memory_budget(args.memory_budget))
+    if not selected:
+        print("错误: 内存预算不足以容纳任何一个分片")
+        sys.exit(1)
+    if len(selected) < len(shards):
+        print(f"注意: 超出内存预算，只等待前 {len(selected)}/{len(shards)} 个分片 ({used / GB:.2f} GB)")
+
+    start = time.monotonic()
+    while True:
+        resident_bytes, total_bytes, percent = summarize(collect_status(args.model_path, selected))
+        elapsed = time.monotonic() - start
+        print(f"[{elapsed:6.1f}s] 驻留 {resident_bytes / GB:.2f} / {total_bytes / GB:.2f} GB ({percent:.1f}%)")
+        sys.stdout.flush()
+        if percent >= args.wait_until:
+            print(f"权重驻留比例已达到 {args.wait_until:.0f}%")
+            return
+        if elapsed >= args.timeout:
+            print(f"错误: {args.timeout}s 内驻留比例未达到 {args.wait_until:.0f}%")
+            sys.exit(1)
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
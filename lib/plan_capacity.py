@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: MindIE容量规划工具
+      根据模型config.json（层数、KV头数、头维度）、权重大小及量化类型、单卡显存和world_size，
+      估算每卡KV Cache预算，给出npuMemSize/maxSeqLen/maxInputTokenLen/maxPrefillTokens/maxBatchSize等参数
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+
+from calc_model_md5 import read_safetensors_header
+
+GB = 1024 ** 3
+
+DEFAULT_NPU_MEM_GB = 64        # 800I/800T A2 单卡HBM
+DEFAULT_MEM_UTILIZATION = 0.9  # 可供权重和KV Cache使用的显存比例
+DEFAULT_RESERVED_GB = 3        # 激活值及算子workspace预留
+DEFAULT_INPUT_RATIO = 0.75     # maxInputTokenLen 占 maxSeqLen 的比例
+DEFAULT_MAX_SEQ_LEN = 32768
+MAX_BATCH_SIZE = 512
+
+DTYPE_BYTES = {"float32": 4, "float16": 2, "bfloat16": 2, "int8": 1}
+# 非量化模型的torch_dtype取值，此时浮点张量按该dtype加载
+FLOAT_DTYPES = ("float32", "float16", "bfloat16")
+SAFETENSORS_DTYPE_BYTES = {
+    "F64": 8, "F32": 4, "F16": 2, "BF16": 2, "F8_E4M3": 1, "F8_E5M2": 1,
+    "I64": 8, "I32": 4, "I16": 2, "I8": 1, "U8": 1, "BOOL": 1,
+}
+SAFETENSORS_FLOAT_DTYPES = ("F64", "F32", "F16", "BF16")
+
+def load_model_config(model_path):
+    """读取模型config.json，多模态模型取其中的text_config"""
+    config_file = os.path.join(model_path, "config.json")
+    try:
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"错误: 无法读取模型配置 {config_file}: {str(e)}")
+        return None
+    return config.get("text_config") or config
+
+def detect_quantization(model_path, model_config):
+    """识别量化类型：优先使用MindIE量化权重的描述文件名，其次是config.json中的字段"""
+    descriptions = sorted(glob.glob(os.path.join(model_path, "quant_model_description*.json")))
+    if descriptions:
+        name = os.path.basename(descriptions[0])[len("quant_model_description"):-len(".json")]
+        return name.lstrip('_') or "quant"
+    if model_config.get("quantize"):
+        return str(model_config["quantize"])
+    quant_config = model_config.get("quantization_config") or {}
+    if quant_config:
+        return str(quant_config.get("quant_method", "quant"))
+    return model_config.get("torch_dtype", "float16")
+
+def tensor_bytes(model_path, float_bytes=None):
+    """
+    从safetensors头部按每个张量的dtype统计参数量和字节数，
+    量化权重中保持浮点的embedding/lm_head/norm及scale/offset按实际dtype计算；
+    float_bytes不为空时浮点张量按加载时的dtype计算（如float32权重以bfloat16加载）
+
+    Returns:
+        tuple: (参数量, 字节数)，没有safetensors权重或头部无法解析时返回None
+    """
+    files = glob.glob(os.path.join(model_path, "*.safetensors"))
+    if not files:
+        return None
+    params, total = 0, 0
+    try:
+        for path in files:
+            with open(path, 'rb') as f:
+                header_bytes, _ = read_safetensors_header(f, os.path.getsize(path))
+            for name, tensor in json.loads(header_bytes).items():
+                if name == "__metadata__":
+                    continue
+                numel = 1
+                for dim in tensor["shape"]:
+                    numel *= dim
+                element_bytes = SAFETENSORS_DTYPE_BYTES[tensor["dtype"]]
+                if float_bytes and tensor["dtype"] in SAFETENSORS_FLOAT_DTYPES:
+                    element_bytes = float_bytes
+                params += numel
+                total += numel * element_bytes
+    except (OSError, ValueError, KeyError) as e:
+        print(f"警告: 无法从safetensors头部统计权重大小: {str(e)}")
+        return None
+    return params, total
+
+def weight_bytes(model_path):
+    """权重文件总大小（已包含量化带来的压缩）"""
+    files = glob.glob(os.path.join(model_path, "*.safetensors")) or glob.glob(os.path.join(model_path, "*.bin"))
+    return sum(os.path.getsize(p) for p in files)
+
+def weight_footprint(model_path, quant_type):
+    """
+    权重加载后的显存占用：按safetensors头部中每个张量的参数量 x dtype字节数累加，
+    非量化模型的浮点张量按加载dtype计算；头部无法解析时退化为权重文件大小
+
+    Returns:
+        tuple: (字节数, 说明)
+    """
+    float_bytes = DTYPE_BYTES.get(quant_type) if quant_type in FLOAT_DTYPES else None
+    counted = tensor_bytes(model_path, float_bytes)
+    if counted:
+        params, total = counted
+        return total, f"{params / 1e9:.1f}B参数，按各张量dtype累加"
+    return weight_bytes(model_path), "按权重文件大小估算"
+
+def kv_bytes_per_token(model_config, world_size, kv_dtype_bytes):
+    """
+    每卡每个token的KV Cache字节数
+
+    MLA结构（DeepSeek V2/V3/R1）缓存压缩后的latent向量，各卡各存一份；
+    标准MHA/GQA结构按KV头在卡间切分，KV头数少于卡数时复制。
+
+    Returns:
+        tuple: (字节数, 说明)
+    """
+    layers = model_config["num_hidden_layers"]
+    if model_config.get("kv_lora_rank"):
+        width = model_config["kv_lora_rank"] + model_config.get("qk_rope_head_dim", 0)
+        return layers * width * kv_dtype_bytes, f"MLA: {layers}层 x (kv_lora_rank+rope维度={width})"
+
+    heads = model_config["num_attention_heads"]
+    kv_heads = model_config.get("num_key_value_heads") or heads
+    head_dim = model_config.get("head_dim") or model_config["hidden_size"] // heads
+    kv_heads_per_npu = max(1, -(-kv_heads // world_size))
+    per_token = 2 * layers * kv_heads_per_npu * head_dim * kv_dtype_bytes
+    return per_token, f"K+V: {layers}层 x 每卡{kv_heads_per_npu}个KV头(共{kv_heads}) x head_dim {head_dim}"
+
+def plan_capacity(model_path, world_size, npu_mem_gb=DEFAULT_NPU_MEM_GB,
+                  mem_utilization=DEFAULT_MEM_UTILIZATION, reserved_gb=DEFAULT_RESERVED_GB,
+                  max_seq_len=None, input_ratio=DEFAULT_INPUT_RATIO, avg_seq_len=None,
+                  block_size=128, kv_dtype_bytes=None):
+    """
+    计算容量规划
+
+    Returns:
+        tuple: (参数字典, 说明列表)，失败返回 (None, 说明列表)
+    """
+    notes = []
+    model_config = load_model_config(model_path)
+    if not model_config:
+        return None, notes
+    if "num_hidden_layers" not in model_config:
+        notes.append("模型配置缺少 num_hidden_layers，无法估算KV Cache")
+        return None, notes
+
+    quant_type = detect_quantization(model_path, model_config)
+    weights, weights_desc = weight_footprint(model_path, quant_type)
+    if not weights:
+        notes.append(f"{model_path} 下没有找到权重文件，无法估算权重占用")
+        return None, notes
+    if kv_dtype_bytes is None:
+        kv_dtype_bytes = DTYPE_BYTES.get(model_config.get("torch_dtype"), 2)
+
+    weights_per_npu = weights / world_size
+    usable = npu_mem_gb * GB * mem_utilization
+    # npuMemSize只接受整数GB，按向下取整后的预算计算可容纳的token数
+    kv_budget_gb = int((usable - weights_per_npu - reserved_gb * GB) // GB)
+    kv_budget = kv_budget_gb * GB
+    notes.append(f"量化类型: {quant_type}, 权重占用 {weights / GB:.1f} GB（{weights_desc}）, "
+                 f"按 world_size={world_size} 切分后每卡 {weights_per_npu / GB:.1f} GB")
+    notes.append(f"每卡可用显存: {npu_mem_gb} GB x {mem_utilization:.0%} = {usable / GB:.1f} GB, "
+                 f"预留激活/workspace {reserved_gb} GB")
+    if kv_budget_gb < 1:
+        notes.append(f"每卡显存不足以放下权重，KV Cache预算为 {kv_budget_gb} GB，请增加world_size")
+        return None, notes
+
+    per_token, kv_desc = kv_bytes_per_token(model_config, world_size, kv_dtype_bytes)
+    token_capacity = int(kv_budget // per_token) // block_size * block_size
+    notes.append(f"每卡KV Cache预算 {kv_budget / GB:.1f} GB，每token {per_token / 1024:.1f} KB "
+                 f"({kv_desc}, {kv_dtype_bytes}字节/元素)，可容纳 {token_capacity} 个token")
+
+    model_max = model_config.get("max_position_embeddings") or DEFAULT_MAX_SEQ_LEN
+    seq_len = min(max_seq_len or min(model_max, DEFAULT_MAX_SEQ_LEN), model_max)
+    if token_capacity < seq_len:
+        notes.append(f"KV Cache容量不足以容纳 maxSeqLen={seq_len}，下调为 {token_capacity}")
+        seq_len = token_capacity
+    if seq_len < block_size:
+        notes.append("KV Cache容量过小，无法满足最小序列长度")
+        return None, notes
+
+    input_len = max(1, int(seq_len * input_ratio))
+    avg_len = avg_seq_len or max(1, seq_len // 4)
+    batch_size = max(1, min(MAX_BATCH_SIZE, token_capacity // avg_len))
+    settings = {
+        "npuMemSize": kv_budget_gb,
+        "maxSeqLen": seq_len,
+        "maxInputTokenLen": input_len,
+        "maxPrefillTokens": max(input_len, min(token_capacity, 2 * input_len)),
+        "maxIterTimes": seq_len - input_len,
+        "maxBatchSize": batch_size,
+        "maxPrefillBatchSize": max(1, min(batch_size, 50)),
+    }
+    notes.append(f"按平均每请求 {avg_len} 个token计算，maxBatchSize={batch_size}"
+                 f"（上限 {MAX_BATCH_SIZE}）")
+    return settings, notes
+
+def apply_capacity_plan(config_data, settings):
+    """把规划结果写入MindIE配置"""
+    backend_config = config_data["BackendConfig"]
+    model_deploy_config = backend_config["ModelDeployConfig"]
+    schedule_config = backend_config["ScheduleConfig"]
+    # npuMemSize为每卡KV Cache可申请的显存上限（GB），-1表示由MindIE自动计算
+    for model_config in model_deploy_config["ModelConfig"]:
+        model_config["npuMemSize"] = settings["npuMemSize"]
+    for key in ("maxSeqLen", "maxInputTokenLen"):
+        model_deploy_config[key] = settings[key]
+    for key in ("maxPrefillTokens", "maxIterTimes", "maxBatchSize", "maxPrefillBatchSize"):
+        schedule_config[key] = settings[key]
+
+def add_capacity_args(parser):
+    """添加容量规划相关的命令行参数（供modify_mindie_config*.py复用）"""
+    parser.add_argument('--npu-mem', type=float, default=DEFAULT_NPU_MEM_GB,
+                      help=f'单卡显存大小（GB，默认：{DEFAULT_NPU_MEM_GB}）')
+    parser.add_argument('--mem-utilization', type=float, default=DEFAULT_MEM_UTILIZATION,
+                      help=f'可用于权重和KV Cache的显存比例（默认：{DEFAULT_MEM_UTILIZATION}）')
+    parser.add_argument('--reserved-mem', type=float, default=DEFAULT_RESERVED_GB,
+                      help=f'每卡为激活值和workspace预留的显存（GB，默认：{DEFAULT_RESERVED_GB}）')
+    parser.add_argument('--max-seq-len', type=int,
+                      help=f'期望的最大序列长度（默认：min(max_position_embeddings, {DEFAULT_MAX_SEQ_LEN})）')
+    parser.add_argument('--avg-seq-len', type=int,
+                      help='估算maxBatchSize时每个请求的平均token数（默认：maxSeqLen/4）')
+
+def plan_from_args(args, model_path, world_size):
+    """根据命令行参数执行容量规划并打印说明"""
+    settings, notes = plan_capacity(model_path, world_size, args.npu_mem, args.mem_utilization,
+                                    args.reserved_mem, args.max_seq_len, avg_seq_len=args.avg_seq_len)
+    print("容量规划:")
+    for note in notes:
+        print(f"  - {note}")
+    if settings:
+        for key, value in settings.items():
+            print(f"  {key} = {value}")
+    return settings
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='MindIE容量规划工具')
+    parser.add_argument('--model-path', type=str, required=True, help='模型权重目录')
+    parser.add_argument('--world-size', type=int, required=True, help='总的设备数量')
+    add_capacity_args(parser)
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出规划结果')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.json:
+        settings, notes = plan_capacity(args.model_path, args.world_size, args.npu_mem,
+                                        args.mem_utilization, args.reserved_mem, args.max_seq_len,
+                                        avg_seq_len=args.avg_seq_len)
+        print(json.dumps({"settings": settings, "notes": notes}, ensure_ascii=False, indent=2))
+    else:
+        settings = plan_from_args(args, args.model_path, args.world_size)
+    if not settings:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
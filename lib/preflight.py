@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 部署前检查工具
+      以注册表管理相互独立的检查项，在本机及所有配置节点上并发执行；
+      每个节点先一次性采集镜像ID、驱动版本、模型清单指纹等输入，耗时检查的通过结果按这些输入缓存，
+      重复部署时输入未变化的检查直接复用结果；输出每项检查的耗时，出现失败时取消尚未开始的检查
+"""
+
+import os
+import sys
+import json
+import time
+import shlex
+import hashlib
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from deploy_config import validate
+from generate_ranktable import get_local_ip
+from ssh_pool import SSHSessionPool, DEFAULT_TIMEOUT
+from verify_model_fleet import container_to_host_path
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_FILE = os.path.join(ROOT_DIR, "preflight_cache.json")
+DEFAULT_PARALLEL = 16
+# docker run 类检查的超时时间（秒）
+CONTAINER_CHECK_TIMEOUT = 180
+
+DAEMON_PATH = "/usr/local/Ascend/mindie/latest/mindie-service/bin/mindieservice_daemon"
+DRIVER_VERSION_FILE = "/usr/local/Ascend/driver/version.info"
+DEVICES_PER_NODE = 8
+
+# deploy.sh 部署所需的本地文件
+REQUIRED_FILES = [
+    "deploy.sh",
+    "lib/deploy_config.py",
+    "lib/link_check.py",
+    "lib/npu_link_probe.py",
+    "lib/add_env_settings.sh",
+    "lib/generate_ranktable.py",
+    "lib/modify_mindie_config.py",
+    "lib/render_mindie_config.py",
+    "lib/preload_weights.py",
+]
+
+PASS, WARN, FAIL, SKIP = "PASS", "WARN", "FAIL", "SKIP"
+
+# 检查项注册表，按注册顺序执行和输出
+CHECKS = []
+
+def register(name, description, scope="node", inputs=(), timeout=DEFAULT_TIMEOUT):
+    """
+    注册检查项
+
+    Args:
+        name: 检查项名称
+        description: 说明
+        scope: "local" 只在本机执行一次；"node" 在每个节点上执行
+        inputs: 依赖的节点输入（采集项名称），通过的结果按这些输入缓存（任一输入为空时不缓存）
+        timeout: 检查中单条命令的超时时间（秒）
+    """
+    def decorator(func):
+        CHECKS.append({"name": name, "description": description, "scope": scope,
+                       "inputs": tuple(inputs), "timeout": timeout, "func": func})
+        return func
+    return decorator
+
+class CheckContext:
+    """检查执行上下文：所在节点、部署配置、节点输入，以及在节点上执行命令的方法"""
+
+    def __init__(self, pool, node, config, facts, timeout, options=None):
+        self.pool = pool
+        self.node = node
+        self.config = config
+        self.facts = facts
+        self.timeout = timeout
+        self.options = options or {}
+
+    def run(self, command, input_data=None):
+        return self.pool.run(self.node, command, self.timeout, input_data=input_data)
+
+    def docker_run(self, entrypoint, *args):
+        """在部署镜像中执行一次性命令"""
+        image = self.config["docker"]["image"]
+        return self.run(" ".join(["docker", "run", "--rm", "--entrypoint", shlex.quote(entrypoint),
+                                  shlex.quote(image)] + [shlex.quote(a) for a in args]))
+
+def host_model_path(config):
+    """宿主机上的模型路径"""
+    return container_to_host_path(config.get("model_path", ""), (config.get("docker") or {}).get("volumes"))
+
+def facts_command(config):
+    """节点输入采集命令：每行输出一个 名称=值"""
+    image = shlex.quote(config["docker"]["image"])
+    model_path = shlex.quote(host_model_path(config))
+    return "; ".join([
+        "echo docker=$(command -v docker)",
+        f"echo image_id=$(docker image inspect -f '{{{{.Id}}}}' {image} 2>/dev/null)",
+        f"echo driver_version=$(grep -m1 '^Version=' {DRIVER_VERSION_FILE} 2>/dev/null | cut -d= -f2)",
+        "echo npu_count=$(ls /dev/davinci[0-9]* 2>/dev/null | wc -l)",
+        # 模型清单指纹：顶层文件名、大小和修改时间
+        f"echo model_manifest=$([ -d {model_path} ] && cd {model_path} && "
+        "find . -maxdepth 1 -type f -printf '%f %s %T@\\n' | sort | sha256sum | cut -d' ' -f1)",
+    ])
+
+def parse_facts(output):
+    """解析采集命令的输出"""
+    facts = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition('=')
+        if sep:
+            facts[key.strip()] = value.strip()
+    return facts
+
+@register("files", "部署工具文件完整", scope="local")
+def check_files(ctx):
+    missing = [f for f in REQUIRED_FILES if not os.path.isfile(os.path.join(ROOT_DIR, f))]
+    return (FAIL, f"缺少文件: {', '.join(missing)}") if missing else (PASS, "")
+
+@register("docker", "docker可用")
+def check_docker(ctx):
+    result = ctx.run("docker info --format '{{.ServerVersion}}'")
+    if not result.ok:
+        return FAIL, (result.stderr.strip().splitlines() or ["docker不可用"])[-1]
+    return PASS, f"docker {result.stdout.strip()}"
+
+@register("image", "部署镜像存在")
+def check_image(ctx):
+    image_id = ctx.facts.get("image_id")
+    if not image_id:
+        return FAIL, f"镜像不存在: {ctx.config['docker']['image']}"
+    return PASS, image_id[:19]
+
+@register("npu_devices", "NPU设备数量满足配置")
+def check_npu_devices(ctx):
+    npu_count = int(ctx.facts.get("npu_count") or 0)
+    device_ids = ctx.config.get("device_ids")
+    if int(ctx.config["world_size"]) < 9:
+        needed = device_ids or list(range(int(ctx.config["world_size"])))
+        out_of_range = [d for d in needed if d >= npu_count]
+        if out_of_range:
+            return FAIL, f"设备 {out_of_range} 超出本机NPU数量({npu_count})"
+    elif npu_count < DEVICES_PER_NODE:
+        return FAIL, f"本机NPU数量({npu_count})少于 {DEVICES_PER_NODE}"
+    return PASS, f"{npu_count} 张NPU"
+
+@register("driver", "NPU驱动可用", inputs=("driver_version", "npu_count"))
+def check_driver(ctx):
+    if not ctx.facts.get("driver_version"):
+        return FAIL, f"未找到驱动版本信息: {DRIVER_VERSION_FILE}"
+    result = ctx.run("npu-smi info -l")
+    if not result.ok:
+        return FAIL, (result.stderr.strip().splitlines() or ["npu-smi执行失败"])[-1]
+    for line in result.stdout.splitlines():
+        if "Total Count" in line:
+            total = int(line.split(':')[-1].strip() or 0)
+            if total != int(ctx.facts["npu_count"]):
+                return FAIL, f"npu-smi识别到 {total} 张卡，/dev下有 {ctx.facts['npu_count']} 个设备"
+    return PASS, f"驱动版本 {ctx.facts['driver_version']}"
+
+@register("mindie_in_image", "镜像中包含MindIE服务", inputs=("image_id",), timeout=CONTAINER_CHECK_TIMEOUT)
+def check_mindie_in_image(ctx):
+    if not ctx.facts.get("image_id"):
+        # 镜像不存在时 docker run 会尝试拉取镜像，直接跳过
+        return SKIP, "镜像不存在"
+    result = ctx.docker_run("test", "-x", DAEMON_PATH)
+    return (PASS, "") if result.ok else (FAIL, f"镜像中未找到 {DAEMON_PATH}")
+
+@register("model_path", "模型路径及config.json存在")
+def check_model_path(ctx):
+    model_path = host_model_path(ctx.config)
+    result = ctx.run(f"test -f {shlex.quote(os.path.join(model_path, 'config.json'))}")
+    return (PASS, model_path) if result.ok else (FAIL, f"未找到 {model_path}/config.json")
+
+# 在节点上检查权重分片是否齐全（经标准输入传入，参数为模型路径）
+WEIGHTS_SCRIPT = r'''
+import os, sys, json
+path = sys.argv[1]
+index = os.path.join(path, "model.safetensors.index.json")
+if os.path.isfile(index):
+    with open(index) as f:
+        shards = sorted(set(json.load(f)["weight_map"].values()))
+else:
+    shards = sorted(n for n in os.listdir(path) if n.endswith(".safetensors"))
+if not shards:
+    sys.exit("未找到safetensors权重文件")
+bad = [s for s in shards if not os.path.isfile(os.path.join(path, s)) or os.path.getsize(os.path.join(path, s)) == 0]
+if bad:
+    sys.exit(f"{len(bad)} 个分片缺失或为空: {', '.join(bad[:5])}")
+print(len(shards))
+'''
+
+@register("model_weights", "权重分片齐全", inputs=("model_manifest",))
+def check_model_weights(ctx):
+    result = ctx.run(f"python3 - {shlex.quote(host_model_path(ctx.config))}", input_data=WEIGHTS_SCRIPT)
+    if not result.ok:
+        return FAIL, (result.stderr.strip().splitlines() or ["权重检查失败"])[-1]
+    return PASS, f"{result.stdout.strip()} 个分片"
+
+@register("transformers", "镜像transformers版本与模型一致", inputs=("image_id", "model_manifest"),
+          timeout=CONTAINER_CHECK_TIMEOUT)
+def check_transformers(ctx):
+    generation_config = os.path.join(host_model_path(ctx.config), "generation_config.json")
+    result = ctx.run(f"cat {shlex.quote(generation_config)} 2>/dev/null")
+    try:
+        expected = json.loads(result.stdout).get("transformers_version") if result.ok else None
+    except ValueError:
+        expected = None
+    if not expected:
+        return PASS, "模型未指定transformers版本"
+    if not ctx.facts.get("image_id"):
+        return SKIP, "镜像不存在"
+    result = ctx.docker_run("python3", "-c", "import transformers; print(transformers.__version__)")
+    if not result.ok:
+        return WARN, "无法读取镜像中的transformers版本"
+    actual = result.stdout.strip().splitlines()[-1]
+    if actual != expected:
+        fix = f"pip install transformers=={expected}"
+        if ctx.options.get("allow_transformers_mismatch"):
+            return WARN, f"模型要求 {expected}，镜像中为 {actual}，如需调整请在容器内执行: {fix}"
+        return FAIL, (f"模型要求 {expected}，镜像中为 {actual}，请在镜像中执行 {fix} 后重新提交镜像，"
+                      f"或使用 --allow-transformers-mismatch（deploy.sh 设置 ALLOW_TRANSFORMERS_MISMATCH=1）忽略")
+    return PASS, actual
+
+def cache_key(check, node, facts, options=None):
+    """检查结果缓存键：检查项 + 节点 + 依赖的输入 + 检查选项（选项不同时结果可能不同）"""
+    payload = {"check": check["name"], "node": node, "inputs": {k: facts.get(k) for k in check["inputs"]},
+               "options": options or {}}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+def load_cache(path):
+    """读取缓存，文件不存在或损坏时返回空缓存"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, path):
+    """原子写入缓存"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def gather_facts(pool, nodes, config, timeout=DEFAULT_TIMEOUT):
+    """
+    并发采集所有节点的输入
+
+    Returns:
+        tuple: ({节点: 输入}, {节点: 错误}, {节点: 耗时})
+    """
+    command = facts_command(config)
+    facts, errors, durations = {}, {}, {}
+    with ThreadPoolExecutor(max_workers=max(len(nodes), 1)) as executor:
+        futures = {node: executor.submit(pool.run, node, command, timeout) for node in nodes}
+        for node, future in futures.items():
+            try:
+                result = future.result()
+                facts[node] = parse_facts(result.stdout)
+                durations[node] = result.elapsed
+            except Exception as e:
+                errors[node] = str(e)
+    return facts, errors, durations
+
+def run_check(check, ctx, cache, use_cache):
+    """执行单项检查，返回结果记录"""
+    record = {"check": check["name"], "node": ctx.node, "cached": False}
+    start = time.monotonic()
+    cacheable = check["inputs"] and all(ctx.facts.get(k) for k in check["inputs"])
+    key = cache_key(check, ctx.node, ctx.facts, ctx.options) if cacheable else None
+    if key and use_cache and key in cache:
+        status, message = cache[key]["status"], cache[key]["message"]
+        record["cached"] = True
+    else:
+        try:
+            status, message = check["func"](ctx)
+        except Exception as e:
+            status, message = FAIL, f"检查出错: {str(e)}"
+    record.update({"status": status, "message": message, "duration": time.monotonic() - start})
+    if key and status in (PASS, WARN) and not record["cached"]:
+        record["cache_key"] = key
+    return record
+
+def run_preflight(pool, nodes, config, local_node, checks=None, cache_path=CACHE_FILE, use_cache=True,
+                  parallel=DEFAULT_PARALLEL, fail_fast=True, options=None):
+    """
+    执行部署前检查
+
+    Args:
+        pool: SSHSessionPool（本机应在其local_hosts中）
+        nodes: 需要检查的节点
+        local_node: 本机在结果中显示的节点名，local检查项在本机执行
+        checks: 要执行的检查项名称，None表示全部
+        options: 检查选项，如 {"allow_transformers_mismatch": True}
+
+    Returns:
+        list: 结果记录 [{"check", "node", "status", "message", "duration", "cached"}]
+    """
+    selected = [c for c in CHECKS if checks is None or c["name"] in checks]
+    cache = load_cache(cache_path) if use_cache else {}
+    results = []
+
+    start = time.monotonic()
+    facts, errors, durations = gather_facts(pool, nodes, config)
+    for node in nodes:
+        if node in errors:
+            results.append({"check": "facts", "node": node, "status": FAIL, "cached": False,
+                            "message": f"采集节点信息失败: {errors[node]}", "duration": time.monotonic() - start})
+        else:
+            results.append({"check": "facts", "node": node, "status": PASS, "cached": False,
+                            "message": "", "duration": durations[node]})
+
+    tasks = [(c, CheckContext(pool, local_node, config, facts.get(local_node, {}), c["timeout"], options))
+             for c in selected if c["scope"] == "local"]
+    # 按检查项交错排列各节点的任务，注册在后的耗时检查排在队尾，失败时可被跳过
+    tasks += [(c, CheckContext(pool, node, config, facts[node], c["timeout"], options))
+              for c in selected if c["scope"] == "node" for node in nodes if node in facts]
+
+    failed = threading.Event()
+    if any(r["status"] == FAIL for r in results):
+        failed.set()
+
+    def worker(check, ctx):
+        if fail_fast and failed.is_set():
+            return {"check": check["name"], "node": ctx.node, "status": SKIP, "cached": False,
+                    "message": "已有检查失败，跳过", "duration": 0.0}
+        record = run_check(check, ctx, cache, use_cache)
+        if record["status"] == FAIL:
+            failed.set()
+        return record
+
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        futures = [executor.submit(worker, check, ctx) for check, ctx in tasks]
+        results += [f.result() for f in futures]
+
+    # 只缓存本次实际执行且通过的检查
+    new_entries = {r.pop("cache_key"): {"check": r["check"], "node": r["node"], "status": r["status"],
+                                        "message": r["message"], "time": datetime.now().isoformat(timespec='seconds')}
+                   for r in results if "cache_key" in r}
+    if new_entries:
+        cache.update(new_entries)
+        try:
+            save_cache(cache, cache_path)
+        except Exception as e:
+            print(f"警告: 保存检查缓存失败: {str(e)}")
+    return results
+
+def print_results(results, elapsed):
+    """打印检查结果表"""
+    name_width = max(len(r["check"]) for r in results) + 2
+    node_width = max(len(r["node"]) for r in results) + 2
+    print(f"\n{'检查项':<{name_width - 3}}{'节点':<{node_width - 2}}{'结果':<8}{'耗时':>6}  说明")
+    for r in results:
+        message = ("[缓存] " if r["cached"] else "") + r["message"]
+        print(f"{r['check']:<{name_width}}{r['node']:<{node_width}}{r['status']:<10}{r['duration']:>7.2f}s  {message}")
+    counts = {s: sum(1 for r in results if r["status"] == s) for s in (PASS, WARN, FAIL, SKIP)}
+    cached = sum(1 for r in results if r["cached"])
+    print(f"\n通过 {counts[PASS]}，警告 {counts[WARN]}，失败 {counts[FAIL]}，跳过 {counts[SKIP]}"
+          f"（其中缓存命中 {cached}），总耗时 {elapsed:.2f}s")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='部署前检查工具')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--nodes', type=str, help='要检查的节点IP列表，用逗号分隔（默认：配置中的nodes）')
+    parser.add_argument('--local-only', action='store_true', help='只检查本机')
+    parser.add_argument('--checks', type=str, help='只执行指定的检查项，用逗号分隔')
+    parser.add_argument('--list', action='store_true', help='列出所有检查项')
+    parser.add_argument('--cache', type=str, default=CACHE_FILE,
+                      help=f'检查结果缓存文件（默认：{CACHE_FILE}）')
+    parser.add_argument('--no-cache', action='store_true', help='忽略缓存，重新执行所有检查')
+    parser.add_argument('--parallel', type=int, default=DEFAULT_PARALLEL,
+                      help=f'同时执行的检查数（默认：{DEFAULT_PARALLEL}）')
+    parser.add_argument('--no-fail-fast', action='store_true', help='出现失败后继续执行剩余检查')
+    parser.add_argument('--json', type=str, metavar='FILE', help='把检查结果写入JSON文件')
+    parser.add_argument('--allow-transformers-mismatch', action='store_true',
+                      help='镜像transformers版本与模型要求不一致时只告警，不判为失败')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.list:
+        for check in CHECKS:
+            cached = f"（按 {', '.join(check['inputs'])} 缓存）" if check["inputs"] else ""
+            print(f"{check['name']:<18}{'本机' if check['scope'] == 'local' else '各节点'}  {check['description']}{cached}")
+        return
+
+    try:
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+    except Exception as e:
+        print(f"错误: 无法读取部署配置 {args.config}: {str(e)}")
+        sys.exit(1)
+    errors, _ = validate(config)
+    if errors:
+        # 配置本身不合法时其余检查没有意义
+        for error in errors:
+            print(f"错误: {error}")
+        sys.exit(1)
+
+    if int(config["world_size"]) < 9:
+        local_node = config["container_ip"]
+        nodes = [local_node]
+    else:
+        nodes = args.nodes.split(',') if args.nodes else config["nodes"]
+        local_node = get_local_ip(nodes) or "localhost"
+        if args.local_only:
+            nodes = [local_node]
+    checks = set(args.checks.split(',')) if args.checks else None
+    unknown = (checks or set()) - {c["name"] for c in CHECKS}
+    if unknown:
+        print(f"错误: 未知的检查项: {', '.join(sorted(unknown))}")
+        sys.exit(1)
+
+    print(f"检查节点: {nodes}")
+    start = time.monotonic()
+    with SSHSessionPool.from_config(config.get("ssh"), local_hosts=[local_node]) as pool:
+        results = run_preflight(pool, nodes, config, local_node, checks, args.cache, not args.no_cache,
+                                args.parallel, not args.no_fail_fast,
+                                {"allow_transformers_mismatch": args.allow_transformers_mismatch})
+    elapsed = time.monotonic() - start
+    print_results(results, elapsed)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"results": results, "elapsed_s": round(elapsed, 2)}, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到: {args.json}")
+    if any(r["status"] == FAIL for r in results):
+        sys.exit(1)
+    print("部署前检查通过")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 模型权重内存预热工具
+      从 model.safetensors.index.json（或按通配符）获取分片列表，多线程并发预读到页缓存，
+      可只预热一轮，也可在内存预算内常驻循环预热，并输出读取速度
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_WORKERS = 8
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_INTERVAL = 60
+GB = 1024 ** 3
+
+# 常驻模式下内存预算缺省为可用内存的比例
+DEFAULT_BUDGET_RATIO = 0.9
+
+_local = threading.local()
+
+def find_shards(model_path, pattern=None):
+    """
+    获取需要预热的权重分片，按索引文件中出现的顺序排列
+
+    Returns:
+        list: 分片的绝对路径
+    """
+    if pattern:
+        return sorted(p for p in glob.glob(os.path.join(model_path, pattern)) if os.path.isfile(p))
+
+    index_files = sorted(glob.glob(os.path.join(model_path, "*.safetensors.index.json")))
+    if index_files:
+        shards = []
+        for index_file in index_files:
+            try:
+                with open(index_file, 'r') as f:
+                    weight_map = json.load(f).get("weight_map", {})
+            except Exception as e:
+                print(f"警告: 无法解析索引文件 {index_file}: {str(e)}")
+                continue
+            for name in weight_map.values():
+                path = os.path.join(model_path, name)
+                if path not in shards:
+                    shards.append(path)
+        missing = [p for p in shards if not os.path.isfile(p)]
+        for path in missing:
+            print(f"警告: 索引中的分片不存在: {path}")
+        shards = [p for p in shards if p not in missing]
+        if shards:
+            return shards
+
+    return sorted(glob.glob(os.path.join(model_path, "*.safetensors")))
+
+def _get_buffer(chunk_size):
+    """每个线程复用一块读缓冲区"""
+    buf = getattr(_local, 'buf', None)
+    if buf is None or len(buf) != chunk_size:
+        buf = _local.buf = bytearray(chunk_size)
+    return buf
+
+def warm_file(file_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    预热单个文件：先提示内核整体预读，再用大块顺序读把内容拉入页缓存
+
+    Returns:
+        tuple: (文件路径, 字节数, 耗时)
+    """
+    start = time.monotonic()
+    buf = _get_buffer(chunk_size)
+    view = memoryview(buf)
+    total = 0
+    with open(file_path, 'rb', buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            fd = f.fileno()
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        while True:
+            n = f.readinto(view)
+            if not n:
+                break
+            total += n
+    return file_path, total, time.monotonic() - start
+
+def read_meminfo(key):
+    """读取 /proc/meminfo 中的字段（字节），读取失败返回None"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith(key + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def memory_budget(budget_gb=None):
+    """页缓存预算（字节）：指定时使用指定值，否则为可用内存的固定比例，无法读取时返回None（不限制）"""
+    if budget_gb:
+        return int(budget_gb * GB)
+    available = read_meminfo('MemAvailable')
+    return int(available * DEFAULT_BUDGET_RATIO) if available else None
+
+def select_within_budget(shards, budget):
+    """按顺序选取总大小不超过预算的分片"""
+    selected, used = [], 0
+    for path in shards:
+        size = os.path.getsize(path)
+        if budget is not None and used + size > budget:
+            break
+        selected.append(path)
+        used += size
+    return selected, used
+
+def warm_pass(shards, workers, chunk_size, verbose=True):
+    """
+    并发预热一轮
+
+    Returns:
+        tuple: (读取字节数, 耗时, 失败文件数)
+    """
+    start = time.monotonic()
+    total, errors = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(warm_file, path, chunk_size): path for path in shards}
+        for i, future in enumerate(as_completed(futures), 1):
+            try:
+                path, size, elapsed = future.result()
+            except Exception as e:
+                errors += 1
+                print(f"读取 {futures[future]} 出错: {str(e)}")
+                continue
+            total += size
+            if verbose:
+                speed = size / GB / elapsed if elapsed > 0 else 0
+                print(f"({i}/{len(shards)}) {os.path.basename(path)}: "
+                      f"{size / GB:.2f} GB, {speed:.2f} GB/s")
+                sys.stdout.flush()
+    return total, time.monotonic() - start, errors
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='模型权重内存预热工具')
+    parser.add_argument('model_path', type=str, help='模型权重目录')
+    parser.add_argument('-j', '--workers', type=int, default=DEFAULT_WORKERS,
+                      help=f'并发预热的文件数（默认：{DEFAULT_WORKERS}）')
+    parser.add_argument('--pattern', type=str,
+                      help='按通配符选择分片（默认：读取 *.safetensors.index.json，没有时为 *.safetensors）')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                      help=f'单次读取大小（MB，默认：{DEFAULT_CHUNK_SIZE // (1024 * 1024)}）')
+    parser.add_argument('--once', action='store_true',
+                      help='只预热一轮后退出（默认常驻循环预热）')
+    parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+                      help=f'常驻模式下两轮预热的间隔（秒，默认：{DEFAULT_INTERVAL}）')
+    parser.add_argument('--memory-budget', type=float,
+                      help=f'允许占用的页缓存上限（GB，默认：可用内存的{int(DEFAULT_BUDGET_RATIO * 100)}%%）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not os.path.isdir(args.model_path):
+        print(f"错误: 模型目录不存在: {args.model_path}")
+        sys.exit(1)
+    shards = find_shards(args.model_path, args.pattern)
+    if not shards:
+        print(f"错误: {args.model_path} 下没有找到权重分片")
+        sys.exit(1)
+
+    budget = memory_budget(args.memory_budget)
+    selected, used = select_within_budget(shards, budget)
+    total_size = sum(os.path.getsize(p) for p in shards)
+    print(f"分片总数: {len(shards)}, 总大小: {total_size / GB:.2f} GB")
+    if len(selected) < len(shards):
+        print(f"警告: 超出内存预算 {budget / GB:.2f} GB，只预热前 {len(selected)} 个分片 ({used / GB:.2f} GB)")
+    if not selected:
+        print("错误: 内存预算不足以容纳任何一个分片")
+        sys.exit(1)
+
+    chunk_size = args.chunk_size * 1024 * 1024
+    round_no = 0
+    while True:
+        round_no += 1
+        print(f"\n开始第 {round_no} 轮预热 ({len(selected)} 个分片, 并发 {args.workers})")
+        total, elapsed, errors = warm_pass(selected, args.workers, chunk_size, verbose=(round_no == 1))
+        speed = total / GB / elapsed if elapsed > 0 else 0
+        print(f"第 {round_no} 轮完成: {total / GB:.2f} GB, 耗时 {elapsed:.1f}s, {speed:.2f} GB/s")
+        if args.once:
+            sys.exit(1 if errors else 0)
+        sys.stdout.flush()
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: Mindie服务配置渲染工具
+      以声明式补丁生成MindIE config.json：基础补丁 + 单机/多机profile + 容量规划 + 公共覆盖 + 节点覆盖，
+      渲染后按schema校验，只在内容变化时备份并原子写入（临时文件+rename），输出最小差异；
+      可在一个进程内为集群中每个节点渲染配置
+"""
+
+import os
+import re
+import sys
+import copy
+import json
+import shutil
+import argparse
+import tempfile
+from datetime import datetime
+
+from plan_capacity import add_capacity_args, plan_from_args, apply_capacity_plan
+
+CONFIG_PATH = "/usr/local/Ascend/mindie/latest/mindie-service/conf/config.json"
+DEVICES_PER_NODE = 8
+
+# 补丁中值为 "{参数名}" 的字符串在渲染时替换为对应参数（保留参数类型）
+BASE_PATCH = {
+    "ServerConfig": {
+        "ipAddress": "{ip}",
+        "managementIpAddress": "{ip}",
+        "httpsEnabled": False,
+        "interCommTLSEnabled": False,
+    },
+    "BackendConfig": {
+        "interNodeTLSEnabled": False,
+        "npuDeviceIds": ["{device_ids}"],
+        "ModelDeployConfig": {
+            "ModelConfig": [{
+                "modelName": "{model_name}",
+                "modelWeightPath": "{model_path}",
+                # worldSize为本节点参与推理的卡数，多机时由rank table组成全局并行组
+                "worldSize": "{local_world_size}",
+            }],
+        },
+    },
+}
+
+PROFILES = {
+    "single": {
+        "BackendConfig": {
+            "multiNodesInferEnabled": False,
+            "ModelDeployConfig": {"maxSeqLen": 32000, "maxInputTokenLen": 24000},
+            "ScheduleConfig": {"maxPrefillTokens": 24000, "maxIterTimes": 8000},
+        },
+    },
+    "multi": {
+        "BackendConfig": {
+            "multiNodesInferEnabled": True,
+            "ModelDeployConfig": {"maxSeqLen": 10000, "maxInputTokenLen": 2048},
+            "ScheduleConfig": {"maxPrefillTokens": 10000, "maxIterTimes": 7952},
+        },
+    },
+}
+
+_PLACEHOLDER = re.compile(r'^\{(\w+)\}$')
+
+def resolve(patch, params):
+    """替换补丁中的参数占位符"""
+    if isinstance(patch, dict):
+        return {k: resolve(v, params) for k, v in patch.items()}
+    if isinstance(patch, list):
+        return [resolve(v, params) for v in patch]
+    if isinstance(patch, str):
+        match = _PLACEHOLDER.match(patch)
+        if match:
+            if match.group(1) not in params:
+                raise KeyError(f"补丁引用了未提供的参数: {match.group(1)}")
+            return copy.deepcopy(params[match.group(1)])
+    return patch
+
+def deep_merge(base, patch):
+    """
+    把补丁合并到base（原地修改）
+
+    字典递归合并；由字典组成的列表按下标逐项合并（如ModelConfig）；其他值直接替换
+    """
+    for key, value in patch.items():
+        current = base.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            deep_merge(current, value)
+        elif (isinstance(value, list) and isinstance(current, list) and value
+              and all(isinstance(v, dict) for v in value) and all(isinstance(c, dict) for c in current)):
+            for i, item in enumerate(value):
+                if i < len(current):
+                    deep_merge(current[i], item)
+                else:
+                    current.append(copy.deepcopy(item))
+        else:
+            base[key] = copy.deepcopy(value)
+    return base
+
+def parse_set(expr):
+    """把 "a.b.0.c=值" 转换为补丁，值按JSON解析，解析失败时作为字符串"""
+    path, sep, raw = expr.partition('=')
+    if not sep or not path:
+        raise ValueError(f"无效的 --set 表达式: {expr}（格式: 路径=值）")
+    try:
+        value = json.loads(raw)
+    except json.JSONDecodeError:
+        value = raw
+    for key in reversed(path.split('.')):
+        if key.isdigit():
+            # 数组下标只用于对象数组（如ModelConfig），前面的元素用空对象占位，合并时保持不变
+            if not isinstance(value, dict):
+                raise ValueError(f"数组下标只能用于对象数组（如 ModelConfig.0.worldSize）: {expr}")
+            value = [{} for _ in range(int(key))] + [value]
+        else:
+            value = {key: value}
+    return value
+
+def build_params(ip, model_name, model_path, world_size, device_ids=None, nodes=None):
+    """
+    生成渲染参数
+
+    单机时 device_ids 为本机使用的设备；多机时每节点使用 world_size/节点数 张卡
+    """
+    if device_ids is None:
+        per_node = world_size // len(nodes) if nodes else min(world_size, DEVICES_PER_NODE)
+        device_ids = list(range(per_node))
+    return {"ip": ip, "model_name": model_name, "model_path": model_path, "world_size": world_size,
+            "device_ids": list(device_ids), "local_world_size": len(device_ids)}
+
+def render_config(base_config, profile, params, capacity=None, overrides=None, node=None, sets=()):
+    """
+    渲染配置：base <- BASE_PATCH <- profile <- 容量规划 <- 公共覆盖 <- 节点覆盖 <- --set
+
+    Returns:
+        dict: 新的配置（不修改base_config）
+    """
+    config = copy.deepcopy(base_config)
+    deep_merge(config, resolve(BASE_PATCH, params))
+    deep_merge(config, resolve(PROFILES[profile], params))
+    if capacity:
+        apply_capacity_plan(config, capacity)
+    overrides = overrides or {}
+    deep_merge(config, resolve(overrides.get("common") or {}, params))
+    if node:
+        deep_merge(config, resolve((overrides.get("nodes") or {}).get(node) or {}, params))
+    for patch in sets:
+        deep_merge(config, patch)
+    return config
+
+def _get(config, path):
+    value = config
+    for key in path.split('.'):
+        if isinstance(value, list) and key.isdigit():
+            value = value[int(key)] if int(key) < len(value) else None
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+def _is_ip(value):
+    return isinstance(value, str) and re.match(r'^(\d{1,3}\.){3}\d{1,3}$', value) \
+        and all(0 <= int(x) <= 255 for x in value.split('.'))
+
+def _is_port(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value < 65536
+
+def _is_positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+# 字段校验规则：(路径, 检查函数, 说明)
+SCHEMA = [
+    ("ServerConfig.ipAddress", _is_ip, "合法的IPv4地址"),
+    ("ServerConfig.managementIpAddress", _is_ip, "合法的IPv4地址"),
+    ("ServerConfig.port", _is_port, "1-65535之间的端口"),
+    ("ServerConfig.managementPort", _is_port, "1-65535之间的端口"),
+    ("ServerConfig.metricsPort", _is_port, "1-65535之间的端口"),
+    ("ServerConfig.httpsEnabled", lambda v: isinstance(v, bool), "布尔值"),
+    ("BackendConfig.multiNodesInferEnabled", lambda v: isinstance(v, bool), "布尔值"),
+    ("BackendConfig.npuDeviceIds",
+     lambda v: isinstance(v, list) and v and all(isinstance(g, list) and g and
+                                                 all(isinstance(d, int) and d >= 0 for d in g) for g in v),
+     "非空的设备ID二维数组"),
+    ("BackendConfig.ModelDeployConfig.maxSeqLen", _is_positive_int, "正整数"),
+    ("BackendConfig.ModelDeployConfig.maxInputTokenLen", _is_positive_int, "正整数"),
+    ("BackendConfig.ModelDeployConfig.ModelConfig.0.modelName", lambda v: isinstance(v, str) and v, "非空字符串"),
+    ("BackendConfig.ModelDeployConfig.ModelConfig.0.modelWeightPath", lambda v: isinstance(v, str) and v,
+     "非空字符串"),
+    ("BackendConfig.ModelDeployConfig.ModelConfig.0.worldSize", _is_positive_int, "正整数"),
+    ("BackendConfig.ScheduleConfig.maxPrefillTokens", _is_positive_int, "正整数"),
+    ("BackendConfig.ScheduleConfig.maxPrefillBatchSize", _is_positive_int, "正整数"),
+    ("BackendConfig.ScheduleConfig.maxBatchSize", _is_positive_int, "正整数"),
+    ("BackendConfig.ScheduleConfig.maxIterTimes", _is_positive_int, "正整数"),
+]
+
+def validate_config(config):
+    """按schema及字段间约束校验配置，返回错误列表"""
+    errors = []
+    for path, check, desc in SCHEMA:
+        value = _get(config, path)
+        if value is None:
+            errors.append(f"缺少字段 {path}")
+        elif not check(value):
+            errors.append(f"{path} 应为{desc}，当前为 {json.dumps(value, ensure_ascii=False)}")
+    if errors:
+        return errors
+
+    server = config["ServerConfig"]
+    ports = [server["port"], server["managementPort"], server["metricsPort"]]
+    if len(set(ports)) != len(ports):
+        errors.append(f"port/managementPort/metricsPort 不能重复: {ports}")
+    backend = config["BackendConfig"]
+    deploy = backend["ModelDeployConfig"]
+    schedule = backend["ScheduleConfig"]
+    if deploy["maxInputTokenLen"] > deploy["maxSeqLen"]:
+        errors.append(f"maxInputTokenLen({deploy['maxInputTokenLen']}) 不能大于 maxSeqLen({deploy['maxSeqLen']})")
+    if schedule["maxPrefillTokens"] < deploy["maxInputTokenLen"]:
+        errors.append(f"maxPrefillTokens({schedule['maxPrefillTokens']}) 不能小于 "
+                      f"maxInputTokenLen({deploy['maxInputTokenLen']})")
+    if schedule["maxPrefillBatchSize"] > schedule["maxBatchSize"]:
+        errors.append(f"maxPrefillBatchSize({schedule['maxPrefillBatchSize']}) 不能大于 "
+                      f"maxBatchSize({schedule['maxBatchSize']})")
+    world_size = deploy["ModelConfig"][0]["worldSize"]
+    if world_size != len(backend["npuDeviceIds"][0]):
+        errors.append(f"worldSize({world_size}) 与 npuDeviceIds 中的设备数({len(backend['npuDeviceIds'][0])})不一致")
+    return errors
+
+def diff_config(old, new, prefix=""):
+    """
+    逐叶子比较两份配置
+
+    Returns:
+        list: [(路径, 旧值, 新值)]，字段不存在时值为None
+    """
+    if isinstance(old, dict) and isinstance(new, dict):
+        changes = []
+        for key in list(old) + [k for k in new if k not in old]:
+            changes += diff_config(old.get(key), new.get(key), f"{prefix}.{key}" if prefix else key)
+        return changes
+    if (isinstance(old, list) and isinstance(new, list) and len(old) == len(new)
+            and all(isinstance(v, dict) for v in old + new)):
+        changes = []
+        for i, (a, b) in enumerate(zip(old, new)):
+            changes += diff_config(a, b, f"{prefix}.{i}")
+        return changes
+    return [] if old == new else [(prefix, old, new)]
+
+def print_diff(changes, title):
+    """打印差异"""
+    if not changes:
+        print(f"{title}: 无变化")
+        return
+    print(f"{title}: {len(changes)} 处变化")
+    for path, old, new in changes:
+        print(f"  {path}: {json.dumps(old, ensure_ascii=False)} -> {json.dumps(new, ensure_ascii=False)}")
+
+def write_config_atomic(config, path):
+    """写入临时文件后rename，保证配置文件不会处于写了一半的状态"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".config.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f, indent=4, ensure_ascii=False)
+            f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o640)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def backup_config(path):
+    """把配置文件备份为 <文件>.backup_<时间戳>"""
+    backup_path = f"{path}.backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    try:
+        shutil.copy2(path, backup_path)
+    except Exception as e:
+        print(f"错误: 备份配置文件失败: {str(e)}")
+        return False
+    print(f"已创建配置文件备份: {backup_path}")
+    return True
+
+def save_config(config, path):
+    """原子写入配置文件"""
+    try:
+        write_config_atomic(config, path)
+    except Exception as e:
+        print(f"错误: 保存配置文件失败: {str(e)}")
+        return False
+    print(f"配置已成功保存到: {path}")
+    return True
+
+def load_config(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"错误: 无法读取文件 {path}: {str(e)}")
+        return None
+
+def load_overrides(path, key=None):
+    """读取覆盖配置 {"common": 补丁, "nodes": {节点IP: 补丁}}，key指定时取文件中的该字段"""
+    data = load_config(path)
+    if data is None:
+        return None
+    if key:
+        data = data.get(key) or {}
+    if not isinstance(data, dict) or not isinstance(data.get("common", {}), dict) \
+            or not isinstance(data.get("nodes", {}), dict):
+        print(f"错误: 覆盖配置格式错误，应为 {{\"common\": {{...}}, \"nodes\": {{\"<ip>\": {{...}}}}}}: {path}")
+        return None
+    return data
+
+def render_to_file(config_path, profile, params, capacity=None, overrides=None, node=None, sets=(),
+                   base_config=None, title=None, dry_run=False):
+    """
+    渲染并写入单个配置文件：内容未变化时不写入也不备份
+
+    Returns:
+        bool: 是否成功
+    """
+    current = load_config(config_path) if os.path.exists(config_path) else None
+    base = base_config if base_config is not None else current
+    if base is None:
+        print(f"错误: 配置文件不存在: {config_path}")
+        return False
+    try:
+        rendered = render_config(base, profile, params, capacity, overrides, node, sets)
+    except (KeyError, TypeError) as e:
+        print(f"错误: 渲染配置失败: {str(e)}")
+        return False
+    errors = validate_config(rendered)
+    if errors:
+        print(f"错误: {title or config_path} 校验失败:")
+        for error in errors:
+            print(f"  - {error}")
+        return False
+
+    # 目标文件不存在时（批量渲染）相对模板输出差异
+    changes = diff_config(current if current is not None else base, rendered)
+    print_diff(changes, title or config_path)
+    if dry_run or (not changes and current is not None):
+        return True
+    if current is not None and not backup_config(config_path):
+        return False
+    return save_config(rendered, config_path)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Mindie服务配置渲染工具')
+    parser.add_argument('--profile', choices=sorted(PROFILES), required=True, help='部署形态')
+    parser.add_argument('--ip', type=str, required=True, help='服务IP（多机时为主节点IP）')
+    parser.add_argument('--model-name', type=str, required=True, help='模型名称')
+    parser.add_argument('--model-path', type=str, required=True, help='模型路径')
+    parser.add_argument('--world-size', type=int, required=True, help='总的设备数量')
+    parser.add_argument('--device-ids', type=str, help='单机使用的设备ID，如 [0,1,2,3]（默认：按world_size从0开始）')
+    parser.add_argument('--nodes', type=str, help='多机节点IP列表（逗号分隔），用于计算每节点卡数和批量渲染')
+    parser.add_argument('--node', type=str, help='当前节点IP，应用overrides中该节点的覆盖配置')
+    parser.add_argument('--config-path', type=str, default=CONFIG_PATH,
+                      help=f'配置文件路径 (默认: {CONFIG_PATH})')
+    parser.add_argument('--base', type=str, help='渲染基础模板（默认：配置文件本身）')
+    parser.add_argument('--overrides', type=str, help='覆盖配置JSON文件')
+    parser.add_argument('--overrides-key', type=str, help='覆盖配置在文件中的字段名（如 mindie_overrides）')
+    parser.add_argument('--set', action='append', default=[], metavar='PATH=VALUE',
+                      help='追加单个字段覆盖，如 BackendConfig.ScheduleConfig.maxBatchSize=64（可重复）')
+    parser.add_argument('--output-dir', type=str,
+                      help='批量渲染：为 --nodes 中每个节点生成 <output-dir>/<ip>/config.json')
+    parser.add_argument('--dry-run', action='store_true', help='只校验并输出差异，不写入')
+    parser.add_argument('--auto-size', action='store_true',
+                      help='根据模型结构和显存自动规划序列长度、batch等参数')
+    add_capacity_args(parser)
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not _is_ip(args.ip):
+        print(f"错误: 无效的IP地址格式: {args.ip}")
+        sys.exit(1)
+    nodes = [n.strip() for n in args.nodes.split(',') if n.strip()] if args.nodes else None
+    try:
+        device_ids = json.loads(args.device_ids) if args.device_ids else None
+        if device_ids is None and args.profile == "single":
+            device_ids = list(range(args.world_size))
+        sets = [parse_set(expr) for expr in args.set]
+    except (ValueError, json.JSONDecodeError) as e:
+        print(f"错误: {str(e)}")
+        sys.exit(1)
+    params = build_params(args.ip, args.model_name, args.model_path, args.world_size, device_ids, nodes)
+
+    overrides = None
+    if args.overrides:
+        overrides = load_overrides(args.overrides, args.overrides_key)
+        if overrides is None:
+            sys.exit(1)
+    base_config = None
+    if args.base:
+        base_config = load_config(args.base)
+        if base_config is None:
+            sys.exit(1)
+
+    # 容量规划对所有节点相同，只计算一次
+    capacity = None
+    if args.auto_size:
+        capacity = plan_from_args(args, args.model_path, args.world_size)
+        if not capacity:
+            print("警告: 容量规划失败，保留默认的序列长度和batch参数")
+
+    if args.output_dir:
+        if not nodes:
+            print("错误: 批量渲染需要指定 --nodes")
+            sys.exit(1)
+        if base_config is None:
+            base_config = load_config(args.config_path)
+            if base_config is None:
+                sys.exit(1)
+        failed = [node for node in nodes
+                  if not render_to_file(os.path.join(args.output_dir, node, "config.json"), args.profile, params,
+                                        capacity, overrides, node, sets, base_config, node, args.dry_run)]
+        if failed:
+            print(f"错误: 以下节点的配置渲染失败: {', '.join(failed)}")
+            sys.exit(1)
+        print(f"已为 {len(nodes)} 个节点生成配置: {args.output_dir}")
+        return
+
+    if not render_to_file(args.config_path, args.profile, params, capacity, overrides, args.node, sets,
+                          base_config, dry_run=args.dry_run):
+        sys.exit(1)
+    print("配置修改完成!")
+
+if __name__ == "__main__":
+    main()
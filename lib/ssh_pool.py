@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: SSH会话池
+      每台主机在整个部署过程中只建立一次认证连接，后续命令在同一transport上新开channel，
+      并提供并行执行、流式输出和超时控制
+"""
+
+import os
+import time
+import select
+import socket
+import signal
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# SSH连接及命令执行的默认超时时间（秒）
+DEFAULT_TIMEOUT = 30
+
+def connect_to_server(server_ip, username, password, use_key, key_path, port=22,
+                      timeout=DEFAULT_TIMEOUT):
+    """建立SSH连接"""
+    # 只有连接远端主机时才需要paramiko，全部为本机执行时（如单机部署）不要求安装
+    import paramiko
+    try:
+        ssh = paramiko.SSHClient()
+        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        print(f"\n正在连接到 {server_ip}...")
+
+        if use_key:
+            if key_path:
+                # 展开路径中的~
+                key_path = os.path.expanduser(key_path)
+                if not os.path.exists(key_path):
+                    print(f"错误: SSH密钥文件不存在: {key_path}")
+                    return None
+                ssh.connect(server_ip, username=username, key_filename=key_path, port=port,
+                            timeout=timeout, banner_timeout=timeout, auth_timeout=timeout)
+            else:
+                # 使用默认密钥路径
+                ssh.connect(server_ip, username=username, port=port,
+                            timeout=timeout, banner_timeout=timeout, auth_timeout=timeout)
+        else:
+            if not password:
+                print("错误: 使用密码认证但未提供密码")
+                return None
+            ssh.connect(server_ip, username=username, password=password, port=port,
+                        timeout=timeout, banner_timeout=timeout, auth_timeout=timeout)
+
+        return ssh
+    except Exception as e:
+        print(f"连接到 {server_ip} 失败: {str(e)}")
+        return None
+
+class CommandResult:
+    """命令执行结果"""
+
+    def __init__(self, host, exit_code, stdout, stderr, elapsed):
+        self.host = host
+        self.exit_code = exit_code
+        self.stdout = stdout
+        self.stderr = stderr
+        self.elapsed = elapsed
+
+    @property
+    def ok(self):
+        return self.exit_code == 0
+
+class _LineSplitter:
+    """把分块到达的输出切分成行并回调"""
+
+    def __init__(self, host, on_line):
+        self.host = host
+        self.on_line = on_line
+        self.pending = b""
+
+    def feed(self, data):
+        if not self.on_line:
+            return
+        self.pending += data
+        *lines, self.pending = self.pending.split(b"\n")
+        for line in lines:
+            self.on_line(self.host, line.decode(errors='replace'))
+
+    def flush(self):
+        if self.on_line and self.pending:
+            self.on_line(self.host, self.pending.decode(errors='replace'))
+        self.pending = b""
+
+class SSHSessionPool:
+    """
+    按主机复用的SSH会话池
+
+    用法:
+        with SSHSessionPool.from_config(config["ssh"], local_hosts=[local_ip]) as pool:
+            results = pool.run_on_all(nodes, "hostname")
+
+    local_hosts 中的主机不走SSH，直接在本机用bash执行，便于部署节点自身也参与并行操作。
+    """
+
+    def __init__(self, username, password=None, use_key=True, key_path=None, port=22,
+                 timeout=DEFAULT_TIMEOUT, local_hosts=None):
+        self.username = username
+        self.password = password
+        self.use_key = use_key
+        self.key_path = key_path
+        self.port = port or 22
+        self.timeout = timeout
+        self.local_hosts = set(h for h in (local_hosts or []) if h)
+        self._clients = {}
+        self._host_locks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, ssh_config, timeout=DEFAULT_TIMEOUT, local_hosts=None):
+        """根据deploy_config.json中的ssh配置创建会话池"""
+        ssh_config = ssh_config or {}
+        return cls(ssh_config.get("username"), ssh_config.get("password"),
+                   ssh_config.get("use_key", True), ssh_config.get("key_path"),
+                   ssh_config.get("port") or 22, timeout, local_hosts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _host_lock(self, host):
+        with self._lock:
+            return self._host_locks.setdefault(host, threading.Lock())
+
+    def get_client(self, host):
+        """获取主机的已认证连接，连接断开时自动重连"""
+        with self._host_lock(host):
+            client = self._clients.get(host)
+            transport = client.get_transport() if client else None
+            if transport is None or not transport.is_active():
+                client = connect_to_server(host, self.username, self.password, self.use_key,
+                                           self.key_path, self.port, self.timeout)
+                if not client:
+                    raise ConnectionError(f"SSH连接 {host} 失败")
+                # 保活，避免长时间部署过程中连接被中间设备断开
+                client.get_transport().set_keepalive(30)
+                self._clients[host] = client
+            return client
+
+    def exec_command(self, host, command, timeout=None):
+        """与paramiko.SSHClient.exec_command相同的接口，复用已有连接"""
+        return self.get_client(host).exec_command(command, timeout=timeout or self.timeout)
+
+    def open_sftp(self, host):
+        """在已有连接上打开SFTP会话"""
+        return self.get_client(host).open_sftp()
+
+    def run(self, host, command, timeout=None, input_data=None, on_line=None):
+        """
+        在指定主机上执行命令
+
+        Args:
+            host: 主机IP
+            command: shell命令
+            timeout: 总超时时间（秒），None表示不限制
+            input_data: 写入命令标准输入的内容（str或bytes）
+            on_line: 标准输出每一行的回调 on_line(host, line)
+
+        Returns:
+            CommandResult
+        """
+        if isinstance(input_data, str):
+            input_data = input_data.encode()
+        if host in self.local_hosts:
+            return self._run_local(host, command, timeout, input_data, on_line)
+        return self._run_remote(host, command, timeout, input_data, on_line)
+
+    def _run_remote(self, host, command, timeout, input_data, on_line):
+        start = time.monotonic()
+        deadline = start + timeout if timeout else None
+        channel = self.get_client(host).get_transport().open_session(timeout=self.timeout)
+        # 单次收发等待的上限，对端停止读取标准输入时写入线程不会永久阻塞
+        channel.settimeout(self.timeout)
+        send_errors = []
+
+        def feed_stdin():
+            try:
+                if input_data is not None:
+                    channel.sendall(input_data)
+                channel.shutdown_write()
+            except Exception as e:
+                # 命令未读完标准输入就退出时通道已关闭，由退出码反映结果
+                send_errors.append(e)
+
+        # 标准输入在后台线程写入：命令先输出超过通道窗口的内容再读标准输入时，
+        # 在当前线程写完再读取输出会和对端互相等待
+        stdin_writer = threading.Thread(target=feed_stdin, daemon=True)
+        try:
+            channel.exec_command(command)
+            stdin_writer.start()
+
+            stdout, stderr = bytearray(), bytearray()
+            splitter = _LineSplitter(host, on_line)
+            while True:
+                # 超时检查放在循环开头：持续有输出时每次读完都会continue，放在后面永远执行不到
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError(f"{host} 执行命令超时({timeout}s): {command}")
+                if send_errors and isinstance(send_errors[0], socket.timeout):
+                    raise TimeoutError(f"{host} 写入标准输入超时({self.timeout}s): {command}")
+                if channel.recv_ready():
+                    data = channel.recv(65536)
+                    stdout += data
+                    splitter.feed(data)
+                    continue
+                if channel.recv_stderr_ready():
+                    stderr += channel.recv_stderr(65536)
+                    continue
+                if channel.exit_status_ready():
+                    break
+                select.select([channel], [], [], 0.5)
+            # 退出后把缓冲区中剩余的输出读完
+            while channel.recv_ready():
+                data = channel.recv(65536)
+                stdout += data
+                splitter.feed(data)
+            while channel.recv_stderr_ready():
+                stderr += channel.recv_stderr(65536)
+            splitter.flush()
+            return CommandResult(host, channel.recv_exit_status(), stdout.decode(errors='replace'),
+                                 stderr.decode(errors='replace'), time.monotonic() - start)
+        finally:
+            # 关闭通道后仍阻塞在写入中的线程会立即出错退出
+            channel.close()
+            if stdin_writer.is_alive():
+                stdin_writer.join()
+
+    def _run_local(self, host, command, timeout, input_data, on_line):
+        start = time.monotonic()
+        # 命令放在独立的进程组中，超时时连同其启动的子进程一起结束，避免子进程继续占用输出管道
+        proc = subprocess.Popen(['bash', '-c', command], stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+
+        def feed_stdin():
+            try:
+                if input_data is not None:
+                    proc.stdin.write(input_data)
+                proc.stdin.close()
+            except (BrokenPipeError, ValueError):
+                # 命令未读完标准输入就退出
+                pass
+
+        # 标准输入和标准错误都在后台线程处理：命令先输出大量内容再读标准输入时，
+        # 在当前线程写入会和读取标准输出互相等待
+        stdin_writer = threading.Thread(target=feed_stdin)
+        stdin_writer.start()
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+        stderr_reader.start()
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, kill)
+            timer.start()
+        try:
+            stdout = bytearray()
+            splitter = _LineSplitter(host, on_line)
+            for line in iter(proc.stdout.readline, b""):
+                stdout += line
+                splitter.feed(line)
+            splitter.flush()
+            exit_code = proc.wait()
+            stderr_reader.join()
+            stdin_writer.join()
+        finally:
+            if timer:
+                timer.cancel()
+        if timed_out.is_set():
+            raise TimeoutError(f"{host} 执行命令超时({timeout}s): {command}")
+        return CommandResult(host, exit_code, stdout.decode(errors='replace'),
+                             b"".join(stderr_chunks).decode(errors='replace'), time.monotonic() - start)
+
+    def run_on_all(self, hosts, command, timeout=None, input_data=None, on_line=None):
+        """
+        在所有主机上并行执行同一条命令
+
+        Returns:
+            dict: {主机: CommandResult 或 Exception}，顺序与hosts一致
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(len(hosts), 1)) as executor:
+            futures = {host: executor.submit(self.run, host, command, timeout, input_data, on_line)
+                       for host in hosts}
+            for host, future in futures.items():
+                try:
+                    results[host] = future.result()
+                except Exception as e:
+                    results[host] = e
+        return results
+
+    def close(self):
+        """关闭所有连接"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                pass
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 容器工作目录同步工具
+      只把容器内部署阶段需要的文件（deploy.sh、部署配置、lib/）打包成一个tar流，
+      经 docker exec ... tar -x 写入容器；容器内内容哈希一致的文件会被跳过
+"""
+
+import os
+import io
+import sys
+import glob
+import shlex
+import hashlib
+import tarfile
+import argparse
+import subprocess
+
+# 容器内部署阶段需要的文件（相对工具根目录）
+SYNC_PATTERNS = ["deploy.sh", "lib/*"]
+
+def build_manifest(root, config_file, patterns=SYNC_PATTERNS):
+    """
+    生成需要同步的文件清单，部署配置固定放在目标目录下
+
+    Returns:
+        dict: {容器内相对路径: (本地文件路径, sha256)}
+    """
+    sources = {}
+    if config_file:
+        sources[os.path.basename(config_file)] = config_file
+    for pattern in patterns:
+        for file_path in sorted(glob.glob(os.path.join(root, pattern))):
+            sources[os.path.relpath(file_path, root)] = file_path
+
+    manifest = {}
+    for relative_path, file_path in sources.items():
+        if not os.path.isfile(file_path):
+            continue
+        with open(file_path, 'rb') as f:
+            manifest[relative_path] = (file_path, hashlib.sha256(f.read()).hexdigest())
+    return manifest
+
+def remote_digests(container, dest, relative_paths):
+    """读取容器内已有文件的sha256（不存在的文件不会出现在结果中）"""
+    if not relative_paths:
+        return {}
+    cmd = f"cd {shlex.quote(dest)} 2>/dev/null && sha256sum -- " + " ".join(
+        shlex.quote(p) for p in relative_paths) + " 2>/dev/null; true"
+    result = subprocess.run(["docker", "exec", container, "sh", "-c", cmd],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        return {}
+    digests = {}
+    for line in result.stdout.splitlines():
+        parts = line.split(None, 1)
+        if len(parts) == 2:
+            digests[parts[1].lstrip('*')] = parts[0]
+    return digests
+
+def build_tar(files):
+    """把 [(容器内相对路径, 本地文件路径)] 打包成内存中的tar流（保留文件权限）"""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as tar:
+        for relative_path, file_path in files:
+            info = tar.gettarinfo(file_path, arcname=relative_path)
+            info.uid = info.gid = 0
+            info.uname = info.gname = "root"
+            with open(file_path, 'rb') as f:
+                tar.addfile(info, f)
+    return buffer.getvalue()
+
+def sync_workspace(container, root, config_file, dest="/workspace", dry_run=False):
+    """
+    同步工作目录到容器
+
+    Returns:
+        tuple: (同步的文件列表, 跳过的文件数)，失败返回 None
+    """
+    manifest = build_manifest(root, config_file)
+    existing = remote_digests(container, dest, list(manifest))
+    changed = [p for p, (_, digest) in manifest.items() if existing.get(p) != digest]
+    skipped = len(manifest) - len(changed)
+    if not changed or dry_run:
+        return changed, skipped
+
+    data = build_tar([(p, manifest[p][0]) for p in changed])
+    cmd = f"mkdir -p {shlex.quote(dest)} && tar -x -f - -C {shlex.quote(dest)}"
+    result = subprocess.run(["docker", "exec", "-i", container, "sh", "-c", cmd],
+                            input=data, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        print(f"错误: 同步文件到容器 {container} 失败: {result.stderr.decode(errors='replace').strip()}")
+        return None
+    return changed, skipped
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='容器工作目录同步工具')
+    parser.add_argument('container', type=str, help='目标容器名称')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--dest', type=str, default='/workspace',
+                      help='容器内的目标目录（默认：/workspace）')
+    parser.add_argument('--dry-run', action='store_true',
+                      help='只列出需要同步的文件，不实际复制')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    config_file = os.path.abspath(args.config)
+    if not os.path.isfile(config_file):
+        print(f"错误: 未找到配置文件 {args.config}")
+        sys.exit(1)
+
+    result = sync_workspace(args.container, root, config_file, args.dest, args.dry_run)
+    if result is None:
+        sys.exit(1)
+    changed, skipped = result
+    for relative_path in changed:
+        print(f"  {relative_path}")
+    action = "需要同步" if args.dry_run else "已同步"
+    print(f"{action} {len(changed)} 个文件到 {args.container}:{args.dest}，内容未变化跳过 {skipped} 个")
+
+if __name__ == '__main__':
+    main()
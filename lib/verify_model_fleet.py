@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 多节点模型权重一致性校验工具
+      并行在所有节点上计算权重MD5，汇总后输出各节点差异矩阵
+"""
+
+import os
+import sys
+import re
+import json
+import shlex
+import argparse
+import threading
+
+from generate_ranktable import get_local_ip
+from ssh_pool import SSHSessionPool
+
+CALC_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calc_model_md5.py")
+
+def load_deploy_config(config_path):
+    """加载部署配置文件"""
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"错误: 无法读取部署配置 {config_path}: {str(e)}")
+        return None
+
+def container_to_host_path(model_path, volumes):
+    """根据docker.volumes把容器内的模型路径换算成宿主机路径（最长前缀匹配）"""
+    best = None
+    for host_path, container_path in (volumes or {}).items():
+        container_path = container_path.rstrip('/') or '/'
+        if model_path == container_path or model_path.startswith(container_path.rstrip('/') + '/'):
+            if best is None or len(container_path) > len(best[1]):
+                best = (host_path, container_path)
+    if best is None:
+        return model_path
+    host_path, container_path = best
+    relative_path = os.path.relpath(model_path, container_path)
+    return host_path if relative_path == '.' else os.path.join(host_path, relative_path)
+
+def parse_digest_line(line):
+    """解析 calc_model_md5.py --porcelain 的输出行，返回 (相对路径, md5)"""
+    parts = line.rstrip('\n').split('  ', 1)
+    if len(parts) != 2 or not re.fullmatch(r'[0-9a-f]+', parts[0]):
+        return None
+    return parts[1], parts[0]
+
+def summarize_errors(stderr):
+    """从calc_model_md5.py的标准错误中提取错误行"""
+    lines = [l for l in stderr.splitlines() if '出错' in l or '错误' in l]
+    return '\n'.join(lines) or (stderr.strip().splitlines() or ["未知错误"])[-1]
+
+def build_hash_args(workers, quick):
+    """构造calc_model_md5.py的附加参数"""
+    extra = []
+    if workers:
+        extra += ['-j', str(int(workers))]
+    if quick:
+        extra.append('--quick')
+    return extra
+
+def hash_on_node(pool, node, model_path, extra_args, on_line):
+    """在节点上计算权重MD5：脚本经标准输入传入，远端无需预先部署工具"""
+    cmd = " ".join(["python3", "-", shlex.quote(model_path), "--porcelain"] + extra_args)
+    with open(CALC_SCRIPT, 'r', encoding='utf-8') as f:
+        script = f.read()
+    result = pool.run(node, cmd, input_data=script, on_line=on_line)
+    if not result.ok:
+        raise RuntimeError(summarize_errors(result.stderr))
+
+def verify_node(pool, node, model_path, extra_args, results, errors, lock):
+    """在单个节点上计算权重MD5，结果写入results[node]（部分文件失败时保留已完成的结果）"""
+    digests = {}
+    results[node] = digests
+
+    def on_line(host, line):
+        parsed = parse_digest_line(line)
+        if not parsed:
+            return
+        relative_path, md5 = parsed
+        digests[relative_path] = md5
+        with lock:
+            print(f"[{host}] {md5}  {relative_path}")
+            sys.stdout.flush()
+
+    try:
+        hash_on_node(pool, node, model_path, extra_args, on_line)
+    except Exception as e:
+        errors[node] = str(e)
+        with lock:
+            print(f"[{node}] 错误: {str(e)}")
+
+def build_diff_matrix(nodes, results):
+    """
+    以多数节点的MD5为基准，生成差异矩阵
+
+    Returns:
+        list: [(相对路径, 基准md5, {节点: 'OK'|'DIFF'|'MISSING'})]，仅包含存在差异的文件
+    """
+    all_files = sorted(set().union(*(results[n].keys() for n in nodes if n in results)))
+    rows = []
+    for relative_path in all_files:
+        counts = {}
+        for node in nodes:
+            md5 = results.get(node, {}).get(relative_path)
+            if md5:
+                counts[md5] = counts.get(md5, 0) + 1
+        reference = max(counts, key=counts.get) if counts else None
+        states = {}
+        for node in nodes:
+            md5 = results.get(node, {}).get(relative_path)
+            states[node] = 'MISSING' if md5 is None else ('OK' if md5 == reference else 'DIFF')
+        if any(state != 'OK' for state in states.values()):
+            rows.append((relative_path, reference, states))
+    return rows
+
+def print_diff_matrix(nodes, rows):
+    """打印差异矩阵"""
+    name_width = max([len(r[0]) for r in rows] + [len("文件")])
+    col_width = max(len(n) for n in nodes)
+    print(f"\n{'文件'.ljust(name_width)}  " + "  ".join(n.ljust(col_width) for n in nodes))
+    for relative_path, _, states in rows:
+        print(f"{relative_path.ljust(name_width)}  " + "  ".join(states[n].ljust(col_width) for n in nodes))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='多节点模型权重一致性校验工具')
+    parser.add_argument('--config', type=str, default='deploy_config.json',
+                      help='部署配置文件路径（默认：deploy_config.json）')
+    parser.add_argument('--model-path', type=str,
+                      help='宿主机上的模型路径（默认根据model_path和docker.volumes换算）')
+    parser.add_argument('--nodes', type=str,
+                      help='要校验的节点IP列表，用逗号分隔（默认：配置中的nodes）')
+    parser.add_argument('-j', '--workers', type=int,
+                      help='每个节点上并行计算的进程数（默认：远端CPU核数）')
+    parser.add_argument('--quick', action='store_true',
+                      help='使用快速指纹模式（只读取safetensors头部和采样区间）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    config = load_deploy_config(args.config)
+    if not config:
+        sys.exit(1)
+
+    nodes = args.nodes.split(',') if args.nodes else config.get("nodes", [])
+    if not nodes:
+        print("错误: 未配置节点列表")
+        sys.exit(1)
+    model_path = args.model_path or container_to_host_path(
+        config.get("model_path", ""), config.get("docker", {}).get("volumes"))
+    print(f"校验节点: {nodes}")
+    print(f"宿主机模型路径: {model_path}")
+
+    local_ip = get_local_ip(nodes)
+    results, errors = {}, {}
+    lock = threading.Lock()
+    extra_args = build_hash_args(args.workers, args.quick)
+    with SSHSessionPool.from_config(config.get("ssh"), local_hosts=[local_ip]) as pool:
+        threads = [threading.Thread(target=verify_node,
+                                    args=(pool, node, model_path, extra_args, results, errors, lock))
+                   for node in nodes]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    rows = build_diff_matrix(nodes, results)
+    file_count = len(set().union(*(r.keys() for r in results.values()))) if results else 0
+    if rows:
+        print_diff_matrix(nodes, rows)
+    print(f"\n共 {file_count} 个文件, 存在差异 {len(rows)} 个, 失败节点 {len(errors)} 个")
+    for node, err in errors.items():
+        print(f"  {node}: {err}")
+
+    if rows or errors:
+        sys.exit(1)
+    print("所有节点权重一致")
+
+if __name__ == '__main__':
+    main()
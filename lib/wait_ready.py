@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: MindIE服务就绪等待工具
+      按指数退避轮询业务端口(/v1/models)和管理端口(健康检查接口)，直到服务真正可以接收请求，
+      记录启动到就绪的耗时，超过截止时间或服务进程退出时以非0状态码退出
+"""
+
+import os
+import sys
+import json
+import time
+import ssl
+import argparse
+import urllib.error
+import urllib.request
+
+MINDIE_CONFIG_PATH = "/usr/local/Ascend/mindie/latest/mindie-service/conf/config.json"
+
+# 默认探测接口：业务端口的模型列表和管理端口的就绪检查
+DEFAULT_ENDPOINTS = [("port", "/v1/models"), ("managementPort", "/v2/health/ready")]
+
+DEFAULT_DEADLINE = 1800
+INITIAL_INTERVAL = 1.0
+MAX_INTERVAL = 10.0
+BACKOFF_FACTOR = 1.5
+
+def load_server_config(config_path):
+    """读取MindIE配置中的ServerConfig，文件不存在时返回空字典"""
+    if not config_path or not os.path.isfile(config_path):
+        return {}
+    try:
+        with open(config_path, 'r') as f:
+            return json.load(f).get("ServerConfig", {})
+    except Exception as e:
+        print(f"警告: 无法读取MindIE配置 {config_path}: {str(e)}")
+        return {}
+
+def build_probe_urls(server_config, host=None, port=None, management_port=None):
+    """根据ServerConfig生成需要探测的URL列表"""
+    scheme = "https" if server_config.get("httpsEnabled") else "http"
+    ports = {
+        "port": port or server_config.get("port", 1025),
+        "managementPort": management_port or server_config.get("managementPort", 1026),
+    }
+    hosts = {
+        "port": host or server_config.get("ipAddress", "127.0.0.1"),
+        "managementPort": host or server_config.get("managementIpAddress")
+                          or server_config.get("ipAddress", "127.0.0.1"),
+    }
+    return [f"{scheme}://{hosts[key]}:{ports[key]}{path}" for key, path in DEFAULT_ENDPOINTS]
+
+def probe(url, timeout=5):
+    """请求一次URL，返回 (是否就绪, 说明)"""
+    context = None
+    if url.startswith("https"):
+        # 只用于本机就绪探测，不校验服务端证书
+        context = ssl._create_unverified_context()
+    try:
+        with urllib.request.urlopen(url, timeout=timeout, context=context) as response:
+            return 200 <= response.status < 300, f"HTTP {response.status}"
+    except urllib.error.HTTPError as e:
+        return False, f"HTTP {e.code}"
+    except Exception as e:
+        return False, str(getattr(e, 'reason', e))
+
+def process_alive(process_name):
+    """检查服务进程是否仍在运行（按可执行文件名匹配，避免匹配到命令行参数中含有进程名的本进程）"""
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/cmdline', 'rb') as f:
+                argv0 = f.read().split(b'\0', 1)[0].decode(errors='replace')
+        except OSError:
+            continue
+        if os.path.basename(argv0) == process_name:
+            return True
+    return False
+
+def wait_ready(urls, deadline=DEFAULT_DEADLINE, process_name=None, quiet=False):
+    """
+    轮询所有URL直到全部就绪
+
+    Returns:
+        tuple: (状态 'ready'|'timeout'|'exited', 耗时秒数)
+    """
+    start = time.monotonic()
+    interval = INITIAL_INTERVAL
+    pending = list(urls)
+    last_status = {}
+    while True:
+        elapsed = time.monotonic() - start
+        for url in list(pending):
+            ready, status = probe(url)
+            if ready:
+                pending.remove(url)
+                if not quiet:
+                    print(f"[{elapsed:6.1f}s] 就绪: {url}")
+            elif not quiet and last_status.get(url) != status:
+                print(f"[{elapsed:6.1f}s] 等待: {url} ({status})")
+            last_status[url] = status
+        if not pending:
+            return 'ready', time.monotonic() - start
+        if process_name and not process_alive(process_name):
+            return 'exited', time.monotonic() - start
+        remaining = deadline - (time.monotonic() - start)
+        if remaining <= 0:
+            return 'timeout', time.monotonic() - start
+        time.sleep(min(interval, remaining))
+        interval = min(interval * BACKOFF_FACTOR, MAX_INTERVAL)
+
+def append_record(record_path, record):
+    """把就绪耗时以JSON行追加到记录文件"""
+    with open(record_path, 'a') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='MindIE服务就绪等待工具')
+    parser.add_argument('--config', type=str, default=MINDIE_CONFIG_PATH,
+                      help=f'MindIE配置文件路径（默认：{MINDIE_CONFIG_PATH}）')
+    parser.add_argument('--host', type=str,
+                      help='探测的服务地址（默认：ServerConfig中的ipAddress/managementIpAddress）')
+    parser.add_argument('--port', type=int, help='业务端口（默认：ServerConfig.port）')
+    parser.add_argument('--management-port', type=int,
+                      help='管理端口（默认：ServerConfig.managementPort）')
+    parser.add_argument('--url', action='append',
+                      help='自定义探测URL，可多次指定，指定后不再使用默认接口')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_DEADLINE,
+                      help=f'最长等待时间（秒，默认：{DEFAULT_DEADLINE}）')
+    parser.add_argument('--process', type=str,
+                      help='服务进程名，进程退出时立即失败（如 mindieservice_daemon）')
+    parser.add_argument('--record', type=str,
+                      help='把就绪耗时以JSON行追加到该文件')
+    parser.add_argument('--quiet', action='store_true', help='只输出最终结果')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    urls = args.url or build_probe_urls(load_server_config(args.config), args.host,
+                                        args.port, args.management_port)
+    print(f"等待服务就绪（最长 {args.timeout:.0f}s）: {', '.join(urls)}")
+    status, elapsed = wait_ready(urls, args.timeout, args.process, args.quiet)
+
+    if args.record:
+        append_record(args.record, {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "status": status,
+                                    "seconds": round(elapsed, 2), "urls": urls})
+    if status == 'ready':
+        print(f"服务已就绪，耗时 {elapsed:.1f}s")
+        return
+    if status == 'exited':
+        print(f"错误: 服务进程 {args.process} 已退出，{elapsed:.1f}s 内未就绪")
+    else:
+        print(f"错误: 等待 {elapsed:.1f}s 后服务仍未就绪")
+    sys.exit(1)
+
+if __name__ == '__main__':
+    main()
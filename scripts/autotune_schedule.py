@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: ScheduleConfig自动调优工具
+      遍历给定的参数搜索空间，每组参数写入MindIE配置后重启服务、等待就绪并施加固定负载，
+      记录吞吐和时延，输出结果表以及满足SLO的帕累托最优配置
+"""
+
+import os
+import sys
+import copy
+import json
+import random
+import argparse
+import itertools
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+from render_mindie_config import CONFIG_PATH, load_config, backup_config, save_config, validate_config
+from wait_ready import wait_ready
+from bench_api import parse_length_dist, build_requests, run_benchmark
+
+# 默认搜索空间
+DEFAULT_SPACE = {
+    "maxBatchSize": [64, 128, 200],
+    "maxPrefillBatchSize": [20, 50],
+    "prefillTimeMsPerReq": [150],
+    "decodeTimeMsPerReq": [50],
+    "supportSelectBatch": [False, True],
+}
+
+# 默认重启命令：匹配模式写成只会匹配到服务进程本身，避免误杀执行该命令的shell
+DEFAULT_RESTART_CMD = (
+    "pkill -f '^\\./bin/mindieservice_daemon'; pkill -f '[m]indie_llm_back'; sleep 5; "
+    "cd /usr/local/Ascend/mindie/latest/mindie-service && "
+    "nohup ./bin/mindieservice_daemon > output_autotune.log 2>&1 &"
+)
+
+def load_space(space_arg):
+    """读取搜索空间：JSON文件路径或JSON字符串，未指定时使用默认值"""
+    if not space_arg:
+        return DEFAULT_SPACE
+    if os.path.isfile(space_arg):
+        with open(space_arg, 'r') as f:
+            return json.load(f)
+    return json.loads(space_arg)
+
+def expand_space(space, max_trials=None, seed=0):
+    """展开搜索空间为候选参数列表，超过max_trials时随机抽样"""
+    keys = list(space)
+    candidates = [dict(zip(keys, values)) for values in itertools.product(*(space[k] for k in keys))]
+    if max_trials and len(candidates) > max_trials:
+        candidates = random.Random(seed).sample(candidates, max_trials)
+    return candidates
+
+def apply_schedule(config_path, base_config, params):
+    """
+    在原配置基础上写入候选参数到ScheduleConfig
+
+    写入前按 render_mindie_config 的schema校验，候选参数引入新的校验错误（如 maxPrefillBatchSize
+    大于 maxBatchSize）时不写入；原配置本身已有的问题不影响候选参数
+    """
+    config_data = copy.deepcopy(base_config)
+    config_data["BackendConfig"]["ScheduleConfig"].update(params)
+    existing = set(validate_config(base_config))
+    errors = [e for e in validate_config(config_data) if e not in existing]
+    if errors:
+        print("错误: 候选参数校验失败，跳过:")
+        for error in errors:
+            print(f"  - {error}")
+        return False
+    return save_config(config_data, config_path)
+
+def restart_service(restart_cmd, base_url, ready_timeout):
+    """
+    执行重启命令并等待服务就绪
+
+    Returns:
+        tuple: (是否就绪, 就绪耗时秒数)
+    """
+    result = subprocess.run(restart_cmd, shell=True)
+    if result.returncode != 0:
+        print(f"错误: 重启命令执行失败（退出码 {result.returncode}）")
+        return False, 0.0
+    status, elapsed = wait_ready([f"{base_url}/v1/models"], ready_timeout, quiet=True)
+    if status != 'ready':
+        print(f"错误: 服务未能就绪 ({status})")
+        return False, elapsed
+    return True, elapsed
+
+def meets_slo(metrics, slo_ttft, slo_tpot):
+    """是否满足SLO（无错误且p99时延在阈值内）"""
+    if metrics is None or metrics["errors"] or metrics["ttft_p99_ms"] is None:
+        return False
+    if slo_ttft and metrics["ttft_p99_ms"] > slo_ttft:
+        return False
+    if slo_tpot and metrics["tpot_p99_ms"] is not None and metrics["tpot_p99_ms"] > slo_tpot:
+        return False
+    return True
+
+def pareto_front(results):
+    """吞吐越高、TTFT/TPOT p99越低越好，返回不被其他结果支配的结果"""
+    def key(r):
+        m = r["metrics"]
+        return (-m["output_tokens_per_s"], m["ttft_p99_ms"], m["tpot_p99_ms"] or 0)
+
+    front = []
+    for r in results:
+        dominated = any(all(a <= b for a, b in zip(key(o), key(r))) and key(o) != key(r) for o in results)
+        if not dominated:
+            front.append(r)
+    return sorted(front, key=key)
+
+def print_results(results, keys):
+    """打印结果表"""
+    header = keys + ["tok/s", "TTFT p99", "TPOT p99", "错误", "SLO"]
+    rows = []
+    for r in results:
+        m = r["metrics"]
+        if m is None:
+            rows.append([str(r["params"][k]) for k in keys] + ["-", "-", "-", "-", "失败"])
+            continue
+        rows.append([str(r["params"][k]) for k in keys] + [
+            f"{m['output_tokens_per_s']:.1f}",
+            f"{m['ttft_p99_ms']:.0f}ms" if m['ttft_p99_ms'] is not None else "-",
+            f"{m['tpot_p99_ms']:.1f}ms" if m['tpot_p99_ms'] is not None else "-",
+            str(m["errors"]), "满足" if r["slo_ok"] else "不满足"])
+    widths = [max(len(h), *(len(row[i]) for row in rows)) for i, h in enumerate(header)]
+    print("  ".join(h.ljust(w) for h, w in zip(header, widths)))
+    for row in rows:
+        print("  ".join(c.ljust(w) for c, w in zip(row, widths)))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='ScheduleConfig自动调优工具')
+    parser.add_argument('--config-path', type=str, default=CONFIG_PATH,
+                      help=f'MindIE配置文件路径（默认：{CONFIG_PATH}）')
+    parser.add_argument('--space', type=str,
+                      help='搜索空间，JSON文件路径或JSON字符串，如 \'{"maxBatchSize":[64,128]}\'')
+    parser.add_argument('--max-trials', type=int, help='最多尝试的候选数（超过时随机抽样）')
+    parser.add_argument('--slo-ttft', type=float, help='TTFT p99上限（毫秒）')
+    parser.add_argument('--slo-tpot', type=float, help='TPOT p99上限（毫秒）')
+    parser.add_argument('--url', type=str, default='http://127.0.0.1:1025',
+                      help='服务地址（默认：http://127.0.0.1:1025）')
+    parser.add_argument('--model', type=str, required=True, help='模型名称')
+    parser.add_argument('--restart-cmd', type=str, default=DEFAULT_RESTART_CMD,
+                      help='重启服务的shell命令（默认重启mindieservice_daemon）')
+    parser.add_argument('--ready-timeout', type=float, default=1800,
+                      help='每次重启后等待服务就绪的最长时间（秒，默认：1800）')
+    parser.add_argument('--concurrency', type=int, default=32, help='负载并发数（默认：32）')
+    parser.add_argument('--requests', type=int, default=256, help='每组参数的请求数（默认：256）')
+    parser.add_argument('--prompt-len', type=str, default='512',
+                      help='prompt长度分布（token），格式同bench_api.py（默认：512）')
+    parser.add_argument('--max-tokens', type=str, default='256',
+                      help='输出长度分布（token），格式同bench_api.py（默认：256）')
+    parser.add_argument('--output', type=str, default='autotune_results.json',
+                      help='结果输出文件（默认：autotune_results.json）')
+    parser.add_argument('--apply-best', action='store_true',
+                      help='调优结束后把最优配置写回MindIE配置（默认恢复原配置）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    original = load_config(args.config_path)
+    if not original or not backup_config(args.config_path):
+        sys.exit(1)
+    try:
+        requests = build_requests(args.requests, parse_length_dist(args.prompt_len),
+                                  parse_length_dist(args.max_tokens))
+    except ValueError as e:
+        print(f"错误: {str(e)}")
+        sys.exit(1)
+    space = load_space(args.space)
+    candidates = expand_space(space, args.max_trials)
+    keys = list(space)
+    base_url = args.url.rstrip('/')
+    print(f"共 {len(candidates)} 组候选参数")
+
+    results = []
+    # 搜索中途出错或被中断时也要恢复原配置并重启服务，避免服务停留在某组候选参数上
+    restore = True
+    try:
+        for i, params in enumerate(candidates, 1):
+            print(f"\n=== [{i}/{len(candidates)}] {params} ===")
+            result = {"params": params, "metrics": None, "slo_ok": False}
+            results.append(result)
+            if not apply_schedule(args.config_path, original, params):
+                continue
+            ready, elapsed = restart_service(args.restart_cmd, base_url, args.ready_timeout)
+            if not ready:
+                print("跳过该组参数")
+                continue
+            print(f"服务就绪耗时 {elapsed:.1f}s，开始施加负载...")
+            # 每组参数使用相同的请求序列，结果之间可直接比较
+            metrics, _ = run_benchmark(base_url, args.model, requests, concurrency=args.concurrency)
+            result["metrics"] = metrics
+            result["slo_ok"] = meets_slo(metrics, args.slo_ttft, args.slo_tpot)
+            print(f"吞吐 {metrics['output_tokens_per_s']:.1f} tok/s, TTFT p99 {metrics['ttft_p99_ms'] or 0:.0f}ms, "
+                  f"TPOT p99 {metrics['tpot_p99_ms'] or 0:.1f}ms, 错误 {metrics['errors']}")
+
+        print("\n=== 调优结果 ===")
+        print_results(results, keys)
+        feasible = [r for r in results if r["slo_ok"]]
+        front = pareto_front(feasible)
+        with open(args.output, 'w') as f:
+            json.dump({"space": space, "slo": {"ttft_p99_ms": args.slo_ttft, "tpot_p99_ms": args.slo_tpot},
+                       "results": results, "pareto": front}, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到: {args.output}")
+
+        if not front:
+            print("错误: 没有满足SLO的配置")
+            sys.exit(1)
+        print("\n满足SLO的帕累托最优配置:")
+        for r in front:
+            print(f"  {r['params']}  吞吐 {r['metrics']['output_tokens_per_s']:.1f} tok/s, "
+                  f"TTFT p99 {r['metrics']['ttft_p99_ms']:.0f}ms")
+        best = front[0]
+        print(f"\n推荐配置（吞吐最高）: {best['params']}")
+        if args.apply_best:
+            print("\n写入推荐配置并重启服务...")
+            restore = not apply_schedule(args.config_path, original, best["params"])
+            if not restore:
+                if not restart_service(args.restart_cmd, base_url, args.ready_timeout)[0]:
+                    sys.exit(1)
+                print("推荐配置已生效")
+    finally:
+        if restore:
+            print("\n恢复原配置并重启服务...")
+            if not save_config(original, args.config_path) or \
+                    not restart_service(args.restart_cmd, base_url, args.ready_timeout)[0]:
+                print("错误: 恢复原配置后服务未能就绪，请检查服务状态")
+                sys.exit(1)
+            print("已恢复原配置" + ("" if args.apply_best else "，可使用 --apply-best 写入推荐配置"))
+
+if __name__ == '__main__':
+    main()
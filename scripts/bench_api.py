@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 模型服务接口压测工具
+      基于asyncio直接发送HTTP请求到OpenAI兼容的 /v1/chat/completions 接口，
+      支持固定并发（闭环）或按请求速率发送（开环，泊松到达），可配置prompt和输出长度分布，
+      解析SSE流式响应统计首token时延(TTFT)、token间时延(ITL)、每输出token时延(TPOT)和吞吐，
+      输出p50/p90/p99并可导出JSON/CSV
+"""
+
+import sys
+import csv
+import ssl
+import json
+import time
+import random
+import asyncio
+import argparse
+import urllib.parse
+
+DEFAULT_URL = "http://127.0.0.1:1025"
+DEFAULT_TIMEOUT = 600
+PERCENTILES = (50, 90, 99)
+
+# 构造prompt用的词表，常见英文单词在大多数分词器下约为1个token
+PROMPT_WORDS = ("the of and to in is that for it as with was on be by this are from at or have an "
+                "they which one you were all we can her has there been if more when will would who "
+                "so no time about up out many then them these she some into two").split()
+
+def parse_length_dist(spec):
+    """
+    解析长度分布描述，返回采样函数
+
+    支持: "512"（固定）、"uniform:256:1024"、"normal:512:128"（均值:标准差）
+    """
+    parts = str(spec).split(':')
+    try:
+        if len(parts) == 1:
+            value = int(parts[0])
+            return lambda rng: value
+        kind, args = parts[0], [float(p) for p in parts[1:]]
+        if kind == "uniform" and len(args) == 2:
+            low, high = int(args[0]), int(args[1])
+            return lambda rng: rng.randint(low, high)
+        if kind == "normal" and len(args) == 2:
+            mean, std = args
+            return lambda rng: max(1, int(round(rng.gauss(mean, std))))
+    except ValueError:
+        pass
+    raise ValueError(f"无法识别的长度分布: {spec}（示例: 512, uniform:256:1024, normal:512:128）")
+
+def make_prompt(length, rng):
+    """按目标token数生成随机prompt"""
+    return " ".join(rng.choice(PROMPT_WORDS) for _ in range(max(1, length)))
+
+def build_requests(num_requests, prompt_dist, output_dist, seed=0):
+    """
+    预先生成全部请求，保证同一seed下各次压测的请求内容一致
+
+    Returns:
+        list: [{"prompt": str, "prompt_len": int, "max_tokens": int}]
+    """
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(num_requests):
+        prompt_len = max(1, prompt_dist(rng))
+        requests.append({"prompt": make_prompt(prompt_len, rng), "prompt_len": prompt_len,
+                         "max_tokens": max(1, output_dist(rng))})
+    return requests
+
+def percentile(values, p):
+    """计算百分位数（线性插值）"""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+async def _read_headers(reader):
+    """读取HTTP响应状态行和头部"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("服务端关闭了连接")
+    status = int(status_line.split(None, 2)[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    return status, headers
+
+async def _iter_body(reader, headers):
+    """按chunked/Content-Length/读到EOF三种方式逐块产出响应体"""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                break
+            data = await reader.readexactly(size)
+            await reader.readexactly(2)
+            yield data
+    elif "content-length" in headers:
+        length = int(headers["content-length"])
+        if length:
+            yield await reader.readexactly(length)
+    else:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            yield data
+
+async def stream_chat(target, model, request, timeout, ssl_context=None, extra_body=None):
+    """
+    发送一个流式chat请求并记录每个token的到达时间
+
+    Args:
+        target: (host, port, path, use_tls)
+
+    Returns:
+        dict: 单个请求的测量结果，失败时error字段非空
+    """
+    host, port, path, use_tls = target
+    messages = request.get("messages") or [{"role": "user", "content": request["prompt"]}]
+    payload = {"model": model, "messages": messages,
+               "max_tokens": request["max_tokens"], "stream": True}
+    payload.update(extra_body or {})
+    body = json.dumps(payload).encode()
+    head = (f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\nContent-Type: application/json\r\n"
+            f"Accept: text/event-stream\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n")
+    record = {"prompt_len": request["prompt_len"], "max_tokens": request["max_tokens"],
+              "start": time.monotonic(), "ttft": None, "e2e": None, "itls": [],
+              "output_tokens": 0, "prompt_tokens": None, "error": None}
+    writer = None
+
+    async def run():
+        nonlocal writer
+        reader, writer = await asyncio.open_connection(host, port, ssl=ssl_context if use_tls else None)
+        writer.write(head.encode() + body)
+        await writer.drain()
+        status, headers = await _read_headers(reader)
+        if status != 200:
+            text = b"".join([chunk async for chunk in _iter_body(reader, headers)])
+            raise RuntimeError(f"HTTP {status}: {text[:200].decode(errors='replace')}")
+
+        last, chunks, buffer = None, 0, b""
+        async for data in _iter_body(reader, headers):
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                line = line[5:].strip()
+                if line == b"[DONE]":
+                    continue
+                event = json.loads(line)
+                if event.get("error"):
+                    raise RuntimeError(str(event["error"]))
+                usage = event.get("usage")
+                if usage:
+                    record["prompt_tokens"] = usage.get("prompt_tokens")
+                    record["output_tokens"] = usage.get("completion_tokens") or 0
+                if not any(c.get("delta", {}).get("content") for c in event.get("choices", [])):
+                    continue
+                now = time.monotonic()
+                if last is None:
+                    record["ttft"] = now - record["start"]
+                else:
+                    record["itls"].append(now - last)
+                last = now
+                chunks += 1
+        if last is None:
+            raise RuntimeError("未收到任何token")
+        record["e2e"] = last - record["start"]
+        # 服务端未返回usage时按收到的内容块数计算输出token数
+        record["output_tokens"] = record["output_tokens"] or chunks
+
+    try:
+        await asyncio.wait_for(run(), timeout)
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {str(e)}" if str(e) else type(e).__name__
+    finally:
+        if writer is not None:
+            writer.close()
+    return record
+
+def parse_url(url):
+    """拆分服务地址，返回 (host, port, path, use_tls)"""
+    parsed = urllib.parse.urlparse(url if "://" in url else f"http://{url}")
+    use_tls = parsed.scheme == "https"
+    path = parsed.path.rstrip("/")
+    if not path.endswith("/chat/completions"):
+        path += "/v1/chat/completions"
+    return parsed.hostname, parsed.port or (443 if use_tls else 80), path, use_tls
+
+def make_ssl_context(use_tls, insecure=False):
+    """https时创建SSL上下文，insecure时不校验证书"""
+    if not use_tls:
+        return None
+    ssl_context = ssl.create_default_context()
+    if insecure:
+        ssl_context.check_hostname = False
+        ssl_context.verify_mode = ssl.CERT_NONE
+    return ssl_context
+
+async def run_benchmark_async(url, model, requests, concurrency=None, rate=None, timeout=DEFAULT_TIMEOUT,
+                              insecure=False, extra_body=None, seed=0, on_done=None):
+    """
+    执行压测
+
+    concurrency: 闭环模式下的固定并发；开环模式下作为在途请求上限（可选）
+    rate: 每秒请求数，指定后按泊松过程开环发送
+
+    Returns:
+        tuple: (汇总统计, 单请求记录列表)
+    """
+    target = parse_url(url)
+    ssl_context = make_ssl_context(target[3], insecure)
+    limit = asyncio.Semaphore(concurrency) if concurrency else None
+    records = []
+
+    async def one(request):
+        if limit:
+            async with limit:
+                record = await stream_chat(target, model, request, timeout, ssl_context, extra_body)
+        else:
+            record = await stream_chat(target, model, request, timeout, ssl_context, extra_body)
+        records.append(record)
+        if on_done:
+            on_done(record, len(records), len(requests))
+
+    start = time.monotonic()
+    if rate:
+        rng = random.Random(seed)
+        tasks = []
+        for request in requests:
+            tasks.append(asyncio.ensure_future(one(request)))
+            await asyncio.sleep(rng.expovariate(rate))
+        await asyncio.gather(*tasks)
+    else:
+        await asyncio.gather(*(one(request) for request in requests))
+    duration = time.monotonic() - start
+    return summarize(records, duration, start), records
+
+def run_benchmark(url, model, requests, **kwargs):
+    """run_benchmark_async的同步入口（供autotune_schedule.py等脚本调用）"""
+    return asyncio.run(run_benchmark_async(url, model, requests, **kwargs))
+
+def summarize(records, duration, start=0.0):
+    """
+    汇总单请求记录，时延单位为毫秒
+
+    TPOT按请求计算：(端到端时延 - TTFT) / (输出token数 - 1)；ITL为所有token间隔
+    """
+    ok = [r for r in records if not r["error"]]
+    output_tokens = sum(r["output_tokens"] for r in ok)
+    input_tokens = sum(r["prompt_tokens"] or r["prompt_len"] for r in ok)
+    series = {
+        "ttft": [r["ttft"] * 1000 for r in ok],
+        "tpot": [(r["e2e"] - r["ttft"]) * 1000 / (r["output_tokens"] - 1) for r in ok if r["output_tokens"] > 1],
+        "itl": [itl * 1000 for r in ok for itl in r["itls"]],
+        "e2e": [r["e2e"] * 1000 for r in ok],
+    }
+    summary = {
+        "requests": len(ok), "errors": len(records) - len(ok), "duration_s": duration,
+        "input_tokens": input_tokens, "output_tokens": output_tokens,
+        "request_throughput": len(ok) / duration if duration else 0,
+        "output_tokens_per_s": output_tokens / duration if duration else 0,
+        "total_tokens_per_s": (input_tokens + output_tokens) / duration if duration else 0,
+    }
+    for name, values in series.items():
+        summary[f"{name}_mean_ms"] = sum(values) / len(values) if values else None
+        for p in PERCENTILES:
+            summary[f"{name}_p{p}_ms"] = percentile(values, p)
+    for r in records:
+        r["start_offset"] = r["start"] - start
+    return summary
+
+def print_summary(summary):
+    """打印压测结果"""
+    print("\n========== 压测结果 ==========")
+    print(f"成功请求: {summary['requests']}, 失败请求: {summary['errors']}, 耗时: {summary['duration_s']:.2f}s")
+    print(f"输入token: {summary['input_tokens']}, 输出token: {summary['output_tokens']}")
+    print(f"请求吞吐: {summary['request_throughput']:.2f} req/s")
+    print(f"输出吞吐: {summary['output_tokens_per_s']:.2f} tok/s, "
+          f"总吞吐: {summary['total_tokens_per_s']:.2f} tok/s")
+    header = f"{'指标(ms)':<10}{'mean':>10}" + "".join(f"{'p%d' % p:>10}" for p in PERCENTILES)
+    print(header)
+    for name in ("ttft", "tpot", "itl", "e2e"):
+        values = [summary[f"{name}_mean_ms"]] + [summary[f"{name}_p{p}_ms"] for p in PERCENTILES]
+        print(f"{name.upper():<10}" + "".join(f"{v:>10.1f}" if v is not None else f"{'-':>10}" for v in values))
+
+CSV_FIELDS = ["start_offset", "prompt_len", "prompt_tokens", "max_tokens", "output_tokens",
+              "ttft_ms", "tpot_ms", "e2e_ms", "error"]
+
+def write_csv(records, path):
+    """导出单请求记录为CSV"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        for r in sorted(records, key=lambda r: r["start_offset"]):
+            tpot = None
+            if not r["error"] and r["output_tokens"] > 1:
+                tpot = (r["e2e"] - r["ttft"]) * 1000 / (r["output_tokens"] - 1)
+            writer.writerow({
+                "start_offset": round(r["start_offset"], 4), "prompt_len": r["prompt_len"],
+                "prompt_tokens": r["prompt_tokens"], "max_tokens": r["max_tokens"],
+                "output_tokens": r["output_tokens"],
+                "ttft_ms": round(r["ttft"] * 1000, 2) if r["ttft"] is not None else None,
+                "tpot_ms": round(tpot, 2) if tpot is not None else None,
+                "e2e_ms": round(r["e2e"] * 1000, 2) if r["e2e"] is not None else None,
+                "error": r["error"]})
+
+def write_json(summary, records, config, path):
+    """导出汇总和单请求记录为JSON"""
+    with open(path, 'w') as f:
+        json.dump({"config": config, "summary": summary,
+                   "requests": [{k: v for k, v in r.items() if k != "start"} for r in records]},
+                  f, ensure_ascii=False, indent=2)
+
+def get_model(url, timeout=10):
+    """未指定模型时从 /v1/models 获取第一个模型ID"""
+    import urllib.request
+    host, port, path, use_tls = parse_url(url)
+    models_url = f"{'https' if use_tls else 'http'}://{host}:{port}{path.split('/chat/completions')[0]}/models"
+    try:
+        context = ssl._create_unverified_context() if use_tls else None
+        with urllib.request.urlopen(models_url, timeout=timeout, context=context) as response:
+            return json.load(response)["data"][0]["id"]
+    except Exception as e:
+        print(f"错误: 无法从 {models_url} 获取模型ID: {str(e)}")
+        return None
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='模型服务接口压测工具')
+    parser.add_argument('--url', type=str, default=DEFAULT_URL,
+                      help=f'服务地址，可带上 /v1/chat/completions 路径（默认：{DEFAULT_URL}）')
+    parser.add_argument('-m', '--model', type=str, help='模型ID（默认：从 /v1/models 获取）')
+    parser.add_argument('-n', '--num-requests', type=int, default=200, help='请求总数（默认：200）')
+    parser.add_argument('-c', '--concurrency', type=int,
+                      help='并发数；未指定 --rate 时为闭环固定并发（默认：16），指定时为在途请求上限')
+    parser.add_argument('-r', '--rate', type=float, help='每秒请求数，按泊松到达开环发送')
+    parser.add_argument('--prompt-len', type=str, default='512',
+                      help='prompt长度分布（token）：512 / uniform:256:1024 / normal:512:128（默认：512）')
+    parser.add_argument('--output-len', type=str, default='256',
+                      help='输出长度分布（max_tokens），格式同 --prompt-len（默认：256）')
+    parser.add_argument('--ignore-eos', action='store_true', help='请求中携带 ignore_eos，保证输出达到max_tokens')
+    parser.add_argument('--warmup', type=int, default=0, help='正式压测前的预热请求数（默认：0）')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                      help=f'单个请求超时（秒，默认：{DEFAULT_TIMEOUT}）')
+    parser.add_argument('--seed', type=int, default=0, help='随机种子（默认：0）')
+    parser.add_argument('-k', '--insecure', action='store_true', help='https时不校验服务端证书')
+    parser.add_argument('--json', type=str, help='导出汇总及单请求结果到JSON文件')
+    parser.add_argument('--csv', type=str, help='导出单请求结果到CSV文件')
+    parser.add_argument('--quiet', action='store_true', help='不打印进度')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    model = args.model or get_model(args.url)
+    if not model:
+        sys.exit(1)
+    try:
+        prompt_dist, output_dist = parse_length_dist(args.prompt_len), parse_length_dist(args.output_len)
+    except ValueError as e:
+        print(f"错误: {str(e)}")
+        sys.exit(1)
+    concurrency = args.concurrency or (None if args.rate else 16)
+    extra_body = {"ignore_eos": True} if args.ignore_eos else None
+    requests = build_requests(args.num_requests, prompt_dist, output_dist, args.seed)
+    mode = f"开环 {args.rate} req/s" + (f"，在途上限 {concurrency}" if concurrency else "") \
+        if args.rate else f"闭环 并发 {concurrency}"
+    print(f"压测目标: {args.url}, 模型: {model}, 请求数: {len(requests)}, 模式: {mode}")
+
+    if args.warmup:
+        print(f"预热 {args.warmup} 个请求...")
+        warmup = build_requests(args.warmup, prompt_dist, output_dist, args.seed + 1)
+        run_benchmark(args.url, model, warmup, concurrency=concurrency or args.warmup,
+                      timeout=args.timeout, insecure=args.insecure, extra_body=extra_body)
+
+    def progress(record, done, total):
+        if args.quiet:
+            return
+        if record["error"]:
+            print(f"[{done}/{total}] 失败: {record['error']}")
+        elif done % max(1, total // 10) == 0 or done == total:
+            print(f"[{done}/{total}] 完成")
+        sys.stdout.flush()
+
+    summary, records = run_benchmark(args.url, model, requests, concurrency=concurrency, rate=args.rate,
+                                     timeout=args.timeout, insecure=args.insecure,
+                                     extra_body=extra_body, seed=args.seed, on_done=progress)
+    print_summary(summary)
+    errors = [r["error"] for r in records if r["error"]]
+    if errors:
+        print(f"失败示例: {errors[0]}")
+    if args.json:
+        config = dict(vars(args), model=model, concurrency=concurrency)
+        write_json(summary, records, config, args.json)
+        print(f"结果已导出: {args.json}")
+    if args.csv:
+        write_csv(records, args.csv)
+        print(f"结果已导出: {args.csv}")
+    if not summary["requests"]:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: MindIE服务模拟器
+      提供 /v1/models、/v1/chat/completions（支持SSE流式）和健康检查接口，
+      按MindIE配置中的ScheduleConfig模拟排队、首token时延和decode时延，用于在没有NPU的环境下开发调试压测工具；
+      指定 --metrics-port 时在该端口的 /metrics 提供Prometheus格式的服务监控指标
+"""
+
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_SCHEDULE = {
+    "maxBatchSize": 200,
+    "maxPrefillBatchSize": 50,
+    "prefillTimeMsPerReq": 150,
+    "decodeTimeMsPerReq": 50,
+}
+
+# 与MindIE服务监控指标同名的直方图及其分桶（秒）
+HISTOGRAM_BUCKETS = {
+    "time_to_first_token_seconds": (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    "time_per_output_token_seconds": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5),
+    "e2e_request_latency_seconds": (0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+}
+
+class MockEngine:
+    """按ScheduleConfig粗略模拟推理引擎的排队和时延"""
+
+    def __init__(self, schedule, model_name, prefill_ms_per_1k, decode_ms, kv_tokens=65536):
+        self.schedule = schedule
+        self.model_name = model_name
+        self.prefill_ms_per_1k = prefill_ms_per_1k
+        self.decode_ms = decode_ms
+        self.kv_tokens = kv_tokens
+        self.slots = threading.Semaphore(int(schedule["maxBatchSize"]))
+        self.prefill_slots = threading.Semaphore(int(schedule["maxPrefillBatchSize"]))
+        self.lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.tokens_in_use = 0
+        self.counters = {"request_received_total": 0, "request_success_total": 0,
+                         "prompt_tokens_total": 0, "generation_tokens_total": 0}
+        self.histograms = {name: {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+                           for name, buckets in HISTOGRAM_BUCKETS.items()}
+
+    def observe(self, name, value):
+        """记录一次直方图观测值（调用方持有锁）"""
+        histogram = self.histograms[name]
+        for i, bound in enumerate(HISTOGRAM_BUCKETS[name]):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+    def metrics_text(self):
+        """生成Prometheus文本格式的监控指标"""
+        label = f'model_name="{self.model_name}"'
+        lines = []
+        with self.lock:
+            for name, value in self.counters.items():
+                lines += [f"# TYPE {name} counter", f"{name}{{{label}}} {value}"]
+            gauges = {"num_requests_running": self.running, "num_requests_waiting": self.waiting,
+                      "npu_cache_usage_perc": round(min(self.tokens_in_use / self.kv_tokens, 1.0), 4)}
+            for name, value in gauges.items():
+                lines += [f"# TYPE {name} gauge", f"{name}{{{label}}} {value}"]
+            for name, histogram in self.histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                for bound, count in zip(HISTOGRAM_BUCKETS[name], histogram["buckets"]):
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {histogram["count"]}')
+                lines.append(f"{name}_sum{{{label}}} {histogram['sum']}")
+                lines.append(f"{name}_count{{{label}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def token_interval(self):
+        """batch越大单token时延越高，decodeTimeMsPerReq作为调度目标会限制增长"""
+        with self.lock:
+            load = self.running / max(int(self.schedule["maxBatchSize"]), 1)
+        target = float(self.schedule["decodeTimeMsPerReq"])
+        return self.decode_ms * (1 + 2 * load) * (0.8 + 0.4 * min(target, 100) / 100) / 1000
+
+    def generate(self, prompt_tokens, max_tokens):
+        """生成器：逐个产出token文本"""
+        start = time.monotonic()
+        with self.lock:
+            self.waiting += 1
+            self.counters["request_received_total"] += 1
+            self.counters["prompt_tokens_total"] += prompt_tokens
+        self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.running += 1
+            self.tokens_in_use += prompt_tokens
+        generated = 0
+        try:
+            with self.prefill_slots:
+                time.sleep(self.prefill_ms_per_1k * max(prompt_tokens, 1) / 1000 / 1000)
+            first = time.monotonic()
+            with self.lock:
+                self.observe("time_to_first_token_seconds", first - start)
+            for i in range(max_tokens):
+                if i:
+                    time.sleep(self.token_interval())
+                with self.lock:
+                    generated += 1
+                    self.tokens_in_use += 1
+                    self.counters["generation_tokens_total"] += 1
+                yield f"tok{i} "
+            end = time.monotonic()
+            with self.lock:
+                self.counters["request_success_total"] += 1
+                self.observe("e2e_request_latency_seconds", end - start)
+                if generated > 1:
+                    self.observe("time_per_output_token_seconds", (end - first) / (generated - 1))
+        finally:
+            with self.lock:
+                self.running -= 1
+                self.tokens_in_use -= prompt_tokens + generated
+            self.slots.release()
+
+def count_prompt_tokens(messages):
+    """粗略估算prompt token数（按空白分词）"""
+    return sum(len(str(m.get("content", "")).split()) for m in messages)
+
+def make_handler(engine):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _json(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = engine.metrics_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.path == "/v1/models":
+                self._json(200, {"object": "list", "data": [{"id": engine.model_name, "object": "model"}]})
+            elif self.path.startswith("/v2/health") or self.path.startswith("/health"):
+                self._json(200, {"status": "ok"})
+            else:
+                self._json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/v1/chat/completions":
+                self._json(404, {"error": "not found"})
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            prompt_tokens = count_prompt_tokens(request.get("messages", []))
+            max_tokens = int(request.get("max_tokens") or 16)
+            created = int(time.time())
+
+            if not request.get("stream"):
+                text = "".join(engine.generate(prompt_tokens, max_tokens))
+                self._json(200, {
+                    "id": "mock", "object": "chat.completion", "created": created, "model": engine.model_name,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                                 "finish_reason": "length"}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": max_tokens,
+                              "total_tokens": prompt_tokens + max_tokens}})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(data):
+                chunk = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                self.wfile.flush()
+
+            for token in engine.generate(prompt_tokens, max_tokens):
+                send(json.dumps({"id": "mock", "object": "chat.completion.chunk", "created": created,
+                                 "model": engine.model_name,
+                                 "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}))
+            send(json.dumps({"id": "mock", "object": "chat.completion.chunk", "created": created,
+                             "model": engine.model_name,
+                             "choices": [{"index": 0, "delta": {}, "finish_reason": "length"}],
+                             "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": max_tokens,
+                                       "total_tokens": prompt_tokens + max_tokens}}))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+
+    return Handler
+
+def load_schedule(config_path):
+    """读取MindIE配置中的ScheduleConfig，缺省使用模板值"""
+    schedule = dict(DEFAULT_SCHEDULE)
+    if config_path:
+        with open(config_path, 'r') as f:
+            schedule.update(json.load(f)["BackendConfig"]["ScheduleConfig"])
+    return schedule
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='MindIE服务模拟器')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址（默认：127.0.0.1）')
+    parser.add_argument('--port', type=int, default=1025, help='业务端口（默认：1025）')
+    parser.add_argument('--management-port', type=int, help='管理端口（可选，提供健康检查接口）')
+    parser.add_argument('--metrics-port', type=int, help='监控指标端口（可选，提供 /metrics 接口）')
+    parser.add_argument('--mindie-config', type=str, help='读取其中的ScheduleConfig模拟调度参数')
+    parser.add_argument('--model-name', type=str, default='mock-model', help='模型名称（默认：mock-model）')
+    parser.add_argument('--prefill-ms', type=float, default=20,
+                      help='每1000个prompt token的prefill耗时（毫秒，默认：20）')
+    parser.add_argument('--decode-ms', type=float, default=10,
+                      help='空载时每个输出token的耗时（毫秒，默认：10）')
+    parser.add_argument('--kv-tokens', type=int, default=65536,
+                      help='模拟的KV Cache容量（token数，用于npu_cache_usage_perc，默认：65536）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    engine = MockEngine(load_schedule(args.mindie_config), args.model_name, args.prefill_ms, args.decode_ms,
+                        args.kv_tokens)
+    servers = [ThreadingHTTPServer((args.host, args.port), make_handler(engine))]
+    for port in (args.management_port, args.metrics_port):
+        if port:
+            servers.append(ThreadingHTTPServer((args.host, port), make_handler(engine)))
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"模拟服务已启动: http://{args.host}:{args.port} (ScheduleConfig: {engine.schedule})", flush=True)
+    servers[0].serve_forever()
+
+if __name__ == '__main__':
+    main()
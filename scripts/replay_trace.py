@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: 请求trace开环回放工具
+      读取生产环境的请求trace（JSONL或CSV，包含到达时间以及prompt/max_tokens或token长度），
+      默认丢弃原始内容、按长度合成prompt（脱敏），按原始或缩放后的到达速率开环回放到服务，
+      按时间窗口统计排队时延和SLO违约情况；也可只做归一化脱敏，保存为可外发的trace文件
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+from datetime import datetime
+
+from bench_api import (DEFAULT_URL, DEFAULT_TIMEOUT, make_prompt, percentile, parse_url,
+                       make_ssl_context, stream_chat, summarize, print_summary, get_model)
+
+DEFAULT_WINDOW = 10
+DEFAULT_MAX_TOKENS = 256
+
+# trace中各字段可能的列名，按顺序取第一个存在的
+TIME_FIELDS = ("timestamp", "time", "arrival_time", "created", "start_time")
+PROMPT_LEN_FIELDS = ("prompt_tokens", "input_tokens", "input_len", "prompt_len")
+OUTPUT_LEN_FIELDS = ("completion_tokens", "output_tokens", "output_len")
+
+def _first(row, fields):
+    for field in fields:
+        value = row.get(field)
+        if value not in (None, ""):
+            return value
+    return None
+
+def parse_timestamp(value):
+    """解析时间戳：数字（秒或毫秒）或ISO格式字符串，返回秒"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    # 大于1e12的按毫秒处理
+    return number / 1000 if number > 1e12 else number
+
+def _is_cjk(ch):
+    return '\u2e80' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af'
+
+def estimate_tokens(text):
+    """粗略估算token数：中日韩字符每字1个，其余按空白分词"""
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    words = len(''.join(' ' if _is_cjk(ch) else ch for ch in text).split())
+    return max(1, cjk + words)
+
+def read_rows(trace_file):
+    """按扩展名读取JSONL或CSV格式的trace"""
+    rows = []
+    with open(trace_file, 'r', newline='') as f:
+        if trace_file.endswith('.csv'):
+            return list(csv.DictReader(f))
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as e:
+                print(f"警告: 第{line_no}行不是合法的JSON，已跳过: {str(e)}")
+    return rows
+
+def load_trace(trace_file, keep_content=False):
+    """
+    读取并归一化trace，时间戳转换为相对第一个请求的偏移（秒）
+
+    Returns:
+        list: [{"offset", "prompt_len", "max_tokens", ("prompt"/"messages")}]，失败返回None
+    """
+    try:
+        rows = read_rows(trace_file)
+    except Exception as e:
+        print(f"错误: 无法读取trace文件 {trace_file}: {str(e)}")
+        return None
+
+    trace = []
+    for i, row in enumerate(rows, 1):
+        timestamp = _first(row, TIME_FIELDS)
+        if timestamp is None:
+            print(f"警告: 第{i}条记录缺少时间戳，已跳过")
+            continue
+        try:
+            timestamp = parse_timestamp(timestamp)
+        except ValueError:
+            print(f"警告: 第{i}条记录的时间戳无法解析: {timestamp}，已跳过")
+            continue
+
+        messages = row.get("messages")
+        if isinstance(messages, str):
+            messages = json.loads(messages)
+        prompt = row.get("prompt")
+        if prompt is None and messages:
+            prompt = "\n".join(str(m.get("content", "")) for m in messages)
+
+        prompt_len = _first(row, PROMPT_LEN_FIELDS)
+        prompt_len = int(float(prompt_len)) if prompt_len is not None else \
+            (estimate_tokens(prompt) if prompt else None)
+        if not prompt_len:
+            print(f"警告: 第{i}条记录既没有prompt长度也没有内容，已跳过")
+            continue
+        # 优先使用实际输出长度，回放时配合 ignore_eos 复现真实的decode负载
+        max_tokens = _first(row, OUTPUT_LEN_FIELDS) or row.get("max_tokens") or DEFAULT_MAX_TOKENS
+
+        item = {"timestamp": timestamp, "prompt_len": prompt_len, "max_tokens": int(float(max_tokens))}
+        if keep_content and prompt is not None:
+            item["prompt"] = prompt
+            if messages:
+                item["messages"] = messages
+        trace.append(item)
+
+    trace.sort(key=lambda item: item["timestamp"])
+    if trace:
+        first = trace[0]["timestamp"]
+        for item in trace:
+            item["offset"] = item.pop("timestamp") - first
+    return trace
+
+def scale_trace(trace, speedup=None, rate=None):
+    """按加速倍数或目标平均速率（req/s）缩放到达时间，返回实际使用的加速倍数"""
+    span = trace[-1]["offset"] if trace else 0
+    if rate and span > 0:
+        speedup = rate * span / max(len(trace) - 1, 1)
+    speedup = speedup or 1.0
+    for item in trace:
+        item["offset"] /= speedup
+    return speedup
+
+def synthesize_prompts(trace, seed=0):
+    """为没有保留内容的记录按长度合成prompt"""
+    rng = random.Random(seed)
+    for item in trace:
+        if "prompt" not in item:
+            item["prompt"] = make_prompt(item["prompt_len"], rng)
+
+def save_trace(trace, path):
+    """保存脱敏后的trace（只含相对时间和长度）"""
+    with open(path, 'w') as f:
+        for item in trace:
+            f.write(json.dumps({"timestamp": round(item["offset"], 6), "prompt_tokens": item["prompt_len"],
+                                "max_tokens": item["max_tokens"]}) + "\n")
+
+async def replay_async(url, model, trace, timeout=DEFAULT_TIMEOUT, insecure=False, extra_body=None,
+                       max_inflight=None, on_done=None):
+    """
+    按trace中的相对时间开环发送请求，不等待前一个请求完成
+
+    每条记录额外记录 offset（计划发送时间）和 lag（实际发送比计划晚多少秒）
+    """
+    target = parse_url(url)
+    ssl_context = make_ssl_context(target[3], insecure)
+    limit = asyncio.Semaphore(max_inflight) if max_inflight else None
+    records = []
+
+    async def one(item, scheduled):
+        if limit:
+            async with limit:
+                record = await stream_chat(target, model, item, timeout, ssl_context, extra_body)
+        else:
+            record = await stream_chat(target, model, item, timeout, ssl_context, extra_body)
+        record["offset"] = item["offset"]
+        record["lag"] = record["start"] - scheduled
+        records.append(record)
+        if on_done:
+            on_done(record, len(records), len(trace))
+
+    start = time.monotonic()
+    tasks = []
+    for item in trace:
+        scheduled = start + item["offset"]
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(item, scheduled)))
+    await asyncio.gather(*tasks)
+    duration = time.monotonic() - start
+    return summarize(records, duration, start), records
+
+def estimate_queueing(records):
+    """
+    估算服务端排队时延：同一prompt长度档位（按2的幂分档）内，TTFT减去该档最小TTFT
+
+    最小TTFT近似为无排队时的prefill耗时，因此结果是排队时延的估计值
+    """
+    baseline = {}
+    for r in records:
+        if r["ttft"] is not None:
+            bucket = r["prompt_len"].bit_length()
+            baseline[bucket] = min(baseline.get(bucket, r["ttft"]), r["ttft"])
+    for r in records:
+        r["queue"] = r["ttft"] - baseline[r["prompt_len"].bit_length()] if r["ttft"] is not None else None
+
+def violates_slo(record, slo_ttft, slo_tpot):
+    """请求失败或时延超过SLO即视为违约（阈值单位毫秒）"""
+    if record["error"]:
+        return True
+    if slo_ttft and record["ttft"] * 1000 > slo_ttft:
+        return True
+    if slo_tpot and record["output_tokens"] > 1:
+        tpot = (record["e2e"] - record["ttft"]) * 1000 / (record["output_tokens"] - 1)
+        if tpot > slo_tpot:
+            return True
+    return False
+
+def window_stats(records, window, slo_ttft, slo_tpot):
+    """按计划发送时间分窗口统计到达速率、时延和SLO违约比例"""
+    windows = {}
+    for r in records:
+        windows.setdefault(int(r["offset"] // window), []).append(r)
+    stats = []
+    for index in sorted(windows):
+        group = windows[index]
+        ok = [r for r in group if not r["error"]]
+        tpots = [(r["e2e"] - r["ttft"]) * 1000 / (r["output_tokens"] - 1) for r in ok if r["output_tokens"] > 1]
+        violations = sum(1 for r in group if violates_slo(r, slo_ttft, slo_tpot))
+        stats.append({
+            "start_s": index * window, "requests": len(group), "rate": len(group) / window,
+            "errors": len(group) - len(ok),
+            "ttft_p99_ms": percentile([r["ttft"] * 1000 for r in ok], 99),
+            "tpot_p99_ms": percentile(tpots, 99),
+            "queue_p99_ms": percentile([r["queue"] * 1000 for r in ok], 99),
+            "lag_max_ms": max(r["lag"] for r in group) * 1000,
+            "violations": violations, "violation_ratio": violations / len(group),
+        })
+    return stats
+
+def print_windows(stats, window):
+    """打印分窗口统计表"""
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print(f"\n========== 分窗口统计（{window}s） ==========")
+    print(f"{'开始(s)':>8}{'请求':>6}{'req/s':>8}{'失败':>6}{'TTFT p99':>10}{'TPOT p99':>10}"
+          f"{'排队p99':>10}{'发送滞后':>10}{'SLO违约':>10}")
+    for s in stats:
+        print(f"{s['start_s']:>8.0f}{s['requests']:>6}{s['rate']:>8.2f}{s['errors']:>6}"
+              f"{fmt(s['ttft_p99_ms'], '.0f'):>10}{fmt(s['tpot_p99_ms'], '.1f'):>10}"
+              f"{fmt(s['queue_p99_ms'], '.0f'):>10}{s['lag_max_ms']:>10.0f}"
+              f"{s['violations']:>5} ({s['violation_ratio']:.0%})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='请求trace开环回放工具')
+    parser.add_argument('trace', type=str, help='trace文件（.jsonl 或 .csv）')
+    parser.add_argument('--url', type=str, default=DEFAULT_URL, help=f'服务地址（默认：{DEFAULT_URL}）')
+    parser.add_argument('-m', '--model', type=str, help='模型ID（默认：从 /v1/models 获取）')
+    scale = parser.add_mutually_exclusive_group()
+    scale.add_argument('--speedup', type=float, help='到达时间压缩倍数，如 2 表示以2倍速率回放（默认：1）')
+    scale.add_argument('--rate', type=float, help='缩放到指定的平均到达速率（req/s），保持突发形状')
+    parser.add_argument('--limit', type=int, help='只回放前N个请求')
+    parser.add_argument('--keep-content', action='store_true',
+                      help='使用trace中的原始prompt（默认丢弃内容，按长度合成）')
+    parser.add_argument('--no-ignore-eos', action='store_true',
+                      help='请求中不携带 ignore_eos（默认携带，使输出长度与trace一致）')
+    parser.add_argument('--max-inflight', type=int, help='在途请求上限（默认不限制，纯开环）')
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW,
+                      help=f'统计窗口长度（秒，默认：{DEFAULT_WINDOW}）')
+    parser.add_argument('--slo-ttft', type=float, help='TTFT上限（毫秒）')
+    parser.add_argument('--slo-tpot', type=float, help='TPOT上限（毫秒）')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                      help=f'单个请求超时（秒，默认：{DEFAULT_TIMEOUT}）')
+    parser.add_argument('--seed', type=int, default=0, help='合成prompt的随机种子（默认：0）')
+    parser.add_argument('-k', '--insecure', action='store_true', help='https时不校验服务端证书')
+    parser.add_argument('--save-trace', type=str, help='保存脱敏后的trace（只含相对时间和长度）')
+    parser.add_argument('--dry-run', action='store_true', help='只解析、缩放和保存trace，不发送请求')
+    parser.add_argument('--json', type=str, help='导出汇总、分窗口统计和单请求结果到JSON文件')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if not os.path.isfile(args.trace):
+        print(f"错误: trace文件不存在: {args.trace}")
+        sys.exit(1)
+    trace = load_trace(args.trace, args.keep_content)
+    if not trace:
+        print("错误: trace中没有可回放的请求")
+        sys.exit(1)
+    trace = trace[:args.limit] if args.limit else trace
+    original_span = trace[-1]["offset"]
+    # 保存缩放前的原始时间，回放保存的trace时再按需加速，避免重复缩放
+    if args.save_trace:
+        save_trace(trace, args.save_trace)
+        print(f"脱敏trace已保存: {args.save_trace}")
+    speedup = scale_trace(trace, args.speedup, args.rate)
+    span = trace[-1]["offset"]
+    print(f"trace: {len(trace)} 个请求, 原始时长 {original_span:.1f}s, 加速 {speedup:.2f}x, "
+          f"回放时长 {span:.1f}s, 平均 {len(trace) / span if span else 0:.2f} req/s")
+    print(f"prompt长度 p50/p99: {percentile([t['prompt_len'] for t in trace], 50):.0f}/"
+          f"{percentile([t['prompt_len'] for t in trace], 99):.0f}, "
+          f"输出长度 p50/p99: {percentile([t['max_tokens'] for t in trace], 50):.0f}/"
+          f"{percentile([t['max_tokens'] for t in trace], 99):.0f}")
+    if args.dry_run:
+        return
+
+    model = args.model or get_model(args.url)
+    if not model:
+        sys.exit(1)
+    synthesize_prompts(trace, args.seed)
+    extra_body = None if args.no_ignore_eos else {"ignore_eos": True}
+
+    def progress(record, done, total):
+        if record["error"]:
+            print(f"[{done}/{total}] 失败: {record['error']}")
+            sys.stdout.flush()
+
+    print(f"开始回放到 {args.url}，模型: {model}")
+    summary, records = asyncio.run(replay_async(args.url, model, trace, args.timeout, args.insecure,
+                                                extra_body, args.max_inflight, progress))
+    estimate_queueing(records)
+    stats = window_stats(records, args.window, args.slo_ttft, args.slo_tpot)
+    print_summary(summary)
+    queues = [r["queue"] * 1000 for r in records if r["queue"] is not None]
+    lags = [r["lag"] * 1000 for r in records]
+    print(f"估算排队时延 p50/p99: {percentile(queues, 50) or 0:.0f}/{percentile(queues, 99) or 0:.0f} ms, "
+          f"最大发送滞后: {max(lags):.0f} ms")
+    if max(lags) > 100:
+        print("警告: 客户端发送滞后超过100ms，回放速率未达到trace要求，结果偏乐观")
+    print_windows(stats, args.window)
+    violations = sum(s["violations"] for s in stats)
+    if args.slo_ttft or args.slo_tpot:
+        print(f"\nSLO违约: {violations}/{len(records)} ({violations / len(records):.1%})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"config": dict(vars(args), model=model, speedup=speedup), "summary": summary,
+                       "windows": stats,
+                       "requests": [{k: v for k, v in r.items() if k != "start"} for r in records]},
+                      f, ensure_ascii=False, indent=2)
+        print(f"结果已导出: {args.json}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+描述: MindIE服务监控指标采集工具
+      按固定间隔抓取metricsPort上的Prometheus格式指标（运行/排队请求数、KV Cache使用率、
+      token计数、TTFT/TPOT直方图等），以列式时间序列保存到JSON文件，
+      并按阶段输出汇总，用于判断吞吐下降是KV Cache耗尽还是调度参数限制导致的
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib"))
+from wait_ready import MINDIE_CONFIG_PATH, load_server_config
+
+DEFAULT_INTERVAL = 2
+DEFAULT_OUTPUT = "metrics_timeseries.json"
+# 每采集多少次落盘一次
+FLUSH_EVERY = 10
+
+# 汇总时关注的指标：名称 -> (候选指标名, 类型)，同名不同标签的序列求和
+KEY_METRICS = {
+    "running": (("num_requests_running",), "gauge"),
+    "waiting": (("num_requests_waiting",), "gauge"),
+    "swapped": (("num_requests_swapped",), "gauge"),
+    "kv_usage": (("npu_cache_usage_perc", "kv_cache_usage_perc", "gpu_cache_usage_perc"), "gauge"),
+    "requests": (("request_success_total",), "counter"),
+    "failed": (("request_failed_total",), "counter"),
+    "prompt_tokens": (("prompt_tokens_total",), "counter"),
+    "generation_tokens": (("generation_tokens_total",), "counter"),
+}
+KEY_HISTOGRAMS = {
+    "ttft": "time_to_first_token_seconds",
+    "tpot": "time_per_output_token_seconds",
+    "e2e": "e2e_request_latency_seconds",
+}
+
+KV_EXHAUSTED = 0.95
+KV_AVAILABLE = 0.9
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})?\s+(\S+)(?:\s+-?\d+)?$')
+
+def parse_metrics(text):
+    """
+    解析Prometheus文本格式
+
+    Returns:
+        tuple: ({序列名(含标签): 值}, {指标名: 类型})
+    """
+    samples, types = {}, {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            parts = line.split()
+            if len(parts) >= 4 and parts[1] == "TYPE":
+                types[parts[2]] = parts[3]
+            continue
+        match = _SAMPLE_RE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        try:
+            samples[name + (labels or "")] = float(value)
+        except ValueError:
+            continue
+    return samples, types
+
+def series_name(series):
+    """去掉标签部分的指标名"""
+    return series.split("{", 1)[0]
+
+def series_label(series, label):
+    """取序列中某个标签的值"""
+    match = re.search(r'[{,]\s*%s="([^"]*)"' % re.escape(label), series)
+    return match.group(1) if match else None
+
+class TimeSeries:
+    """列式时间序列：一列时间戳，每个序列一列值，缺失值为None"""
+
+    def __init__(self, url=None, interval=None):
+        self.meta = {"url": url, "interval": interval}
+        self.timestamps = []
+        self.columns = {}
+        self.types = {}
+        self.phases = []
+
+    def append(self, timestamp, samples, types):
+        """追加一次采集结果，新出现的序列在之前的时间点补None"""
+        index = len(self.timestamps)
+        self.timestamps.append(timestamp)
+        self.types.update(types)
+        for series, value in samples.items():
+            column = self.columns.setdefault(series, [None] * index)
+            column.append(value)
+        for column in self.columns.values():
+            if len(column) <= index:
+                column.append(None)
+
+    def start_phase(self, name, timestamp=None):
+        """从timestamp（默认当前时间）开始一个新阶段"""
+        self.phases.append([timestamp if timestamp is not None else time.time(), name])
+
+    def save(self, path):
+        """原子写入JSON文件"""
+        data = dict(self.meta, timestamps=self.timestamps, phases=self.phases,
+                    types=self.types, columns=self.columns)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as f:
+            data = json.load(f)
+        ts = cls(data.get("url"), data.get("interval"))
+        ts.timestamps = data["timestamps"]
+        ts.columns = data["columns"]
+        ts.types = data.get("types", {})
+        ts.phases = data.get("phases", [])
+        return ts
+
+    def phase_ranges(self):
+        """
+        每个阶段对应的采样下标区间
+
+        Returns:
+            list: [(阶段名, 开始时间, 结束时间, 起始下标, 结束下标(不含))]
+        """
+        if not self.timestamps:
+            return []
+        phases = self.phases or [[self.timestamps[0], "all"]]
+        ranges = []
+        for i, (start, name) in enumerate(phases):
+            end = phases[i + 1][0] if i + 1 < len(phases) else self.timestamps[-1] + 1e-6
+            indices = [j for j, t in enumerate(self.timestamps) if start <= t < end]
+            if indices:
+                ranges.append((name, start, min(end, self.timestamps[-1]), indices[0], indices[-1] + 1))
+        return ranges
+
+    def aggregate(self, names):
+        """按时间点对匹配指标名的所有序列求和（任一候选名存在即使用）"""
+        for name in names:
+            columns = [c for s, c in self.columns.items() if series_name(s) == name]
+            if columns:
+                return [sum(v for v in values if v is not None) if any(v is not None for v in values) else None
+                        for values in zip(*columns)]
+        return None
+
+    def histogram_buckets(self, name):
+        """按le聚合直方图分桶，返回 {上界: 每个时间点的累计计数}"""
+        buckets = {}
+        for series, column in self.columns.items():
+            if series_name(series) != name + "_bucket":
+                continue
+            le = series_label(series, "le")
+            if le is None:
+                continue
+            bound = float("inf") if le == "+Inf" else float(le)
+            current = buckets.setdefault(bound, [None] * len(column))
+            buckets[bound] = [(a or 0) + b if b is not None else a for a, b in zip(current, column)]
+        return dict(sorted(buckets.items()))
+
+def counter_increase(values):
+    """计数器在区间内的增量，计数器归零（服务重启）时从新值继续累加"""
+    values = [v for v in values if v is not None]
+    increase = 0.0
+    for prev, cur in zip(values, values[1:]):
+        increase += cur - prev if cur >= prev else cur
+    return increase
+
+def histogram_quantile(q, bounds, counts):
+    """按Prometheus histogram_quantile的方式由分桶增量估算分位数"""
+    total = counts[-1] if counts else 0
+    if not total:
+        return None
+    rank = q * total
+    prev_bound, prev_count = 0.0, 0.0
+    for bound, count in zip(bounds, counts):
+        if count >= rank:
+            if bound == float("inf"):
+                return prev_bound
+            if count == prev_count:
+                return bound
+            return prev_bound + (bound - prev_bound) * (rank - prev_count) / (count - prev_count)
+        prev_bound, prev_count = bound, count
+    return prev_bound
+
+def _window(values, begin, end):
+    """阶段内的值，计数器类从阶段开始前的最后一个采样算起"""
+    return values[max(begin - 1, 0):end]
+
+def summarize_phases(ts):
+    """
+    按阶段汇总关键指标
+
+    Returns:
+        list: 每个阶段一个字典
+    """
+    summaries = []
+    for name, start, end, begin, stop in ts.phase_ranges():
+        first = max(begin - 1, 0)
+        duration = ts.timestamps[stop - 1] - ts.timestamps[first]
+        summary = {"phase": name, "start": start, "duration_s": duration, "samples": stop - begin}
+        for key, (names, kind) in KEY_METRICS.items():
+            values = ts.aggregate(names)
+            if values is None:
+                continue
+            if kind == "gauge":
+                window = [v for v in values[begin:stop] if v is not None]
+                if window:
+                    summary[f"{key}_mean"] = sum(window) / len(window)
+                    summary[f"{key}_max"] = max(window)
+            else:
+                increase = counter_increase(_window(values, begin, stop))
+                summary[f"{key}_total"] = increase
+                summary[f"{key}_per_s"] = increase / duration if duration > 0 else None
+        for key, name in KEY_HISTOGRAMS.items():
+            buckets = ts.histogram_buckets(name)
+            sums, counts = ts.aggregate([name + "_sum"]), ts.aggregate([name + "_count"])
+            if not buckets or counts is None:
+                continue
+            count = counter_increase(_window(counts, begin, stop))
+            if not count:
+                continue
+            summary[f"{key}_mean_ms"] = counter_increase(_window(sums, begin, stop)) / count * 1000
+            deltas = [counter_increase(_window(c, begin, stop)) for c in buckets.values()]
+            for q in (50, 99):
+                value = histogram_quantile(q / 100, list(buckets), deltas)
+                summary[f"{key}_p{q}_ms"] = value * 1000 if value is not None else None
+        summary["diagnosis"] = diagnose(summary)
+        summaries.append(summary)
+    return summaries
+
+def diagnose(summary):
+    """根据KV Cache使用率和排队情况给出瓶颈判断"""
+    kv_max = summary.get("kv_usage_max")
+    if kv_max is not None and kv_max > 1:
+        # 部分版本以百分数上报
+        kv_max /= 100
+    waiting = summary.get("waiting_mean") or 0
+    if kv_max is not None and kv_max >= KV_EXHAUSTED:
+        return f"KV Cache接近耗尽（峰值 {kv_max:.0%}），吞吐下降可能由KV Cache不足导致的排队或换出引起"
+    if waiting >= 0.5 and (kv_max is None or kv_max < KV_AVAILABLE):
+        return ("有请求排队但KV Cache仍有余量，瓶颈可能在调度参数"
+                "（maxBatchSize/maxPrefillBatchSize/maxPrefillTokens）")
+    return ""
+
+def print_summary(summaries):
+    """打印按阶段的汇总"""
+    def fmt(value, spec):
+        return format(value, spec) if value is not None else "-"
+
+    print("\n========== 按阶段汇总 ==========")
+    for s in summaries:
+        print(f"\n[{s['phase']}] 时长 {s['duration_s']:.1f}s, 采样 {s['samples']} 次")
+        print(f"  请求完成: {fmt(s.get('requests_per_s'), '.2f')} req/s, "
+              f"输入: {fmt(s.get('prompt_tokens_per_s'), '.1f')} tok/s, "
+              f"输出: {fmt(s.get('generation_tokens_per_s'), '.1f')} tok/s, "
+              f"失败: {fmt(s.get('failed_total'), '.0f')}")
+        print(f"  运行中请求 mean/max: {fmt(s.get('running_mean'), '.1f')}/{fmt(s.get('running_max'), '.0f')}, "
+              f"排队请求 mean/max: {fmt(s.get('waiting_mean'), '.1f')}/{fmt(s.get('waiting_max'), '.0f')}, "
+              f"KV Cache使用率 mean/max: {fmt(s.get('kv_usage_mean'), '.2f')}/{fmt(s.get('kv_usage_max'), '.2f')}")
+        latencies = [f"{key.upper()} mean/p50/p99: {fmt(s.get(f'{key}_mean_ms'), '.1f')}/"
+                     f"{fmt(s.get(f'{key}_p50_ms'), '.1f')}/{fmt(s.get(f'{key}_p99_ms'), '.1f')} ms"
+                     for key in KEY_HISTOGRAMS if f"{key}_mean_ms" in s]
+        if latencies:
+            print("  " + ", ".join(latencies))
+        if s["diagnosis"]:
+            print(f"  判断: {s['diagnosis']}")
+
+def scrape(url, timeout=5):
+    """抓取一次指标"""
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return parse_metrics(response.read().decode("utf-8", errors="replace"))
+
+def read_marks(mark_file, offset):
+    """
+    读取阶段标记文件中新增的行，每行格式为 "<unix时间戳> <阶段名>" 或 "<阶段名>"
+
+    Returns:
+        tuple: ([(时间戳, 阶段名)], 新的读取位置)
+    """
+    if not mark_file or not os.path.isfile(mark_file):
+        return [], offset
+    marks = []
+    with open(mark_file, 'r') as f:
+        f.seek(offset)
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if not parts:
+                continue
+            try:
+                marks.append((float(parts[0]), parts[1] if len(parts) > 1 else parts[0]))
+            except ValueError:
+                marks.append((time.time(), line.strip()))
+        offset = f.tell()
+    return marks, offset
+
+def default_url(config_path):
+    """根据MindIE配置的ServerConfig生成指标地址"""
+    server_config = load_server_config(config_path)
+    host = server_config.get("managementIpAddress") or server_config.get("ipAddress") or "127.0.0.1"
+    return f"http://{host}:{server_config.get('metricsPort', 1027)}/metrics"
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='MindIE服务监控指标采集工具',
+        epilog='示例: scrape_metrics.py --output m.json -- python3 scripts/bench_api.py -c 32')
+    parser.add_argument('--url', type=str, help='指标地址（默认：按MindIE配置的metricsPort生成）')
+    parser.add_argument('--config', type=str, default=MINDIE_CONFIG_PATH,
+                      help=f'MindIE配置文件路径（默认：{MINDIE_CONFIG_PATH}）')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                      help=f'采集间隔（秒，默认：{DEFAULT_INTERVAL}）')
+    parser.add_argument('--duration', type=float, help='采集时长（秒，默认：直到Ctrl+C或命令结束）')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT, help=f'输出文件（默认：{DEFAULT_OUTPUT}）')
+    parser.add_argument('--phase', type=str, default='run', help='初始阶段名（默认：run）')
+    parser.add_argument('--mark-file', type=str,
+                      help='阶段标记文件，其他程序追加 "<时间戳> <阶段名>" 行即开始新阶段')
+    parser.add_argument('--pre', type=float, default=0, help='执行命令前先采集的基线时长（秒，默认：0）')
+    parser.add_argument('--post', type=float, default=0, help='命令结束后继续采集的时长（秒，默认：0）')
+    parser.add_argument('--summarize', type=str, metavar='FILE', help='只对已保存的采集结果输出汇总')
+    parser.add_argument('command', nargs=argparse.REMAINDER, help='采集期间执行的命令（放在 -- 之后）')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    if args.summarize:
+        try:
+            ts = TimeSeries.load(args.summarize)
+        except Exception as e:
+            print(f"错误: 无法读取采集结果 {args.summarize}: {str(e)}")
+            sys.exit(1)
+        print_summary(summarize_phases(ts))
+        return
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    url = args.url or default_url(args.config)
+    ts = TimeSeries(url, args.interval)
+    stop = {"flag": False}
+
+    def handle_signal(signum, frame):
+        stop["flag"] = True
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    print(f"开始采集: {url}，间隔 {args.interval}s，输出: {args.output}")
+    ts.start_phase("pre" if command and args.pre else args.phase)
+    start = time.monotonic()
+    process, command_end, mark_offset, failures = None, None, 0, 0
+    while not stop["flag"]:
+        now = time.monotonic()
+        if command and process is None and now - start >= args.pre:
+            if args.pre:
+                ts.start_phase(args.phase)
+            print(f"执行命令: {' '.join(command)}")
+            process = subprocess.Popen(command)
+        if process is not None and command_end is None and process.poll() is not None:
+            command_end = now
+            print(f"命令已结束，返回码 {process.returncode}")
+            if args.post:
+                ts.start_phase("post")
+        marks, mark_offset = read_marks(args.mark_file, mark_offset)
+        for timestamp, name in marks:
+            ts.start_phase(name, timestamp)
+
+        try:
+            samples, types = scrape(url)
+            ts.append(time.time(), samples, types)
+            if failures:
+                print(f"指标接口已恢复（此前连续失败 {failures} 次）")
+            failures = 0
+        except Exception as e:
+            failures += 1
+            if failures == 1:
+                print(f"警告: 抓取指标失败: {str(getattr(e, 'reason', e))}")
+        if len(ts.timestamps) % FLUSH_EVERY == 0 and ts.timestamps:
+            ts.save(args.output)
+
+        if args.duration and now - start >= args.duration:
+            break
+        if command_end is not None and now - command_end >= args.post:
+            break
+        time.sleep(max(0, args.interval - (time.monotonic() - now)))
+
+    if process is not None and process.poll() is None:
+        process.terminate()
+        process.wait()
+    ts.save(args.output)
+    print(f"共采集 {len(ts.timestamps)} 次，{len(ts.columns)} 个序列，已保存到: {args.output}")
+    if not ts.timestamps:
+        print("错误: 没有采集到任何指标，请确认服务已开启监控（export MIES_SERVICE_MONITOR_MODE=1）")
+        sys.exit(1)
+    print_summary(summarize_phases(ts))
+    if process is not None and process.returncode:
+        sys.exit(process.returncode)
+
+if __name__ == '__main__':
+    main()
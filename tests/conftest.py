@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""pytest公共配置：把 lib/ 和 scripts/ 加入模块搜索路径（与工具脚本的导入方式一致），并提供模拟服务"""
+
+import os
+import sys
+import time
+import socket
+import subprocess
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ("lib", "scripts"):
+    path = os.path.join(ROOT_DIR, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+MOCK_SERVER = os.path.join(ROOT_DIR, "scripts", "mock_mindie_server.py")
+
+def free_port():
+    """获取一个当前空闲的本机端口"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def mock_server():
+    """
+    启动 scripts/mock_mindie_server.py 的工厂函数
+
+    用法: port, management_port = mock_server(wait=True, decode_ms=2)
+    wait为False时不等待端口可连接，用于测试服务启动过程中的等待逻辑
+    """
+    procs = []
+
+    def start(port=None, management_port=None, wait=True, **options):
+        port, management_port = port or free_port(), management_port or free_port()
+        cmd = [sys.executable, MOCK_SERVER, "--port", str(port), "--management-port", str(management_port)]
+        for key, value in options.items():
+            cmd += [f"--{key.replace('_', '-')}", str(value)]
+        procs.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        deadline = time.monotonic() + 10
+        while wait:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        return port, management_port
+
+    yield start
+    for proc in procs:
+        proc.kill()
+        proc.wait()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""bench_api：长度分布、请求生成，以及对 mock_mindie_server.py 的闭环/开环压测"""
+
+import os
+import sys
+import csv
+import json
+import random
+import subprocess
+
+import pytest
+
+import bench_api as bench
+from conftest import ROOT_DIR, free_port
+
+SCRIPT = os.path.join(ROOT_DIR, "scripts", "bench_api.py")
+
+def test_parse_length_dist():
+    rng = random.Random(0)
+    assert bench.parse_length_dist("512")(rng) == 512
+    assert all(10 <= bench.parse_length_dist("uniform:10:20")(rng) <= 20 for _ in range(100))
+    assert all(bench.parse_length_dist("normal:5:50")(rng) >= 1 for _ in range(100))
+    for spec in ("abc", "uniform:1", "poisson:3:4"):
+        with pytest.raises(ValueError):
+            bench.parse_length_dist(spec)
+
+def test_build_requests_is_deterministic():
+    dist = bench.parse_length_dist("uniform:4:16")
+    first = bench.build_requests(5, dist, dist, seed=7)
+    assert first == bench.build_requests(5, dist, dist, seed=7)
+    assert first != bench.build_requests(5, dist, dist, seed=8)
+    assert all(len(r["prompt"].split()) == r["prompt_len"] for r in first)
+
+def test_percentile_and_parse_url():
+    assert bench.percentile([], 50) is None
+    assert bench.percentile([1, 2, 3, 4], 50) == 2.5
+    assert bench.percentile([5], 99) == 5
+    assert bench.parse_url("127.0.0.1:1025") == ("127.0.0.1", 1025, "/v1/chat/completions", False)
+    assert bench.parse_url("https://h/v1/chat/completions") == ("h", 443, "/v1/chat/completions", True)
+
+def test_closed_loop(mock_server):
+    port, _ = mock_server(decode_ms=2)
+    url = f"http://127.0.0.1:{port}"
+    assert bench.get_model(url) == "mock-model"
+    requests = bench.build_requests(8, bench.parse_length_dist("32"), bench.parse_length_dist("8"))
+    done = []
+    summary, records = bench.run_benchmark(url, "mock-model", requests, concurrency=4,
+                                           on_done=lambda r, n, total: done.append(n))
+    assert summary["requests"] == 8 and summary["errors"] == 0
+    assert summary["output_tokens"] == 64 and summary["input_tokens"] == 8 * 32
+    assert done == list(range(1, 9))
+    assert all(len(r["itls"]) == 7 for r in records)
+    assert summary["ttft_p50_ms"] > 0 and summary["tpot_p50_ms"] >= 1
+    assert summary["ttft_p50_ms"] <= summary["ttft_p99_ms"]
+
+def test_open_loop(mock_server):
+    port, _ = mock_server(decode_ms=1)
+    requests = bench.build_requests(6, bench.parse_length_dist("8"), bench.parse_length_dist("4"))
+    summary, records = bench.run_benchmark(f"http://127.0.0.1:{port}", "mock-model", requests, rate=50, seed=1)
+    assert summary["requests"] == 6 and summary["errors"] == 0
+    # 开环模式按泊松间隔依次发出
+    offsets = [r["start_offset"] for r in sorted(records, key=lambda r: r["start"])]
+    assert offsets == sorted(offsets) and offsets[-1] > 0
+
+def test_errors_are_recorded(mock_server):
+    port, _ = mock_server()
+    requests = bench.build_requests(2, bench.parse_length_dist("8"), bench.parse_length_dist("4"))
+    summary, records = bench.run_benchmark(f"http://127.0.0.1:{port}/v2/chat/completions", "mock-model",
+                                           requests, concurrency=2)
+    assert summary["requests"] == 0 and summary["errors"] == 2
+    assert all(r["error"].startswith("RuntimeError: HTTP 404") for r in records)
+
+    summary, records = bench.run_benchmark(f"http://127.0.0.1:{free_port()}", "mock-model", requests,
+                                           concurrency=2, timeout=5)
+    assert summary["errors"] == 2 and summary["ttft_p50_ms"] is None
+
+def test_cli_exports(mock_server, tmp_path):
+    port, _ = mock_server(decode_ms=1)
+    json_path, csv_path = tmp_path / "result.json", tmp_path / "result.csv"
+    result = subprocess.run([sys.executable, SCRIPT, "--url", f"http://127.0.0.1:{port}", "-n", "4", "-c", "2",
+                             "--prompt-len", "16", "--output-len", "4", "--warmup", "1", "--quiet",
+                             "--json", str(json_path), "--csv", str(csv_path)],
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=60)
+    assert result.returncode == 0, result.stdout
+    exported = json.loads(json_path.read_text())
+    assert exported["summary"]["requests"] == 4
+    with open(csv_path) as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 4 and all(row["output_tokens"] == "4" for row in rows)
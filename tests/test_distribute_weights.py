@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""distribute_weights：所有"节点"在本机执行（--local），覆盖跳过、按分块记录续传和MD5不一致"""
+
+import os
+import sys
+import hashlib
+import subprocess
+
+import pytest
+
+from calc_model_md5 import MB
+from distribute_weights import (WeightDistributor, build_source_manifest, plan_chunks, relay_parents,
+                                PARTIAL_SUFFIX, DONE_SUFFIX)
+from ssh_pool import SSHSessionPool
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib", "distribute_weights.py")
+NODES = ["127.0.0.1", "127.0.0.2"]
+
+@pytest.fixture
+def source(tmp_path):
+    src = tmp_path / "model"
+    (src / "sub").mkdir(parents=True)
+    (src / "model-00001.safetensors").write_bytes(os.urandom(3 * MB + 123))
+    (src / "sub" / "tokenizer.json").write_bytes(b'{"a": 1}')
+    (src / "empty.txt").write_bytes(b"")
+    return src
+
+def md5(path):
+    with open(path, 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+def distribute(source, tmp_path, nodes=NODES, parents=None):
+    entries = build_source_manifest(str(source), str(tmp_path / "model.dist_manifest.json"))
+    dests = {node: str(tmp_path / f"dest_{node}") for node in nodes}
+    with SSHSessionPool(None, local_hosts=nodes) as pool:
+        distributor = WeightDistributor(pool, str(source), entries, dests, parents or {n: None for n in nodes},
+                                        chunk_size=MB, streams=2, timeout=60)
+        return distributor.run(), entries, dests
+
+def assert_same_tree(entries, dest):
+    for rel, entry in entries.items():
+        assert md5(os.path.join(dest, rel)) == entry["digest"]
+    assert not os.path.exists(dest + PARTIAL_SUFFIX)
+
+def test_plan_chunks_and_relay_parents():
+    assert plan_chunks(0, MB) == [(0, 0)]
+    assert plan_chunks(2 * MB + 1, MB) == [(0, MB), (MB, MB), (2 * MB, 1)]
+    assert relay_parents(["a", "b", "c", "d"], 1) == {"a": None, "b": "a", "c": "b", "d": "c"}
+    assert relay_parents(["a", "b", "c"], 0) == {"a": None, "b": None, "c": None}
+
+def test_distribute_then_skip(source, tmp_path):
+    stats, entries, dests = distribute(source, tmp_path, parents={NODES[0]: None, NODES[1]: NODES[0]})
+    for node in NODES:
+        assert "error" not in stats[node] and stats[node]["failed"] == {}
+        assert_same_tree(entries, dests[node])
+    assert stats[NODES[0]]["sent"] == 3
+    # 下级节点的非空文件经上级节点中继，空文件直接创建
+    assert stats[NODES[1]]["relayed"] == 2 and stats[NODES[1]]["sent"] == 1
+
+    stats, _, _ = distribute(source, tmp_path)
+    for node in NODES:
+        assert stats[node]["skipped"] == 3 and stats[node]["bytes"] == 0
+
+def test_resume_from_done_records(source, tmp_path):
+    entries = build_source_manifest(str(source), str(tmp_path / "model.dist_manifest.json"))
+    rel = "model-00001.safetensors"
+    # 模拟上次中断：前两个分块已写入并记录
+    part = tmp_path / f"dest_{NODES[0]}{PARTIAL_SUFFIX}" / rel
+    part.parent.mkdir(parents=True)
+    data = (source / rel).read_bytes()
+    part.write_bytes(data[:2 * MB])
+    digest = entries[rel]["digest"]
+    with open(str(part) + DONE_SUFFIX, 'w') as f:
+        f.write(f"{digest} 0 {MB}\n{digest} {MB} {MB}\n")
+
+    stats, entries, dests = distribute(source, tmp_path, nodes=NODES[:1])
+    node_stats = stats[NODES[0]]
+    assert node_stats["failed"] == {}
+    # 只补传剩余的分块和其余小文件
+    assert node_stats["bytes"] == len(data) - 2 * MB + len(b'{"a": 1}')
+    assert_same_tree(entries, dests[NODES[0]])
+
+def test_md5_mismatch_discards_partial(source, tmp_path):
+    entries = build_source_manifest(str(source), str(tmp_path / "model.dist_manifest.json"))
+    rel = "model-00001.safetensors"
+    size = entries[rel]["size"]
+    # 分块记录声称所有分块都已完成，但内容是错的
+    part = tmp_path / f"dest_{NODES[0]}{PARTIAL_SUFFIX}" / rel
+    part.parent.mkdir(parents=True)
+    part.write_bytes(b"\0" * size)
+    digest = entries[rel]["digest"]
+    with open(str(part) + DONE_SUFFIX, 'w') as f:
+        f.writelines(f"{digest} {offset} {length}\n" for offset, length in plan_chunks(size, MB))
+
+    stats, _, dests = distribute(source, tmp_path, nodes=NODES[:1])
+    assert "MD5不一致" in stats[NODES[0]]["failed"][rel]
+    assert not part.exists() and not os.path.exists(str(part) + DONE_SUFFIX)
+    assert not os.path.exists(os.path.join(dests[NODES[0]], rel))
+
+    # 重新执行时从头传输该文件
+    stats, entries, dests = distribute(source, tmp_path, nodes=NODES[:1])
+    assert stats[NODES[0]]["failed"] == {}
+    assert_same_tree(entries, dests[NODES[0]])
+
+def test_cli_local(source, tmp_path):
+    base = [sys.executable, SCRIPT, "--local", "--config", str(tmp_path / "none.json"), "--source", str(source),
+            "--dest", str(tmp_path / "cli_{node}"), "--relay-fanout", "1", "--chunk-size", "1"]
+    result = subprocess.run(base + ["--nodes", ",".join(NODES)], stdout=subprocess.PIPE,
+                            stderr=subprocess.STDOUT, text=True)
+    assert result.returncode == 0, result.stdout
+    assert "所有节点权重与清单一致" in result.stdout
+
+    # 中继模式下节点名必须是IP
+    result = subprocess.run(base + ["--nodes", "n1,n2"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    assert result.returncode == 1 and "节点名必须是IP地址" in result.stdout
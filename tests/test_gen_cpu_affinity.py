@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""gen_cpu_affinity：在构造的sysfs目录树上读取NUMA/NPU信息并规划绑核"""
+
+import pytest
+
+from gen_cpu_affinity import (read_numa_nodes, read_npus, plan_affinity, parse_cpulist, longest_run,
+                              derive_threads, format_affinity)
+
+def write(root, path, text):
+    target = root / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(text + "\n")
+
+def make_sysfs(root, node_cpulists, npu_numa, online=None):
+    """node_cpulists: {节点号: cpulist}；npu_numa: [numa_node文本]，按PCI地址顺序生成NPU"""
+    for node, cpulist in node_cpulists.items():
+        write(root, f"sys/devices/system/node/node{node}/cpulist", cpulist)
+    if online is not None:
+        write(root, "sys/devices/system/cpu/online", online)
+    for i, numa in enumerate(npu_numa):
+        dev = f"sys/bus/pci/devices/0000:{0xc1 + i:02x}:00.0"
+        write(root, f"{dev}/vendor", "0x19e5")
+        write(root, f"{dev}/class", "0x120000")
+        write(root, f"{dev}/numa_node", numa)
+    # 非NPU设备应被忽略
+    write(root, "sys/bus/pci/devices/0000:00:01.0/vendor", "0x8086")
+    write(root, "sys/bus/pci/devices/0000:00:01.0/class", "0x060400")
+    return str(root)
+
+def test_parse_cpulist_and_longest_run():
+    assert parse_cpulist("0-3,8,10-11\n") == [0, 1, 2, 3, 8, 10, 11]
+    assert longest_run([0, 1, 2, 3, 8, 10, 11]) == [0, 1, 2, 3]
+    assert longest_run([]) == []
+
+def test_read_sysfs_tree(tmp_path):
+    root = make_sysfs(tmp_path, {0: "0-7", 1: "8-15"}, ["0", "1", "-1"])
+    assert read_numa_nodes(root) == {0: list(range(8)), 1: list(range(8, 16))}
+    npus = read_npus(root)
+    assert [numa for _, numa in npus] == [0, 1, -1]
+    assert npus[0][0] == "0000:c1:00.0"
+
+def test_read_numa_falls_back_to_online_cpus(tmp_path):
+    root = make_sysfs(tmp_path, {}, ["0"], online="0-5")
+    assert read_numa_nodes(root) == {0: list(range(6))}
+
+def test_plan_splits_numa_nodes(tmp_path):
+    root = make_sysfs(tmp_path, {0: "0-23", 1: "24-47"}, ["0", "0", "1", "1"])
+    bindings, notes = plan_affinity(read_npus(root), read_numa_nodes(root), [0, 1, 2, 3], reserve_cores=2)
+    assert notes == []
+    assert {d: (b["numa"], b["cpus"][0], b["cpus"][-1]) for d, b in bindings.items()} == {
+        0: (0, 2, 12), 1: (0, 13, 23), 2: (1, 26, 36), 3: (1, 37, 47)}
+    assert format_affinity(bindings) == "2,npu0:2-12,npu1:13-23,npu2:26-36,npu3:37-47"
+
+def test_plan_unknown_numa_node(tmp_path):
+    # numa_node为-1时按卡在PCI顺序中的位置归入NUMA节点：4张卡、2个节点，前两张归NUMA0
+    root = make_sysfs(tmp_path, {0: "0-7", 1: "8-15"}, ["-1", "-1", "-1", "-1"])
+    bindings, notes = plan_affinity(read_npus(root), read_numa_nodes(root), [1, 2])
+    assert bindings[1]["numa"] == 0 and bindings[2]["numa"] == 1
+    assert bindings[1]["cpus"] == list(range(8)) and bindings[2]["cpus"] == list(range(8, 16))
+    assert len(notes) == 2 and all("numa_node未知" in n for n in notes)
+
+def test_plan_non_contiguous_cores(tmp_path):
+    # NUMA0的核不连续（0-5,16-21）：分给第二张卡的核跨越空洞，只保留最长的连续区间
+    root = make_sysfs(tmp_path, {0: "0-5,16-21"}, ["0", "0"])
+    bindings, notes = plan_affinity(read_npus(root), read_numa_nodes(root), [0, 1], reserve_cores=2)
+    assert bindings[0]["cpus"] == [2, 3, 4, 5]
+    assert bindings[1]["cpus"] == [17, 18, 19, 20, 21]
+    assert notes == ["npu0 分到的核不连续，只使用最长的连续区间 2-5"]
+
+def test_plan_errors(tmp_path):
+    root = make_sysfs(tmp_path, {0: "0-1"}, ["0", "0", "0"])
+    bindings, notes = plan_affinity(read_npus(root), read_numa_nodes(root), [0, 1, 2])
+    assert bindings is None and "不足以分给 3 张卡" in notes[-1]
+    bindings, notes = plan_affinity(read_npus(root), read_numa_nodes(root), [5])
+    assert bindings is None and "超出检测到的NPU数量" in notes[0]
+
+@pytest.mark.parametrize("cores, expected", [(24, (16, 2)), (6, (3, 2)), (3, (1, 1)), (1, (1, 0))])
+def test_derive_threads(cores, expected):
+    assert derive_threads(cores) == expected
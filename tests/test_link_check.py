@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""link_check.check_mesh：两个本机"节点"上的模拟hccn_tool，包含一条丢包链路和一张链路DOWN的卡"""
+
+import sys
+
+import pytest
+
+from link_check import check_mesh
+from ssh_pool import SSHSessionPool
+
+# 模拟hccn_tool：卡3链路DOWN，卡0到10.0.0.3的ping全部丢包，其余正常
+FAKE_HCCN_TOOL = r'''#!{python}
+import os, sys
+args = sys.argv[1:]
+device = int(args[1])
+op = args[2]
+down = os.environ.get("FAKE_DOWN_DEVICE")
+lossy = os.environ.get("FAKE_LOSSY_LINK", "")
+if op == "-link":
+    print("link status: " + ("DOWN" if str(device) == down else "UP"))
+elif op == "-net_health":
+    print("net health status: Success")
+elif op == "-tls":
+    print("dev_id:%d, tls switch[0](0:disable, 1:enable)" % device)
+elif op == "-ping":
+    target, count = args[args.index("address") + 1], int(args[args.index("pkt") + 1])
+    received = 0 if "%d>%s" % (device, target) == lossy else count
+    for i in range(received):
+        print("recv seq=%d,time=0.080000ms" % i)
+    print("%d packets transmitted, %d received, %d%% packet loss"
+          % (count, received, 100 * (count - received) // count))
+else:
+    sys.exit("unsupported: %s" % args)
+'''
+
+ENDPOINTS = [
+    {"rank": 0, "server": "n1", "device_id": 0, "ip": "10.0.0.1"},
+    {"rank": 1, "server": "n1", "device_id": 1, "ip": "10.0.0.2"},
+    {"rank": 2, "server": "n2", "device_id": 2, "ip": "10.0.0.3"},
+    {"rank": 3, "server": "n2", "device_id": 3, "ip": "10.0.0.4"},
+]
+
+@pytest.fixture
+def hccn_tool(tmp_path):
+    path = tmp_path / "hccn_tool"
+    path.write_text(FAKE_HCCN_TOOL.format(python=sys.executable))
+    path.chmod(0o755)
+    return str(path)
+
+@pytest.fixture
+def pool():
+    with SSHSessionPool(None, local_hosts=["n1", "n2"]) as pool:
+        yield pool
+
+def test_healthy_mesh(pool, hccn_tool):
+    report = check_mesh(pool, ENDPOINTS, ["n1", "n2"], count=2, hccn_tool=hccn_tool, quiet=True)
+    assert report["failed_nodes"] == {}
+    assert report["device_issues"] == []
+    assert report["bad_links"] == []
+    assert report["sources"] == [0, 1, 2, 3]
+    # 自身为None，其余链路都有时延
+    assert report["matrix"]["avg_ms"][0] == [None, 0.08, 0.08, 0.08]
+
+def test_lossy_link_and_down_card(pool, hccn_tool, monkeypatch):
+    monkeypatch.setenv("FAKE_DOWN_DEVICE", "3")
+    monkeypatch.setenv("FAKE_LOSSY_LINK", "0>10.0.0.3")
+    report = check_mesh(pool, ENDPOINTS, ["n1", "n2"], count=2, hccn_tool=hccn_tool, quiet=True)
+    assert report["failed_nodes"] == {}
+    assert report["device_issues"] == [{"rank": 3, "device": "n2/npu3", "reason": "链路状态 DOWN"}]
+    assert [(l["src_rank"], l["dst_rank"], l["reason"]) for l in report["bad_links"]] == [(0, 2, "丢包 100%")]
+    assert report["matrix"]["loss"][0][2] == 100.0
+    # 只有一条异常链路，不足以判定疑似故障卡
+    assert report["suspects"] == []
+
+def test_missing_hccn_tool(pool, tmp_path):
+    missing = str(tmp_path / "missing")
+    report = check_mesh(pool, ENDPOINTS, ["n1", "n2"], count=1, hccn_tool=missing, quiet=True)
+    # 探测脚本本身正常退出，每张卡都拿不到状态，所有链路都标记为ping失败
+    assert report["failed_nodes"] == {}
+    assert {i["reason"] for i in report["device_issues"]} >= {"链路状态 None"}
+    assert len(report["bad_links"]) == 12
+    assert all(l["reason"].startswith("ping失败") for l in report["bad_links"])
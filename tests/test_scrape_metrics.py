@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""scrape_metrics：Prometheus文本解析、列式时间序列、按阶段汇总，以及对 mock_mindie_server.py 的采集"""
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+import scrape_metrics as sm
+from conftest import ROOT_DIR, free_port
+
+SCRIPT = os.path.join(ROOT_DIR, "scripts", "scrape_metrics.py")
+BENCH = os.path.join(ROOT_DIR, "scripts", "bench_api.py")
+
+def test_parse_metrics():
+    text = "\n".join([
+        "# HELP num_requests_running running",
+        "# TYPE num_requests_running gauge",
+        'num_requests_running{model_name="m"} 3',
+        'ttft_bucket{model_name="m",le="0.1"} 5 1700000000000',
+        "broken line",
+        "bad_value{} abc",
+    ])
+    samples, types = sm.parse_metrics(text)
+    assert types == {"num_requests_running": "gauge"}
+    assert samples == {'num_requests_running{model_name="m"}': 3.0,
+                       'ttft_bucket{model_name="m",le="0.1"}': 5.0}
+    series = 'ttft_bucket{model_name="m",le="0.1"}'
+    assert sm.series_name(series) == "ttft_bucket"
+    assert sm.series_label(series, "le") == "0.1"
+    assert sm.series_label(series, "missing") is None
+
+def test_time_series_fills_missing(tmp_path):
+    ts = sm.TimeSeries("http://x/metrics", 1)
+    ts.append(1.0, {"a": 1.0}, {"a": "gauge"})
+    ts.append(2.0, {"b": 2.0}, {})
+    ts.append(3.0, {"a": 3.0, "b": 4.0}, {})
+    assert ts.columns == {"a": [1.0, None, 3.0], "b": [None, 2.0, 4.0]}
+    path = str(tmp_path / "ts.json")
+    ts.save(path)
+    loaded = sm.TimeSeries.load(path)
+    assert loaded.columns == ts.columns and loaded.timestamps == ts.timestamps
+    assert loaded.meta == {"url": "http://x/metrics", "interval": 1}
+
+def test_counter_increase_and_quantile():
+    assert sm.counter_increase([1, None, 4, 10]) == 9
+    # 服务重启后计数器归零
+    assert sm.counter_increase([5, 8, 2, 6]) == 3 + 2 + 4
+    assert sm.histogram_quantile(0.5, [1, 2, float("inf")], [0, 0, 0]) is None
+    assert sm.histogram_quantile(0.5, [1, 2, float("inf")], [2, 4, 4]) == 1.0
+    assert sm.histogram_quantile(0.99, [1, float("inf")], [1, 10]) == 1
+
+def test_summarize_phases():
+    ts = sm.TimeSeries()
+    ts.start_phase("idle", 0)
+    ts.start_phase("load", 2)
+    label = 'model_name="m"'
+    for t in range(5):
+        busy = t >= 2
+        ts.append(float(t), {
+            f"num_requests_waiting{{{label}}}": 4.0 if busy else 0.0,
+            f"npu_cache_usage_perc{{{label}}}": 0.5 if busy else 0.0,
+            f"request_success_total{{{label}}}": 10.0 * max(t - 1, 0),
+            f'time_to_first_token_seconds_bucket{{{label},le="0.1"}}': 5.0 * max(t - 1, 0),
+            f'time_to_first_token_seconds_bucket{{{label},le="+Inf"}}': 10.0 * max(t - 1, 0),
+            f"time_to_first_token_seconds_sum{{{label}}}": 1.0 * max(t - 1, 0),
+            f"time_to_first_token_seconds_count{{{label}}}": 10.0 * max(t - 1, 0),
+        }, {})
+    idle, load = sm.summarize_phases(ts)
+    assert idle["phase"] == "idle" and idle["samples"] == 2
+    assert idle["requests_total"] == 0 and "ttft_mean_ms" not in idle
+    assert load["samples"] == 3
+    # 计数器从阶段开始前的最后一个采样算起
+    assert load["requests_total"] == 30 and load["requests_per_s"] == 10
+    assert load["ttft_mean_ms"] == pytest.approx(100)
+    assert load["ttft_p50_ms"] == pytest.approx(100)
+    assert "调度参数" in load["diagnosis"]
+    assert sm.diagnose({"kv_usage_max": 97}).startswith("KV Cache接近耗尽")
+
+def test_read_marks(tmp_path):
+    path = tmp_path / "marks"
+    assert sm.read_marks(str(path), 0) == ([], 0)
+    path.write_text("100.5 warmup\n")
+    marks, offset = sm.read_marks(str(path), 0)
+    assert marks == [(100.5, "warmup")]
+    with open(path, "a") as f:
+        f.write("steady\n")
+    marks, _ = sm.read_marks(str(path), offset)
+    assert [name for _, name in marks] == ["steady"]
+
+def test_scrape_mock_server(mock_server, tmp_path):
+    metrics_port = free_port()
+    port, _ = mock_server(decode_ms=2, metrics_port=metrics_port)
+    url = f"http://127.0.0.1:{metrics_port}/metrics"
+    samples, types = sm.scrape(url)
+    assert types["num_requests_running"] == "gauge"
+    assert types["time_to_first_token_seconds"] == "histogram"
+
+    output = str(tmp_path / "m.json")
+    result = subprocess.run(
+        [sys.executable, SCRIPT, "--url", url, "--interval", "0.2", "--output", output, "--post", "0.5",
+         "--", sys.executable, BENCH, "--url", f"http://127.0.0.1:{port}", "-n", "8", "-c", "4",
+         "--prompt-len", "16", "--output-len", "8", "--quiet"],
+        capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "[run]" in result.stdout and "[post]" in result.stdout
+    with open(output) as f:
+        assert [name for _, name in json.load(f)["phases"]] == ["run", "post"]
+    ts = sm.TimeSeries.load(output)
+    summaries = sm.summarize_phases(ts)
+    # 最后几个请求可能在post阶段的第一次采样时才计入
+    assert sum(s["requests_total"] for s in summaries) == 8
+    assert sum(s["generation_tokens_total"] for s in summaries) == 64
+    assert any(s.get("ttft_mean_ms", 0) > 0 for s in summaries)
+
+def test_summarize_unreadable_file(tmp_path):
+    result = subprocess.run([sys.executable, SCRIPT, "--summarize", str(tmp_path / "missing.json")],
+                            capture_output=True, text=True)
+    assert result.returncode == 1 and "错误" in result.stdout
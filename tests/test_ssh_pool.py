@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+ssh_pool：local_hosts中的主机在本机bash执行，其余主机经paramiko模拟SSH服务执行，
+覆盖连接复用、超时、大量标准输入和逐行回调
+"""
+
+import os
+import time
+import signal
+import socket
+import hashlib
+import threading
+import subprocess
+
+import pytest
+
+from ssh_pool import SSHSessionPool
+
+@pytest.fixture
+def pool():
+    with SSHSessionPool(None, local_hosts=["local"]) as pool:
+        yield pool
+
+def test_exit_code_and_streams(pool):
+    lines = []
+    result = pool.run("local", "echo one; echo two; echo err >&2; exit 3",
+                      on_line=lambda host, line: lines.append((host, line)))
+    assert result.exit_code == 3 and not result.ok
+    assert result.stdout == "one\ntwo\n" and result.stderr == "err\n"
+    assert lines == [("local", "one"), ("local", "two")]
+
+def test_timeout_kills_process_group(pool, tmp_path):
+    marker = tmp_path / "late"
+    start = time.monotonic()
+    # 后台子进程继承了输出管道，只结束bash时读取会一直等到子进程退出
+    with pytest.raises(TimeoutError):
+        pool.run("local", f"(sleep 3; touch {marker}) & sleep 30", timeout=1)
+    assert time.monotonic() - start < 2.5
+    time.sleep(2.5)
+    assert not marker.exists()
+
+def test_large_stdin(pool):
+    data = os.urandom(16 << 20)
+    result = pool.run("local", "md5sum", input_data=data)
+    assert result.ok and result.stdout.split()[0] == hashlib.md5(data).hexdigest()
+
+def test_large_stdin_with_output_before_read(pool):
+    # 命令先写出超过管道容量的输出再读标准输入，标准输入在当前线程写入会互相等待
+    data = b"x" * (8 << 20)
+    result = pool.run("local", "head -c 4000000 /dev/zero; wc -c", input_data=data, timeout=30)
+    assert result.ok and result.stdout.endswith(f"{len(data)}\n")
+
+def test_stdin_not_consumed(pool):
+    result = pool.run("local", "true", input_data=b"y" * (8 << 20), timeout=30)
+    assert result.ok
+
+def test_run_on_all_collects_errors(pool):
+    results = pool.run_on_all(["local"], "sleep 5", timeout=0.5)
+    assert isinstance(results["local"], TimeoutError)
+
+class StubSSHServer:
+    """
+    paramiko模拟SSH服务：接受任意密码登录，exec请求在本机用bash执行，
+    标准输入/输出/错误在通道和进程间转发，记录建立的连接数
+    """
+
+    def __init__(self, paramiko):
+        self.paramiko = paramiko
+        self.host_key = paramiko.RSAKey.generate(2048)
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+        self.transports = []
+        self.procs = []
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            transport = self.paramiko.Transport(conn)
+            transport.add_server_key(self.host_key)
+            transport.start_server(server=self.interface())
+            self.transports.append(transport)
+
+    def interface(self):
+        paramiko, server = self.paramiko, self
+
+        class Interface(paramiko.ServerInterface):
+            def get_allowed_auths(self, username):
+                return "password"
+
+            def check_auth_password(self, username, password):
+                return paramiko.AUTH_SUCCESSFUL
+
+            def check_channel_request(self, kind, chanid):
+                return paramiko.OPEN_SUCCEEDED if kind == "session" else paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+            def check_channel_exec_request(self, channel, command):
+                threading.Thread(target=server.execute, args=(channel, command.decode()), daemon=True).start()
+                return True
+
+        return Interface()
+
+    def execute(self, channel, command):
+        proc = subprocess.Popen(["bash", "-c", command], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, start_new_session=True)
+        self.procs.append(proc)
+
+        def pump_stdin():
+            try:
+                for data in iter(lambda: channel.recv(65536), b""):
+                    proc.stdin.write(data)
+                proc.stdin.close()
+            except (OSError, ValueError):
+                pass
+
+        def pump(stream, send):
+            try:
+                for data in iter(lambda: os.read(stream.fileno(), 65536), b""):
+                    send(data)
+            except (OSError, EOFError):
+                pass
+
+        threads = [threading.Thread(target=pump_stdin, daemon=True),
+                   threading.Thread(target=pump, args=(proc.stdout, channel.sendall), daemon=True),
+                   threading.Thread(target=pump, args=(proc.stderr, channel.sendall_stderr), daemon=True)]
+        for thread in threads:
+            thread.start()
+        exit_code = proc.wait()
+        threads[1].join()
+        threads[2].join()
+        # 与sshd一致，被信号结束的进程按 128+信号值 返回
+        channel.send_exit_status(exit_code if exit_code >= 0 else 128 - exit_code)
+        channel.close()
+
+    def close(self):
+        self.sock.close()
+        for proc in self.procs:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        for transport in self.transports:
+            transport.close()
+
+@pytest.fixture(scope="module")
+def ssh_server():
+    server = StubSSHServer(pytest.importorskip("paramiko"))
+    yield server
+    server.close()
+
+@pytest.fixture
+def remote_pool(ssh_server):
+    with SSHSessionPool("user", "password", use_key=False, port=ssh_server.port, timeout=5) as pool:
+        yield pool
+
+def test_remote_reuses_transport(ssh_server, remote_pool):
+    connected = len(ssh_server.transports)
+    for i in range(3):
+        result = remote_pool.run("127.0.0.1", f"echo {i}; echo err >&2; exit {i}")
+        assert (result.exit_code, result.stdout, result.stderr) == (i, f"{i}\n", "err\n")
+    results = remote_pool.run_on_all(["127.0.0.1"], "hostname")
+    assert results["127.0.0.1"].ok
+    # 所有命令在同一连接上新开通道执行
+    assert len(ssh_server.transports) == connected + 1
+
+    # 连接断开后自动重连
+    remote_pool.get_client("127.0.0.1").get_transport().close()
+    assert remote_pool.run("127.0.0.1", "true").ok
+    assert len(ssh_server.transports) == connected + 2
+
+def test_remote_streams_lines(remote_pool):
+    start = time.monotonic()
+    arrivals = []
+    result = remote_pool.run("127.0.0.1", "echo one; sleep 1; printf two",
+                             on_line=lambda host, line: arrivals.append((line, time.monotonic() - start)))
+    assert result.ok and result.stdout == "one\ntwo"
+    assert [line for line, _ in arrivals] == ["one", "two"]
+    # 第一行在命令结束前就已回调
+    assert arrivals[0][1] < arrivals[1][1] - 0.5
+
+def test_remote_timeout(remote_pool):
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        remote_pool.run("127.0.0.1", "while true; do echo busy; sleep 0.01; done", timeout=1)
+    assert time.monotonic() - start < 3
+    assert remote_pool.run("127.0.0.1", "true").ok
+
+def test_remote_large_stdin(remote_pool):
+    data = os.urandom(16 << 20)
+    result = remote_pool.run("127.0.0.1", "md5sum", input_data=data, timeout=60)
+    assert result.ok and result.stdout.split()[0] == hashlib.md5(data).hexdigest()
+
+def test_remote_large_stdin_with_output_before_read(remote_pool):
+    # 输出超过通道窗口后才读标准输入，写完标准输入再读输出时双方互相等待
+    data = b"x" * (8 << 20)
+    result = remote_pool.run("127.0.0.1", "head -c 4000000 /dev/zero; wc -c", input_data=data, timeout=60)
+    assert result.ok and result.stdout.endswith(f"{len(data)}\n")
+
+def test_remote_stalled_stdin(remote_pool):
+    # 命令既不读标准输入也不退出，未设置总超时时由单次写入超时结束
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        remote_pool.run("127.0.0.1", "sleep 60", input_data=b"z" * (16 << 20))
+    assert time.monotonic() - start < 15
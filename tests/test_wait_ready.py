@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""wait_ready：对 mock_mindie_server.py 的业务端口和管理端口轮询"""
+
+import json
+import threading
+
+import wait_ready as wr
+from conftest import free_port
+
+def urls(port, management_port):
+    return wr.build_probe_urls({}, "127.0.0.1", port, management_port)
+
+def test_build_probe_urls(tmp_path):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps({"ServerConfig": {"ipAddress": "10.0.0.1", "managementIpAddress": "127.0.0.2",
+                                                   "port": 2025, "managementPort": 2026, "httpsEnabled": True}}))
+    assert wr.build_probe_urls(wr.load_server_config(str(config))) == [
+        "https://10.0.0.1:2025/v1/models", "https://127.0.0.2:2026/v2/health/ready"]
+    assert wr.build_probe_urls({}, port=3000) == [
+        "http://127.0.0.1:3000/v1/models", "http://127.0.0.1:1026/v2/health/ready"]
+
+def test_ready(mock_server):
+    status, elapsed = wr.wait_ready(urls(*mock_server()), deadline=10, quiet=True)
+    assert status == 'ready' and elapsed < 5
+
+def test_waits_for_late_start(mock_server, monkeypatch):
+    monkeypatch.setattr(wr, "INITIAL_INTERVAL", 0.2)
+    ports = free_port(), free_port()
+    timer = threading.Timer(1.0, lambda: mock_server(*ports, wait=False))
+    timer.start()
+    try:
+        status, elapsed = wr.wait_ready(urls(*ports), deadline=20, quiet=True)
+    finally:
+        timer.join()
+    assert status == 'ready' and elapsed >= 1.0
+
+def test_timeout(monkeypatch):
+    monkeypatch.setattr(wr, "INITIAL_INTERVAL", 0.2)
+    status, elapsed = wr.wait_ready(urls(free_port(), free_port()), deadline=1, quiet=True)
+    assert status == 'timeout' and 1 <= elapsed < 3
+
+def test_process_exited():
+    status, elapsed = wr.wait_ready(urls(free_port(), free_port()), deadline=30,
+                                    process_name="no_such_mindie_daemon", quiet=True)
+    assert status == 'exited' and elapsed < 5
+
+def test_unhealthy_endpoint_keeps_waiting(mock_server, monkeypatch):
+    # 管理端口的未知路径返回404，业务端口就绪也不能算作服务就绪
+    monkeypatch.setattr(wr, "INITIAL_INTERVAL", 0.2)
+    port, management_port = mock_server()
+    status, _ = wr.wait_ready([f"http://127.0.0.1:{port}/v1/models", f"http://127.0.0.1:{management_port}/nope"],
+                              deadline=1, quiet=True)
+    assert status == 'timeout'